@@ -0,0 +1,101 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """HAMMER模型前的动态微批处理队列
+
+    将并发到达的检测请求在几毫秒内(或凑满max_batch_size条)合并成一批，
+    调用 DeepFakeDetector.predict_batch 做一次前向推理，再把每条结果分发回各自的请求。
+    """
+
+    def __init__(self, detector, max_batch_size=8, max_wait_ms=10):
+        self.detector = detector
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._lock = threading.Lock()
+        self._pid = None
+        self.start()
+
+    def start(self):
+        """启动批处理线程
+
+        线程不会跨fork继承，多worker部署时每个worker进程在首次使用时重新启动自己的队列和线程
+        """
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, name="hammer-batcher", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def is_alive(self):
+        return self._pid == os.getpid() and self._thread.is_alive()
+
+    def submit(self, image_path, text, image_data=None):
+        """提交一条检测请求
+
+        参数:
+            image_path (str): 要检测的图片路径
+            text (str): 与图片相关的文本
+            image_data (bytes, 可选): 图片原始字节，提供时不再从image_path读取图片
+
+        返回:
+            Future: 完成后结果与 DeepFakeDetector.predict 的返回值一致
+        """
+        if self._pid != os.getpid():
+            self.start()
+        # 缓存键使用的图片摘要在请求线程中计算，批处理线程只做解码和推理
+        image_digest = None
+        if image_data is not None and self.detector.result_cache is not None:
+            image_digest = self.detector.result_cache.image_digest(image_data)
+        future = Future()
+        self._queue.put((image_path, text, image_data, image_digest, future))
+        return future
+
+    def predict(self, image_path, text, image_data=None, timeout=None):
+        """提交请求并阻塞等待结果"""
+        return self.submit(image_path, text, image_data).result(timeout=timeout)
+
+    def _collect(self):
+        # 阻塞等待第一条请求，然后在max_wait时间窗口内尽量凑满一批
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            batch = [item for item in batch if item[-1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.detector.predict_batch([item[:-1] for item in batch])
+                for item, result in zip(batch, results):
+                    item[-1].set_result(result)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][-1].set_exception(e)
+                    continue
+                # 整批失败时逐条重试，避免一张坏图片拖垮同批的其它请求
+                for item in batch:
+                    self._run_single(item)
+
+    def _run_single(self, item):
+        future = item[-1]
+        try:
+            future.set_result(self.detector.predict_batch([item[:-1]])[0])
+        except Exception as e:
+            future.set_exception(e)
@@ -0,0 +1,63 @@
+"""预编译HAMMER权重
+
+把原始.pth checkpoint加载进模型、完成pos_embed插值后，将完整的state dict
+保存为可内存映射的safetensors文件。服务启动时直接加载该文件，
+跳过DeiT初始化、torch.load反序列化和插值步骤。
+编译是离线步骤，仍按原流程先做DeiT初始化再加载checkpoint，编译结果与原加载方式一致。
+
+用法:
+    python compile_weights.py --model_path HAMMER_checkpoint_best.pth --output HAMMER_compiled.safetensors
+"""
+import argparse
+import time
+import torch
+import yaml
+from safetensors.torch import save_model
+from transformers import BertTokenizerFast
+from models.HAMMER import HAMMER
+from models.vit import interpolate_pos_embed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', default='./configs/test.yaml')
+    parser.add_argument('--model_path', default='HAMMER_checkpoint_best.pth')
+    parser.add_argument('--text_encoder', default='./bert/')
+    parser.add_argument('--output', default='HAMMER_compiled.safetensors')
+    args = parser.parse_args()
+
+    begin = time.perf_counter()
+    config = yaml.load(open(args.config, 'r'), Loader=yaml.Loader)
+    tokenizer = BertTokenizerFast.from_pretrained(args.text_encoder)
+
+    print("creating HAMMER...")
+    # 与原加载流程一致先做DeiT初始化，checkpoint中缺失的视觉编码器权重保持预训练值而不是随机值
+    model = HAMMER(
+        args=None,
+        config=config,
+        text_encoder=args.text_encoder,
+        tokenizer=tokenizer,
+        init_deit=True
+    )
+
+    checkpoint = torch.load(args.model_path, map_location='cpu')
+    state_dict = checkpoint['model']
+    state_dict['visual_encoder.pos_embed'] = interpolate_pos_embed(
+        state_dict['visual_encoder.pos_embed'], model.visual_encoder
+    )
+    msg = model.load_state_dict(state_dict, strict=False)
+    print('loading checkpoint:', args.model_path)
+    print(msg)
+    if msg.missing_keys:
+        print(f"警告: checkpoint中缺少 {len(msg.missing_keys)} 个权重，使用初始化值: {msg.missing_keys}")
+
+    # save_model会处理共享权重，并保存模型的全部参数和buffer
+    save_model(model, args.output, metadata={
+        'source_checkpoint': args.model_path,
+        'image_res': str(config['image_res']),
+    })
+    print(f"compiled weights saved to {args.output} in {time.perf_counter() - begin:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
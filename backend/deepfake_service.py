@@ -1,19 +1,64 @@
 # deepfake_service.py
-from flask import Flask, request, jsonify
+import os
+import json
+import logging
+import torch
+from flask import Flask, Response, request, jsonify
 from detect import DeepFakeDetector  
+from batcher import MicroBatcher
+from render_worker import RenderWorker
+from result_cache import ResultCache
+from tracing import render_metrics
+
+# 日志级别，设为DEBUG时按HAMMER_LOG_SAMPLE_RATE采样输出各阶段的调试信息
+logging.basicConfig(
+    level=os.environ.get('HAMMER_LOG_LEVEL', 'INFO'),
+    format='%(asctime)s %(process)d %(levelname)s %(name)s: %(message)s'
+)
 
 app = Flask(__name__)
 
-detector = DeepFakeDetector('./configs/test.yaml', './HAMMER_checkpoint_best.pth')
+# 标注图片在后台线程渲染，检测结果在logits解码后立即返回
+renderer = RenderWorker(max_queue_size=int(os.environ.get('HAMMER_RENDER_QUEUE_SIZE', 64)))
+# 推理结果缓存，相同图片+文本的重复提交直接返回缓存结果；HAMMER_RESULT_CACHE设为空则关闭
+result_cache_path = os.environ.get('HAMMER_RESULT_CACHE', './cache/hammer_results.db')
+result_cache = ResultCache(
+    result_cache_path,
+    memory_size=int(os.environ.get('HAMMER_RESULT_CACHE_MEMORY_SIZE', 1024)),
+    ttl_seconds=int(os.environ.get('HAMMER_RESULT_CACHE_TTL', 7 * 24 * 3600)),
+    max_disk_entries=int(os.environ.get('HAMMER_RESULT_CACHE_MAX_ENTRIES', 100000))
+) if result_cache_path else None
+# 优先使用compile_weights.py预编译的safetensors权重，冷启动时跳过DeiT初始化和pos_embed插值
+model_path = os.environ.get('HAMMER_MODEL_PATH') or (
+    './HAMMER_compiled.safetensors' if os.path.exists('./HAMMER_compiled.safetensors')
+    else './HAMMER_checkpoint_best.pth'
+)
+detector = DeepFakeDetector('./configs/test.yaml', model_path,
+                            renderer=renderer, result_cache=result_cache)
+# 微批处理：最多等待HAMMER_MAX_WAIT_MS毫秒或凑满HAMMER_MAX_BATCH_SIZE条请求后统一推理
+batcher = MicroBatcher(
+    detector,
+    max_batch_size=int(os.environ.get('HAMMER_MAX_BATCH_SIZE', 8)),
+    max_wait_ms=float(os.environ.get('HAMMER_MAX_WAIT_MS', 10))
+)
+# 批量检测单次请求允许的最大条数
+MAX_BULK_ITEMS = int(os.environ.get('HAMMER_MAX_BULK_ITEMS', 256))
 
 @app.route('/detect', methods=['POST'])
 def detect():
     """处理deepfake检测请求
     
-    接收包含图片路径和文本的JSON请求，调用DeepFakeDetector进行检测
+    接收包含图片和文本的请求，经微批处理队列调用DeepFakeDetector进行检测。
+    推荐以multipart表单直接上传图片字节，图片只在内存中解码一次；
+    仍兼容只传图片路径的JSON请求
     
     参数:
-        从请求JSON获取:
+        从multipart表单获取:
+        image (file): 图片文件
+        text (str): 与图片相关的文本
+        image_path (str): 图片在主应用中的保存路径，用于命名标注后的图片
+        
+        或从请求JSON获取:
         image_path (str): 要检测的图片路径
         text (str): 与图片相关的文本
     
@@ -23,9 +68,15 @@ def detect():
     异常:
         Exception: 当检测过程出错时抛出
     """
-    data = request.json
-    image_path = data['image_path']
-    text = data['text']
+    if 'image' in request.files:
+        image_data = request.files['image'].read()
+        image_path = request.form.get('image_path')
+        text = request.form.get('text')
+    else:
+        data = request.json
+        image_data = None
+        image_path = data['image_path']
+        text = data['text']
     if not image_path:
         return jsonify({"error": "没有上传图片"}), 400
     
@@ -33,11 +84,101 @@ def detect():
         return jsonify({"error": "没有上传文本"}), 400
         
     try:
-        result = detector.predict(image_path, text)
+        result = batcher.predict(image_path, text, image_data)
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/detect_batch', methods=['POST'])
+def detect_batch():
+    """批量处理deepfake检测请求
+    
+    接收多组图片和文本，全部提交到微批处理队列，按提交顺序以NDJSON格式逐条返回检测结果
+    
+    参数:
+        从multipart表单获取:
+        images (file[]): 多个图片文件
+        texts (str[]): 与images一一对应的文本
+        image_paths (str[]): 与images一一对应的图片保存路径
+        
+        或从请求JSON获取:
+        items (list): [{"image_path": str, "text": str}, ...]
+    
+    返回:
+        application/x-ndjson: 每行一个结果，形如 {"index": 0, "result": {...}}，
+        单条失败时为 {"index": 0, "error": "..."}
+    """
+    if 'images' in request.files:
+        image_files = request.files.getlist('images')
+        texts = request.form.getlist('texts')
+        image_paths = request.form.getlist('image_paths')
+        if not len(image_files) == len(texts) == len(image_paths):
+            return jsonify({"error": "images、texts和image_paths的数量不一致"}), 400
+        items = [
+            {"image_path": image_path, "text": text, "image_data": image_file.read()}
+            for image_file, text, image_path in zip(image_files, texts, image_paths)
+        ]
+    else:
+        data = request.get_json(silent=True) or {}
+        items = data.get('items') if isinstance(data, dict) else None
+        if items is not None and (not isinstance(items, list) or not all(isinstance(item, dict) for item in items)):
+            return jsonify({"error": "items必须是对象列表"}), 400
+    if not items:
+        return jsonify({"error": "没有上传检测数据"}), 400
+    if len(items) > MAX_BULK_ITEMS:
+        return jsonify({"error": f"单次最多检测{MAX_BULK_ITEMS}条"}), 400
+    
+    futures = []
+    for item in items:
+        image_path = item.get('image_path')
+        text = item.get('text')
+        if not image_path or not text:
+            futures.append(None)
+        else:
+            futures.append(batcher.submit(image_path, text, item.get('image_data')))
+    
+    def generate():
+        for index, future in enumerate(futures):
+            if future is None:
+                line = {"index": index, "error": "缺少图片或文本"}
+            else:
+                try:
+                    line = {"index": index, "result": future.result()}
+                except Exception as e:
+                    line = {"index": index, "error": str(e)}
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/health', methods=['GET'])
+def health():
+    """存活检查"""
+    return jsonify({"status": "ok"})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """就绪检查
+    
+    模型已加载且当前worker的批处理线程已启动时返回200，否则返回503
+    
+    返回:
+        dict: 就绪状态、进程号、PyTorch线程数和推理后端
+    """
+    batcher.start()
+    if detector is None or not batcher.is_alive():
+        return jsonify({"status": "not ready"}), 503
+    return jsonify({
+        "status": "ready",
+        "pid": os.getpid(),
+        "torch_threads": torch.get_num_threads(),
+        "inference_backend": type(detector.backend).__name__
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """以Prometheus文本格式导出各推理阶段的耗时直方图(按worker进程统计)"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
-    # 使用不同于主应用的端口
-    app.run(host='0.0.0.0', port=5001)
\ No newline at end of file
+    # 使用不同于主应用的端口；生产环境使用 gunicorn -c gunicorn_hammer.py deepfake_service:app
+    app.run(host='0.0.0.0', port=5001, threaded=True)
\ No newline at end of file
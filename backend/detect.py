@@ -1,29 +1,60 @@
 import torch
 import torch.nn.functional as F
-from PIL import Image, ImageDraw
+from PIL import Image
 import yaml
 from torchvision import transforms
 from transformers import BertTokenizerFast
 from dataset.utils import pre_caption
 import numpy as np
 import os
+import io
 # 导入必要的模型文件
 from models.HAMMER import HAMMER
 from models.vit import interpolate_pos_embed
 from models import box_ops
+from render_worker import render_annotated_image
+from inference_backend import build_inference_backend
+from tracing import logger, stage, observe_batch_size, debug_sampled
+
+# 多分类头各输出位对应的操纵类型
+MANIPULATION_TYPES = ["face_swap", "face_attribute", "text_swap", "text_attribute"]
 
 class DeepFakeDetector:
-    def __init__(self, config_path, model_path, device='cuda'):
+    def __init__(self, config_path, model_path, device='cuda', renderer=None, result_cache=None, inference_backend=None):
         self.device = torch.device(device if torch.cuda.is_available() else 'cpu')
-        print("device:", self.device)
+        logger.info("device: %s", self.device)
+        # 标注图片的渲染器(RenderWorker)，为None时在predict中同步渲染
+        self.renderer = renderer
+        # 推理结果缓存(ResultCache)，为None时不缓存
+        self.result_cache = result_cache
         self.config = yaml.load(open(config_path, 'r'), Loader=yaml.Loader)
         
         self.text_encoder = './bert/'
         # self.text_encoder = 'bert-base-uncased'
         self.tokenizer = BertTokenizerFast.from_pretrained(self.text_encoder)
         
-        print("creating HAMMER...")
-        self.model = HAMMER(
+        if model_path.endswith('.safetensors'):
+            self.model = self.load_compiled_model(model_path)
+        else:
+            self.model = self.load_checkpoint_model(model_path)
+        
+        self.model.to(self.device)
+        self.model.eval()
+        # 图像预处理
+        self.image_transform = transforms.Compose([
+            transforms.Resize((self.config['image_res'], self.config['image_res']), interpolation=transforms.InterpolationMode.BICUBIC),
+            transforms.ToTensor(),
+            transforms.Normalize((0.48145466, 0.4578275, 0.40821073), (0.26862954, 0.26130258, 0.27577711)),
+        ])
+        # 推理后端(eager/quantized/torchscript/onnx)，默认读取配置中的inference_backend
+        self.backend = build_inference_backend(
+            self.model, self.config, self.device, self.example_inputs, backend=inference_backend
+        )
+
+    def load_checkpoint_model(self, model_path):
+        """从原始.pth checkpoint构建模型：DeiT初始化、pos_embed插值后加载权重"""
+        logger.info("creating HAMMER...")
+        model = HAMMER(
             args=None, 
             config=self.config, 
             text_encoder=self.text_encoder, 
@@ -34,36 +65,68 @@ class DeepFakeDetector:
         checkpoint = torch.load(model_path, map_location='cpu')
         state_dict = checkpoint['model']
         
-        pos_embed_reshaped = interpolate_pos_embed(state_dict['visual_encoder.pos_embed'], self.model.visual_encoder)
+        pos_embed_reshaped = interpolate_pos_embed(state_dict['visual_encoder.pos_embed'], model.visual_encoder)
         state_dict['visual_encoder.pos_embed'] = pos_embed_reshaped
         
-        msg = self.model.load_state_dict(state_dict, strict=False)
-        print('loading checkpoint:', model_path)
-        print(msg)
+        msg = model.load_state_dict(state_dict, strict=False)
+        logger.info('loading checkpoint: %s', model_path)
+        logger.info('%s', msg)
+        return model
+
+    def load_compiled_model(self, model_path):
+        """从compile_weights.py生成的safetensors权重构建模型
         
-        self.model.to(self.device)
-        self.model.eval()
-        # 图像预处理
-        self.image_transform = transforms.Compose([
-            transforms.Resize((self.config['image_res'], self.config['image_res']), interpolation=transforms.InterpolationMode.BICUBIC),
-            transforms.ToTensor(),
-            transforms.Normalize((0.48145466, 0.4578275, 0.40821073), (0.26862954, 0.26130258, 0.27577711)),
-        ])
+        权重已经完成pos_embed插值且包含全部参数，因此跳过DeiT初始化；
+        safetensors以内存映射方式读取文件，没有pickle反序列化，也会正确恢复共享权重
+        """
+        from safetensors.torch import load_model
+        logger.info("creating HAMMER from compiled weights...")
+        model = HAMMER(
+            args=None, 
+            config=self.config, 
+            text_encoder=self.text_encoder, 
+            tokenizer=self.tokenizer, 
+            init_deit=False
+        )
+        missing, unexpected = load_model(model, model_path, strict=False)
+        logger.info('loading compiled weights: %s', model_path)
+        logger.info('missing keys: %s, unexpected keys: %s', missing, unexpected)
+        return model
+
+    def example_inputs(self, batch_size=2):
+        """构造一组示例输入，用于trace和导出推理图
+
+        默认batch为2、文本长度各不相同，避免trace把batch为1时的广播和定长序列固化到图中
+        """
+        image = torch.zeros(batch_size, 3, self.config['image_res'], self.config['image_res']).to(self.device)
+        captions = ["an example caption for tracing" + " with more words" * i for i in range(batch_size)]
+        text_input = self.load_texts(captions)
+        return image, text_input
         
-    def load_image(self, image_path):
-        print("loading image...")
+    def decode_image(self, image_path, image_data=None):
+        """解码图片，传入image_data(原始字节)时直接在内存中解码，不再读取磁盘"""
         try:
-            image = Image.open(image_path).convert("RGB")
+            if image_data is not None:
+                image = Image.open(io.BytesIO(image_data)).convert("RGB")
+            else:
+                image = Image.open(image_path).convert("RGB")
         except Warning:
             raise ValueError("### Warning: fakenews Image.open")
+        return image
+
+    def load_image(self, image_path, image_data=None):
+        image = self.decode_image(image_path, image_data)
         W, H = image.size
         image_tensor = self.image_transform(image).unsqueeze(0)  # Add batch dimension
-        return W, H, image_tensor.to(self.device)
+        # 同时返回解码后的图片，供标注检测框复用，避免二次解码
+        return W, H, image_tensor.to(self.device), image
 
     def load_text(self, text):
-        print("loading text...")
+        return self.load_texts([text])
+
+    def load_texts(self, texts):
         text_token = self.tokenizer(
-            [text],  #模仿批处理
+            list(texts),
             max_length=128, 
             truncation=True, 
             add_special_tokens=True, 
@@ -71,14 +134,13 @@ class DeepFakeDetector:
             return_token_type_ids=False,
             # return_tensors='pt'
         )
-        print("text_token:", text_token)
+        # text_input_adjust 会把整批文本补齐到同一长度
         text_input = self.text_input_adjust(text_token)
-        print("text_input:", text_input)
+        debug_sampled("text_input: %s", text_input)
         return text_input
 
     def text_input_adjust(self, text_input, fake_word_pos=None):
         # 输入ID适配
-        print("text input adjust...")
         input_ids_remove_SEP = [x[:-1] for x in text_input.input_ids]
         maxlen = max([len(x) for x in text_input.input_ids])-1
         input_ids_remove_SEP_pad = [x + [0] * (maxlen - len(x)) for x in input_ids_remove_SEP]
@@ -91,94 +153,157 @@ class DeepFakeDetector:
         
         return text_input
     
+    def predict(self, image_path, text, image_data=None):
+        return self.predict_batch([(image_path, text, image_data)])[0]
+
     @torch.no_grad()
-    def predict(self, image_path, text):    
-        print("predicting...")
-        W, H, image = self.load_image(image_path)
-        caption = pre_caption(text, self.config['max_words'])
-        text_input = self.load_text(caption)
-        
-        fake_image_box = torch.zeros(1, 4).to(self.device)
-        label = ['unknown']
-        
-        print("predicting...")
-        logits_real_fake, logits_multicls, output_coord, logits_tok = self.model(
-            image, label, text_input, fake_image_box, None, is_train=False
-        )
-        print("calculate probability...")
+    def predict_batch(self, items):
+        """对一批(图片路径, 文本)进行检测，并按样本拆分结果
+        
+        先查询结果缓存，只对未命中的样本做一次批量前向推理
+        
+        参数:
+            items (list): [(image_path, text), ...]、[(image_path, text, image_data), ...]
+                或 [(image_path, text, image_data, image_digest), ...]，
+                image_data为图片原始字节，提供时直接在内存中解码，image_path仅用于命名标注图片；
+                image_digest为ResultCache.image_digest(image_data)，未提供时在这里计算
+        
+        返回:
+            list: 与items顺序一致的检测结果列表
+        """
+        image_paths = [item[0] for item in items]
+        image_datas = [item[2] if len(item) > 2 else None for item in items]
+        captions = [pre_caption(item[1], self.config['max_words']) for item in items]
+        
+        # 命中缓存的样本直接复用之前的检测结果，缓存键按图片原始字节计算，无需先解码
+        results = [None] * len(items)
+        cache_keys = [None] * len(items)
+        if self.result_cache is not None:
+            for b, item in enumerate(items):
+                image_digest = item[3] if len(item) > 3 else None
+                if image_digest is None:
+                    if image_datas[b] is None:
+                        with open(image_paths[b], 'rb') as f:
+                            image_datas[b] = f.read()
+                    image_digest = self.result_cache.image_digest(image_datas[b])
+                cache_keys[b] = self.result_cache.make_key(image_digest, captions[b])
+                results[b] = self.result_cache.get(cache_keys[b])
+        
+        # 只解码需要推理或需要绘制检测框的图片
+        with stage('decode'):
+            decoded_images = {
+                b: self.decode_image(image_paths[b], image_datas[b])
+                for b in range(len(items)) if results[b] is None or results[b]['is_fake']
+            }
+        
+        misses = [b for b in range(len(items)) if results[b] is None]
+        if misses:
+            inferred = self.infer([decoded_images[b] for b in misses], [captions[b] for b in misses])
+            for b, result in zip(misses, inferred):
+                if self.result_cache is not None:
+                    self.result_cache.set(cache_keys[b], result)
+                results[b] = result
+        
+        for b, result in enumerate(results):
+            if result['is_fake']:
+                image_path = image_paths[b]
+                dir_path = os.path.dirname(image_path)
+                base_name = os.path.basename(image_path)
+                file_name, file_ext = os.path.splitext(base_name)
+                
+                # 创建新文件名 filename_output.ext
+                output_filename = f"{file_name}_output{file_ext}"
+                output_path = os.path.join(dir_path, output_filename)
+                # 直接复用推理时解码的图片绘制检测框；配置了后台渲染线程时异步渲染
+                if self.renderer is not None:
+                    self.renderer.submit(decoded_images[b], result['fake_image_box'], output_path)
+                else:
+                    render_annotated_image(decoded_images[b], result['fake_image_box'], output_path)
+                result["detect_image_path"] = output_path
+    
+        return results
+
+    @torch.no_grad()
+    def infer(self, images, captions):
+        """对已解码的图片和预处理后的文本做一次批量前向推理
+        
+        参数:
+            images (list): 已解码的RGB图片(PIL.Image)
+            captions (list): 经过pre_caption处理的文本
+        
+        返回:
+            list: 每个样本的检测结果(不含标注图片路径)
+        """
+        observe_batch_size(len(images))
+        sizes = [image.size for image in images]
+        with stage('transform'):
+            image = torch.stack([self.image_transform(im) for im in images]).to(self.device)
+        with stage('tokenize'):
+            text_input = self.load_texts(captions)
+        with stage('forward'):
+            outputs = self.backend(image, text_input)
+        with stage('postprocess'):
+            return self.decode_outputs(outputs, text_input, sizes, captions)
+
+    def decode_outputs(self, outputs, text_input, sizes, captions):
+        """把一批模型输出解码成检测结果
+        
+        阈值判断、argmax和伪造token的筛选都在张量上对整批完成，
+        并把需要的结果拼成一个张量，整批只做一次到CPU的拷贝
+        """
+        logits_real_fake, logits_multicls, output_coord, logits_tok = outputs
+        batch_size = logits_real_fake.shape[0]
+        
         prob_real_fake = F.softmax(logits_real_fake, dim=1)
-        pred_real_fake = prob_real_fake.argmax(1).item() # 选择概率最大的类别
-        fake_score = prob_real_fake[0, 1].item() #第一个样本中假新闻概率的分数
-        
-        # 处理多分类结果
-        print("calculating multi-class results...")
-        pred_classes = []
-        for i, score in enumerate(logits_multicls[0]):
-            if score >= 0:  # 大于0的视为阳性
-                if i == 0:
-                    pred_classes.append("face_swap")
-                elif i == 1:
-                    pred_classes.append("face_attribute")
-                elif i == 2:
-                    pred_classes.append("text_swap")
-                elif i == 3:
-                    pred_classes.append("text_attribute")
-        
-        # 处理边界框结果
-        print("processing bounding box results...")
+        pred_real_fake = prob_real_fake.argmax(1)
+        multicls_pred = logits_multicls >= 0  # 大于0的视为阳性
         boxes = box_ops.box_cxcywh_to_xyxy(output_coord)
-        box_coordinates = boxes[0].tolist() #转为python列表
-        
-        # 处理文本标记结果
-        print("processing text token results...")
-        logits_tok_reshape = logits_tok.view(-1, 2)
-        logits_tok_pred = logits_tok_reshape.argmax(1)
-        token_pred = logits_tok_pred.view(text_input.attention_mask[:, 1:].shape)
-        
-        fake_tokens = []
-        for i in range(token_pred.shape[1]):
-            if token_pred[0, i] == 1:
-                fake_tokens.append(i)
-                
-        word_ids = text_input.word_ids(0)
-        fake_word_indices = set()
-        for i in fake_tokens:
-            token_idx = i + 1    # 加1是因为我们跳过了CLS token，所以需要调整索引
+        token_mask = text_input.attention_mask[:, 1:]
+        token_pred = logits_tok.view(-1, 2).argmax(1).view(token_mask.shape)
+        fake_token_mask = (token_pred == 1) & (token_mask == 1)
+        
+        # 每个样本一行: [真假判定, 伪造概率, 4个多分类结果, 4个检测框坐标, 各token是否伪造...]
+        packed = torch.cat([
+            pred_real_fake.unsqueeze(1).float(),
+            prob_real_fake[:, 1:2].float(),
+            multicls_pred.float(),
+            boxes.float(),
+            fake_token_mask.float(),
+        ], dim=1).cpu().numpy()
+        num_classes = multicls_pred.shape[1]
+        box_start = 2 + num_classes
+        token_start = box_start + 4
+        
+        # 伪造token的(样本, token)下标，再经word_ids映射到原文单词
+        fake_word_indices = [set() for _ in range(batch_size)]
+        for b, i in np.argwhere(packed[:, token_start:] > 0.5):
+            word_ids = text_input.word_ids(int(b))
+            token_idx = int(i) + 1    # 加1是因为我们跳过了CLS token，所以需要调整索引
             if token_idx < len(word_ids) and word_ids[token_idx] is not None:
-                fake_word_indices.add(word_ids[token_idx])        
-        words = caption.split()
-        fake_words = [words[i] for i in fake_word_indices if i < len(words)]
-        # 返回结果
-        print("returning results...")
-        result = {
-            "is_fake": bool(pred_real_fake),
-            "fake_probability": fake_score,
-            "manipulation_types": pred_classes, 
-            "fake_image_box": {
-                "x1": box_coordinates[0] * W,
-                "y1": box_coordinates[1] * H,
-                "x2": box_coordinates[2] * W,
-                "y2": box_coordinates[3] * H
-            },
-            "fake_words": fake_words,
-            "original_shape": (W, H)
-        }
-        if result['is_fake']:
-            image = Image.open(image_path).convert("RGB")
-            draw = ImageDraw.Draw(image)
-            box = result['fake_image_box']
-            draw.rectangle([box['x1'], box['y1'], box['x2'], box['y2']], outline="red", width=3)
-            dir_path = os.path.dirname(image_path)
-            base_name = os.path.basename(image_path)
-            file_name, file_ext = os.path.splitext(base_name)
-            
-            # 创建新文件名 filename_output.ext
-            output_filename = f"{file_name}_output{file_ext}"
-            output_path = os.path.join(dir_path, output_filename)
-            image.save(output_path)
-            result["detect_image_path"] = output_path
-    
-        return result
+                fake_word_indices[b].add(word_ids[token_idx])
+        
+        results = []
+        for b in range(batch_size):
+            W, H = sizes[b]
+            row = packed[b]
+            words = captions[b].split()
+            x1, y1, x2, y2 = row[box_start:token_start].tolist()
+            results.append({
+                "is_fake": bool(row[0] > 0.5),
+                "fake_probability": float(row[1]),
+                "manipulation_types": [
+                    MANIPULATION_TYPES[i] for i in np.flatnonzero(row[2:box_start] > 0.5) if i < len(MANIPULATION_TYPES)
+                ],
+                "fake_image_box": {
+                    "x1": x1 * W,
+                    "y1": y1 * H,
+                    "x2": x2 * W,
+                    "y2": y2 * H
+                },
+                "fake_words": [words[i] for i in sorted(fake_word_indices[b]) if i < len(words)],
+                "original_shape": (W, H)
+            })
+        return results
 
 if __name__ == "__main__":
     import argparse
@@ -187,10 +312,11 @@ if __name__ == "__main__":
     parser.add_argument('--model_path', default='HAMMER_checkpoint_best.pth')
     parser.add_argument('--image_path', required=True)
     parser.add_argument('--text', required=True)
+    parser.add_argument('--backend', default=None, help='覆盖配置中的inference_backend')
     
     args = parser.parse_args()
     
-    detector = DeepFakeDetector(args.config, args.model_path)
+    detector = DeepFakeDetector(args.config, args.model_path, inference_backend=args.backend)
     result = detector.predict(args.image_path, args.text)
     
     print("Detection Result:")
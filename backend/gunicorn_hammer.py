@@ -0,0 +1,39 @@
+# deepfake检测微服务的gunicorn配置
+# 启动: gunicorn -c gunicorn_hammer.py deepfake_service:app
+import gc
+import multiprocessing
+import os
+import torch
+
+bind = "0.0.0.0:5001"
+workers = int(os.environ.get('HAMMER_WORKERS', 2))
+# 每个worker内多线程接收请求，让微批处理队列有机会把并发请求合并成一批
+worker_class = "gthread"
+threads = int(os.environ.get('HAMMER_WORKER_THREADS', 8))
+# 在master进程中加载模型后再fork，各worker以写时复制方式共享只读的模型权重，避免N倍内存
+preload_app = True
+timeout = 300
+accesslog = "-"
+errorlog = "-"
+loglevel = "info"
+
+# 每个worker的PyTorch算子内线程数，默认按CPU核数平均分配，避免多个worker互相抢占
+torch_threads = int(os.environ.get('HAMMER_TORCH_THREADS', 0)) or max(1, multiprocessing.cpu_count() // workers)
+
+# 算子间线程数只能在任何并行计算开始前设置一次，而preload_app会在master中加载模型并预热，
+# 所以在加载配置时(早于加载应用)设置，fork出的worker沿用该设置
+try:
+    torch.set_num_interop_threads(int(os.environ.get('HAMMER_INTEROP_THREADS', 1)))
+except RuntimeError:
+    # 重新加载配置(HUP)时master中已经执行过推理，保持原来的设置
+    pass
+
+
+def pre_fork(server, worker):
+    # 把master中已加载的对象移出GC跟踪，避免worker中GC扫描时触发写时复制
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    torch.set_num_threads(torch_threads)
+    server.log.info(f"worker {worker.pid} torch threads: {torch_threads}")
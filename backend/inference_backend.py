@@ -0,0 +1,199 @@
+import hashlib
+import os
+from types import SimpleNamespace
+import torch
+from torch import nn
+from tracing import logger
+
+# 可选的推理后端，在配置YAML中通过 inference_backend 选择
+#   eager:       原始fp32模型，动态图执行
+#   quantized:   对BERT文本编码器和ViT视觉编码器做int8动态量化，动态图执行
+#   torchscript: 在quantized(或eager)模型基础上以batch为2的输入trace成TorchScript图
+#   onnx:        导出ONNX图并用ONNX Runtime在CPU上推理，可选int8动态量化
+# torchscript和onnx构建后用另一个batch大小试运行一次，图不支持动态batch时回退到动态图执行
+INFERENCE_BACKENDS = ('eager', 'quantized', 'torchscript', 'onnx')
+
+
+class HAMMERInferenceWrapper(nn.Module):
+    """把HAMMER的推理前向包装成只接收张量的形式，用于trace和ONNX导出"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, image, input_ids, attention_mask):
+        batch_size = image.shape[0]
+        text_input = SimpleNamespace(input_ids=input_ids, attention_mask=attention_mask)
+        fake_image_box = torch.zeros(batch_size, 4, device=image.device)
+        label = ['unknown'] * batch_size
+        return self.model(image, label, text_input, fake_image_box, None, is_train=False)
+
+
+class EagerBackend:
+    """直接调用PyTorch模型推理"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, image, text_input):
+        batch_size = image.shape[0]
+        fake_image_box = torch.zeros(batch_size, 4).to(image.device)
+        label = ['unknown'] * batch_size
+        return self.model(image, label, text_input, fake_image_box, None, is_train=False)
+
+
+class TorchScriptBackend:
+    """调用trace后的TorchScript图推理"""
+
+    def __init__(self, traced):
+        self.traced = traced
+
+    def __call__(self, image, text_input):
+        return self.traced(image, text_input.input_ids, text_input.attention_mask)
+
+
+class OnnxBackend:
+    """调用ONNX Runtime会话推理"""
+
+    def __init__(self, session, device):
+        self.session = session
+        self.device = device
+
+    def __call__(self, image, text_input):
+        outputs = self.session.run(None, {
+            'image': image.cpu().numpy(),
+            'input_ids': text_input.input_ids.cpu().numpy(),
+            'attention_mask': text_input.attention_mask.cpu().numpy(),
+        })
+        return tuple(torch.from_numpy(output).to(self.device) for output in outputs)
+
+
+def quantize_encoders(model):
+    """对BERT文本编码器和ViT视觉编码器中的Linear层做int8动态量化(仅支持CPU)"""
+    model.text_encoder = torch.ao.quantization.quantize_dynamic(model.text_encoder, {nn.Linear}, dtype=torch.qint8)
+    model.visual_encoder = torch.ao.quantization.quantize_dynamic(model.visual_encoder, {nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def build_inference_backend(model, config, device, example_inputs, backend=None):
+    """根据配置构建推理后端
+
+    参数:
+        model (HAMMER): 已加载权重并切换到eval模式的模型
+        config (dict): 模型配置，读取以下可选键
+            inference_backend (str): eager / quantized / torchscript / onnx，默认eager
+            inference_quantize (bool): torchscript和onnx后端是否做int8量化，默认True
+            inference_export_dir (str): ONNX导出文件的保存目录，默认 ./export
+        device (torch.device): 推理设备
+        example_inputs (callable): example_inputs(batch_size) 返回 (image, text_input) 示例输入，trace和导出时使用
+        backend (str, 可选): 覆盖配置中的 inference_backend
+
+    返回:
+        callable: backend(image, text_input) -> (logits_real_fake, logits_multicls, output_coord, logits_tok)
+    """
+    backend = backend or config.get('inference_backend', 'eager')
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"不支持的推理后端: {backend}，可选: {', '.join(INFERENCE_BACKENDS)}")
+    if backend != 'eager' and device.type != 'cpu':
+        logger.warning("推理后端 %s 仅用于CPU推理，当前设备为 %s，回退到eager", backend, device)
+        backend = 'eager'
+    logger.info("inference backend: %s", backend)
+
+    quantize = config.get('inference_quantize', True)
+    export_dir = config.get('inference_export_dir', './export')
+
+    if backend == 'eager':
+        return EagerBackend(model)
+
+    if backend == 'quantized':
+        return EagerBackend(quantize_encoders(model))
+
+    if backend == 'torchscript':
+        if quantize:
+            model = quantize_encoders(model)
+        image, text_input = example_inputs(2)
+        with torch.no_grad():
+            traced = torch.jit.trace(
+                HAMMERInferenceWrapper(model).eval(),
+                (image, text_input.input_ids, text_input.attention_mask),
+                check_trace=False
+            )
+        traced = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+        backend_fn = TorchScriptBackend(traced)
+        if not supports_dynamic_batch(backend_fn, example_inputs):
+            logger.warning("TorchScript图不支持trace时以外的batch大小，回退到%s", 'quantized' if quantize else 'eager')
+            return EagerBackend(model)
+        return backend_fn
+
+    # onnx
+    try:
+        import onnxruntime
+    except ImportError:
+        raise RuntimeError("使用onnx推理后端需要先安装onnxruntime: pip install onnxruntime")
+    if not os.path.exists(export_dir):
+        os.makedirs(export_dir)
+    # 导出文件名带权重指纹，更新checkpoint或编译权重后自动重新导出，不会复用旧的图
+    fingerprint = weights_fingerprint(model)
+    onnx_path = export_onnx(model, example_inputs, os.path.join(export_dir, f'hammer-{fingerprint}.onnx'))
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        int8_path = os.path.join(export_dir, f'hammer-{fingerprint}.int8.onnx')
+        if not os.path.exists(int8_path):
+            quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+        onnx_path = int8_path
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = onnxruntime.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+    backend_fn = OnnxBackend(session, device)
+    if not supports_dynamic_batch(backend_fn, example_inputs):
+        logger.warning("ONNX图不支持导出时以外的batch大小，回退到eager")
+        return EagerBackend(model)
+    return backend_fn
+
+
+def supports_dynamic_batch(backend_fn, example_inputs):
+    """用与trace时不同的batch大小和文本长度运行一次，检查各输出的batch维是否跟随输入"""
+    image, text_input = example_inputs(3)
+    try:
+        with torch.no_grad():
+            outputs = backend_fn(image, text_input)
+    except Exception as e:
+        logger.warning("动态batch检查失败: %s", e)
+        return False
+    return all(output.shape[0] == 3 for output in outputs)
+
+
+def weights_fingerprint(model):
+    """模型权重的sha256指纹(前16位)，用于区分不同权重导出的ONNX文件"""
+    hasher = hashlib.sha256()
+    for name, tensor in model.state_dict().items():
+        hasher.update(name.encode('utf-8'))
+        hasher.update(tensor.detach().cpu().contiguous().view(-1).view(torch.uint8).numpy().tobytes())
+    return hasher.hexdigest()[:16]
+
+
+def export_onnx(model, example_inputs, onnx_path):
+    """导出fp32的ONNX图，同一份权重(文件名中的指纹相同)已导出时直接复用"""
+    if os.path.exists(onnx_path):
+        return onnx_path
+    logger.info("exporting onnx: %s", onnx_path)
+    image, text_input = example_inputs(2)
+    with torch.no_grad():
+        torch.onnx.export(
+            HAMMERInferenceWrapper(model).eval(),
+            (image, text_input.input_ids, text_input.attention_mask),
+            onnx_path,
+            input_names=['image', 'input_ids', 'attention_mask'],
+            output_names=['logits_real_fake', 'logits_multicls', 'output_coord', 'logits_tok'],
+            dynamic_axes={
+                'image': {0: 'batch'},
+                'input_ids': {0: 'batch', 1: 'seq'},
+                'attention_mask': {0: 'batch', 1: 'seq'},
+                'logits_real_fake': {0: 'batch'},
+                'logits_multicls': {0: 'batch'},
+                'output_coord': {0: 'batch'},
+                'logits_tok': {0: 'batch', 1: 'seq'},
+            },
+            opset_version=17
+        )
+    return onnx_path
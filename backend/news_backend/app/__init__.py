@@ -58,8 +58,46 @@ app.register_blueprint(news_summary_bp, url_prefix='/news_summary')
 from app.api.text_optimization import text_optimization_bp
 app.register_blueprint(text_optimization_bp, url_prefix='/text_optimization')
 
-# 创建数据库表
+from app.api.jobs import jobs_bp
+app.register_blueprint(jobs_bp, url_prefix='/jobs')
+
+# 创建数据库表，并为已有的表补充新增的列
+from app.utils.migrations import ensure_columns, ensure_indexes, ensure_statistics_tables
+from app.models.news_summary import NewsSummary
+from app.models.news_title_generation import NewsTitleGeneration
+from app.models.news_text_optimization import NewsTextOptimization
+from app.models.image_generation import ImageGeneration
+from app.models.news_detection import NewsDetectionHistory
 with app.app_context():
     db.create_all()
+    ensure_columns(ImageGeneration, ['task_id', 'task_status', 'task_output', 'task_claimed_at'])
+    ensure_columns(NewsDetectionHistory, ['is_fake', 'fake_probability', 'detection_type', 'manipulation_types'])
+    for model in (NewsSummary, NewsTitleGeneration, NewsTextOptimization):
+        ensure_columns(model, ['cache_key'])
+    # 历史记录分页使用的 (user_id, 日期, 主键) 联合索引
+    for model in (NewsDetectionHistory, ImageGeneration, NewsSummary, NewsTitleGeneration, NewsTextOptimization):
+        ensure_indexes(model)
+    ensure_statistics_tables()
+
+@app.cli.command('backfill-detections')
+def backfill_detections_command():
+    """为旧的检测记录回填结构化的检测结论，并重建统计表: flask --app run backfill-detections"""
+    from app.utils.migrations import backfill_detection_verdicts, rebuild_detection_counters, rebuild_daily_rollup
+    print(f"已回填 {backfill_detection_verdicts()} 条检测记录")
+    rebuild_detection_counters()
+    print("已重建检测类型计数表")
+    print(f"已重建按天汇总表，共 {rebuild_daily_rollup()} 行")
+
+# 启动后台任务执行线程
+from app.services.job_queue import job_queue
+job_queue.init_app(app)
+
+# DashScope图像生成任务跟踪器，轮询线程在首次跟踪任务时启动
+from app.services.task_tracker import task_tracker
+task_tracker.init_app(app)
+
 
 
+# 统计计数写缓冲，仅在开启 STATISTICS_WRITE_BEHIND 时使用
+from app.services.statistics_buffer import statistics_buffer
+statistics_buffer.init_app(app)
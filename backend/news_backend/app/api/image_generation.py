@@ -3,13 +3,21 @@ import time
 import json
 from app import app, db
 from app.utils.common import api_response, extract_text_from_file
+from app.utils.pagination import parse_page_args, paginate, page_data
 from werkzeug.utils import secure_filename
 from app.models.image_generation import (
-    ImageGeneration, image_generation_schema, image_generations_schema,
+    ImageGeneration, image_generation_schema, image_generations_schema, image_generation_list_schema,
     get_available_image_styles, ImageStyle
 )
-from app.services.image_gen_service import create_image_task, get_task_result, save_generated_image
+from app.services.image_gen_service import create_image_task, thumbnail_url_for
+from app.services.task_tracker import task_tracker, effective_status, FINAL_STATUSES
+from app.services.job_queue import job_queue, register_job
+from app.api.jobs import job_submitted_response, is_async_request
 image_generation_bp = Blueprint('image_generation', __name__)
+# 生成接口同步等待任务结束的最长时间(秒)
+GENERATION_WAIT_SECONDS = 60
+# 任务状态接口长轮询的最长等待时间(秒)
+MAX_TASK_WAIT_SECONDS = 30
 # DASHSCOPE_API_KEY = os.environ.get('DASHSCOPE_API_KEY')
 
 @image_generation_bp.route('/styles', methods=['GET'])
@@ -40,6 +48,9 @@ def generate_image():
         size (str, 可选): 图像尺寸，默认为1024*1024
         num_images (int, 可选): 生成图像数量，默认为1
         style (str, 可选): 图像风格
+        wait (str, 可选): 默认为true，等待生成完成后返回；为0或false时立即返回task_id，通过/task/<task_id>查询
+        async (str, 可选): 为1或true时提交为后台任务，返回job_id(202)
+        callback_url (str, 可选): 后台任务结束后回调的地址
         
     返回:
         JSON: 包含生成图像URL的响应
@@ -85,11 +96,45 @@ def generate_image():
     style_description = next((item['description'] for item in get_available_image_styles() if item['value'] == style), "")
     prompt = f"{prompt}。图片的风格为：{style_description}"
 
+    # async为1或true时提交为后台任务，立即返回job_id
+    if is_async_request(request.form):
+        try:
+            job_id = job_queue.submit(
+                'image_generation',
+                {
+                    'user_id': user_id,
+                    'content': content,
+                    'prompt': prompt,
+                    'style': style,
+                    'size': size,
+                    'num_images': num_images
+                },
+                request.form.get('callback_url')
+            )
+        except ValueError as e:
+            return api_response(False, str(e), status_code=400)
+        return job_submitted_response(job_id)
+    
+    # wait默认为true，等待生成完成后返回图片(兼容原有前端)；为0或false时创建任务后立即返回task_id
+    wait = request.form.get('wait', 'true').lower() not in ('0', 'false')
+    success, message, data, status_code = run_image_generation(user_id, content, prompt, style, size, num_images, wait)
+    return api_response(success, message, data, status_code=status_code)
+
+def run_image_generation(user_id, content, prompt, style, size, num_images, wait=True):
+    """
+    创建图像生成任务并交给任务跟踪器，供同步接口和后台任务共用
+    
+    参数:
+        wait (bool): 是否等待任务结束，最多等待GENERATION_WAIT_SECONDS秒
+    
+    返回:
+        tuple: (success, message, data, status_code)
+    """
     # 步骤1: 创建任务获取task_id
     task_id = create_image_task(prompt, size, num_images)
     
     if not task_id:
-        return api_response(False, "没有创建图片生成任务", status_code=500)
+        return False, "没有创建图片生成任务", None, 500
     
     # 创建数据库记录
     image_generation = ImageGeneration(
@@ -98,96 +143,117 @@ def generate_image():
         image_style=style,
         image_size=size,
         image_num=num_images,
-        task_id=task_id
+        task_id=task_id,
+        task_status='PENDING'
     )
     db.session.add(image_generation)
     db.session.commit()
     
-    # 步骤2: 轮询查询任务结果
-    max_retries = 30
-    retry_interval = 2  # 每2秒查询一次
+    # 步骤2: 由后台任务跟踪器轮询任务状态并下载结果
+    task_tracker.track(task_id)
+    if wait:
+        task_tracker.wait(task_id, GENERATION_WAIT_SECONDS)
+        db.session.refresh(image_generation)
+    return task_result(image_generation)
+
+def task_result(image_generation):
+    """
+    根据任务状态生成响应内容
+    
+    返回:
+        tuple: (success, message, data, status_code)
+    """
+    task_id = image_generation.task_id
+    task_status = effective_status(image_generation)
+    output = None
+    if image_generation.task_output:
+        try:
+            output = json.loads(image_generation.task_output)
+        except ValueError:
+            output = None
     
-    for i in range(max_retries):
-        result = get_task_result(task_id)
+    if task_status == 'SUCCEEDED':
+        images = output
+        if images is None:
+            # 旧记录没有保存结果详情，只返回本地图片地址
+            images = [{'url': path, 'local_path': path} for path in json.loads(image_generation.image_paths or '[]')]
+        return True, "成功生成图片", {'task_id': task_id, 'task_status': task_status, 'images': images}, 200
+    if task_status == 'PARTIAL_SUCCEEDED':
+        return True, "部分图片生成失败", {'task_id': task_id, 'task_status': task_status, 'images': output or []}, 200
+    if task_status == 'FAILED':
+        return False, "任务失败", {'task_id': task_id, 'task_status': task_status, 'details': output or {}}, 500
+    if task_status == 'TIMEOUT':
+        return False, "超时", {'task_id': task_id, 'task_status': task_status}, 408
+    if task_status == 'UNKNOWN':
+        return False, f"未知状态:{(output or {}).get('task_status')}", {'task_id': task_id, 'task_status': task_status}, 500
+    # PENDING/RUNNING/DOWNLOADING
+    return True, "任务进行中", {
+        'task_id': task_id,
+        'task_status': task_status,
+        'status_url': f'/image_generation/task/{task_id}'
+    }, 202
+
+@image_generation_bp.route('/task/<task_id>', methods=['GET'])
+def get_generation_task(task_id):
+    """
+    查询图像生成任务状态，支持长轮询
+    
+    参数:
+        task_id (str): 创建任务时返回的task_id (URL参数)
+        wait (int, 可选): 任务未结束时最多等待的秒数，默认为0立即返回，最大为MAX_TASK_WAIT_SECONDS (查询参数)
         
-        if not result:
-            return api_response(False, "没有得到返回结果", status_code=500)
+    返回:
+        JSON: 任务结束时与生成接口相同的结果，未结束时为202和当前状态
         
-        task_status = result.get('output', {}).get('task_status')
+    异常:
+        404: 任务不存在
+        500: 查询任务失败
+    """
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), MAX_TASK_WAIT_SECONDS)
+    except ValueError:
+        return api_response(False, "wait参数必须是数字", status_code=400)
+    try:
+        image_generation = ImageGeneration.query.filter_by(task_id=task_id).first()
+        if not image_generation:
+            return api_response(False, "任务不存在", status_code=404)
         
-        if task_status == 'SUCCEEDED':
-            # 任务成功，返回图片URL
-            results = result.get('output', {}).get('results', [])
-            
-            # 保存图片到本地
-            saved_images = []
-            image_paths_array = []
-            
-            for idx, image_result in enumerate(results):
-                image_url = image_result.get('url')
-                if image_url:
-                    try:
-                        # 下载并保存图片
-                        image_path = save_generated_image(user_id, image_url, idx)
-                        # 添加本地路径到结果中
-                        static_root = "/root/news_backend/static/"
-                        if image_path.startswith(static_root):
-                            relative_path = image_path[len(static_root):]
-                            image_url = f"http://localhost:6006/static/{relative_path}"
-                            image_result['local_path'] = image_url
-
-                        saved_images.append(image_result)
-                        
-                        # 收集所有图片路径
-                        image_paths_array.append(image_url)
-                    except Exception as e:
-                        app.logger.error(f"保存图片失败: {str(e)}")
-            
-            # 将所有图片路径作为JSON字符串存储到数据库
-            if image_paths_array:
-                image_generation.image_paths = json.dumps(image_paths_array)
+        if effective_status(image_generation) not in FINAL_STATUSES:
+            # 由其他进程创建的任务在本进程中接管跟踪
+            task_tracker.track(task_id)
+            if wait:
+                # 结束读事务，否则REPEATABLE READ下refresh仍读到等待前的快照
                 db.session.commit()
-            
-            return api_response(
-                True, 
-                "成功生成图片", 
-                {
-                    'task_id': task_id,
-                    'images': saved_images
-                })
-        
-        elif task_status == 'FAILED':
-            return api_response(
-                False, 
-                "任务失败", 
-                {
-                    'task_id': task_id,
-                    'details': result.get('output', {})
-                },
-                status_code=500)
+                task_tracker.wait(task_id, wait)
+                db.session.refresh(image_generation)
         
-        elif task_status in ['PENDING', 'RUNNING']:
-            # 任务仍在进行中，等待后再次查询
-            time.sleep(retry_interval)
-            continue
-        
-        else:
-            return api_response(
-                False, 
-                f"未知状态:{task_status}", 
-                {
-                    'task_id': task_id,
-                },
-                status_code=500)
-    
-    # 超过最大重试次数，返回超时错误
-    return api_response(
-                False, 
-                "超时", 
-                {
-                    'task_id': task_id,
-                },
-                status_code=408)
+        success, message, data, status_code = task_result(image_generation)
+        return api_response(success, message, data, status_code=status_code)
+    except Exception as e:
+        return api_response(False, f"查询任务失败: {str(e)}", status_code=500)
+
+@register_job('image_generation')
+def image_generation_job(user_id, content, prompt, style, size, num_images):
+    """后台任务版本的图像生成
+
+    后台任务只负责创建DashScope任务，不占用执行线程等待生成完成；
+    结果中的task_status为任务跟踪器记录的当前状态，图片通过status_url查询。
+    """
+    success, message, data, status_code = run_image_generation(
+        user_id, content, prompt, style, size, num_images, wait=False
+    )
+    return success, message, data
+
+def format_generation_item(item):
+    """处理记录中的图片路径，从JSON字符串转换为数组"""
+    if item.get('image_paths'):
+        try:
+            item['image_paths'] = json.loads(item['image_paths'])
+        except:
+            item['image_paths'] = []
+    # 缩略图与原图一一对应，供历史记录列表展示
+    item['thumbnail_paths'] = [thumbnail_url_for(path) for path in item.get('image_paths') or []]
+    return item
 
 @image_generation_bp.route('/history/<user_id>', methods=['GET'])
 def get_generation_history(user_id):
@@ -196,15 +262,33 @@ def get_generation_history(user_id):
     
     参数:
         user_id (str): 用户ID (URL参数)
+        limit (int, 可选): 每页条数，提供limit或cursor时分页返回列表投影(不含完整提示文本) (查询参数)
+        cursor (str, 可选): 上一页返回的next_cursor (查询参数)
     
     返回:
-        JSON: 包含用户图像生成历史的响应
+        JSON: 包含用户图像生成历史的响应，分页时data为 {items, next_cursor, has_more}
     
     异常:
+        400: 参数无效
         404: 未找到用户的图像生成历史
         500: 获取历史记录失败
     """
     try:
+        try:
+            page = parse_page_args(request.args)
+        except ValueError as e:
+            return api_response(False, str(e), status_code=400)
+        
+        if page:
+            limit, cursor = page
+            history, next_cursor = paginate(
+                ImageGeneration.query.filter_by(user_id=user_id),
+                ImageGeneration.generation_date, ImageGeneration.generation_id,
+                limit, cursor, image_generation_list_schema.Meta.fields
+            )
+            items = [format_generation_item(item) for item in image_generation_list_schema.dump(history)]
+            return api_response(True, "获取图像生成历史成功", page_data(items, next_cursor))
+        
         # 查询历史记录
         history = ImageGeneration.query.filter_by(user_id=user_id).order_by(
             ImageGeneration.generation_date.desc()
@@ -213,14 +297,7 @@ def get_generation_history(user_id):
         if not history:
             return api_response(False, f"未找到用户 {user_id} 的图像生成历史", status_code=404)
         
-        # 处理所有记录中的图片路径，从JSON字符串转换为数组
-        history_data = image_generations_schema.dump(history)
-        for item in history_data:
-            if item.get('image_paths'):
-                try:
-                    item['image_paths'] = json.loads(item['image_paths'])
-                except:
-                    item['image_paths'] = []
+        history_data = [format_generation_item(item) for item in image_generations_schema.dump(history)]
         
         # 返回历史记录
         return api_response(True, "获取图像生成历史成功", history_data)
@@ -228,6 +305,32 @@ def get_generation_history(user_id):
     except Exception as e:
         return api_response(False, f"获取图像生成历史失败: {str(e)}", status_code=500)
 
+@image_generation_bp.route('/history/<user_id>/<int:generation_id>', methods=['GET'])
+def get_generation_detail(user_id, generation_id):
+    """
+    获取用户的一条完整图像生成记录
+    
+    参数:
+        user_id (str): 用户ID (URL参数)
+        generation_id (int): 图像生成记录ID (URL参数)
+    
+    返回:
+        JSON: 包含完整图像生成记录的响应
+    
+    异常:
+        404: 未找到图像生成记录
+        500: 获取图像生成记录失败
+    """
+    try:
+        generation = ImageGeneration.query.filter_by(user_id=user_id, generation_id=generation_id).first()
+        if not generation:
+            return api_response(False, f"未找到ID为{generation_id}的图像生成记录", status_code=404)
+        
+        return api_response(True, "获取图像生成记录成功", format_generation_item(image_generation_schema.dump(generation)))
+    
+    except Exception as e:
+        return api_response(False, f"获取图像生成记录失败: {str(e)}", status_code=500)
+
 # def save_generated_image(user_id, image_url, index=0):
 #     """
 #     下载并保存生成的图片
@@ -0,0 +1,50 @@
+from flask import Blueprint
+from app.services.job_queue import job_queue
+from app.utils.common import api_response
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    查询后台任务状态
+    
+    参数:
+        job_id (str): 提交任务时返回的任务ID (URL参数)
+        
+    返回:
+        JSON: 任务信息，status为queued/running/succeeded/failed，
+              结束后result中为与同步接口相同的 {success, message, data}
+        
+    异常:
+        404: 任务不存在
+        500: 查询任务失败
+    """
+    try:
+        job = job_queue.get(job_id)
+        if job is None:
+            return api_response(False, "任务不存在", status_code=404)
+        job.pop('payload', None)
+        return api_response(True, "获取任务状态成功", job)
+    except Exception as e:
+        return api_response(False, f"获取任务状态失败: {str(e)}", status_code=500)
+
+
+def job_submitted_response(job_id):
+    """异步提交任务后的统一响应"""
+    return api_response(
+        True,
+        "任务已提交",
+        {
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/jobs/{job_id}'
+        },
+        status_code=202
+    )
+
+
+def is_async_request(values):
+    """请求参数async为1或true时以后台任务方式执行"""
+    return values.get('async', '').lower() in ('1', 'true')
@@ -1,18 +1,101 @@
-from flask import Blueprint, request
+from flask import Blueprint, request, Response, stream_with_context
+import json
+import os
+import time
+from collections import deque
 from app import db
 from app.models.news_detection import NewsDetectionHistory, news_detection_schema
 from werkzeug.utils import secure_filename
 import requests
 from dotenv import load_dotenv
-from app.services.image_detection_service import translate_text, save_image, generate_detection_reason
+from app.services.image_detection_service import translate_text, translate_texts, save_image, generate_detection_reason
 from app.services.text_detection_service import detect_text_content, search_related_news
 from app.utils.common import api_response, extract_text_from_file, update_statistics
+from app.utils.pagination import parse_page_args, paginate, page_data
+from app.utils.concurrency import executor, submit_timed, timed
+from app.services.job_queue import job_queue, register_job
+from app.api.jobs import job_submitted_response, is_async_request
 # 加载环境变量
 load_dotenv()
 
+# 批量检测单次允许的最大条数，以及每多少条记录批量写入一次数据库
+MAX_BULK_ITEMS = 256
+BULK_COMMIT_SIZE = 50
+# 每次发送给检测服务的条数，下一段的文本翻译与本段的检测并行
+BULK_CHUNK_SIZE = 32
+
 from flask import Blueprint
 news_detection_bp = Blueprint('news_detection', __name__)
 
+@register_job('text_detection')
+def run_text_detection(user_id, source, content):
+    """
+    执行文本检测并保存检测记录，供同步接口和后台任务共用
+    
+    返回:
+        tuple: (success, message, data)
+    """
+    # 调用检测函数
+    result = detect_text_content(content)
+    
+    if not result["success"]:
+        return False, f"检测失败: {result['error']}", None
+    
+    # 尝试保存到数据库，如果失败，仍然返回检测结果
+    try:
+        # 创建检测记录
+        detection = NewsDetectionHistory(
+            user_id=user_id,
+            source=source,
+            content=content,
+            detection_reason=result["reason"],
+            related_news_links=", ".join(result["related_links"]) if result["related_links"] else "",
+            is_fake=result["is_fake"],
+            detection_type='text'
+        )
+        
+        db.session.add(detection)
+        
+        # 更新统计信息
+        try:
+            update_statistics(int(user_id), result["is_fake"], 'text')
+        except Exception as stat_error:
+            print(f"更新统计信息失败: {str(stat_error)}")
+            # 继续执行，不中断流程
+        
+        # 提交事务
+        db.session.commit()
+        
+        # 成功保存到数据库的情况
+        return (
+            True,
+            "检测完成",
+            {
+                "detection": news_detection_schema.dump(detection),
+                "is_fake": result["is_fake"],
+                "reason": result["reason"],
+                "related_links": result["related_links"]
+            }
+        )
+    except Exception as db_error:
+        print(f"数据库操作失败: {str(db_error)}")
+        try:
+            db.session.rollback()
+        except:
+            pass
+        
+        # 数据库操作失败，但仍然返回检测结果
+        return (
+            True,
+            "检测完成 (注意: 结果未能保存到数据库)",
+            {
+                "is_fake": result["is_fake"],
+                "reason": result["reason"],
+                "related_links": result["related_links"]
+            }
+        )
+
+
 @news_detection_bp.route('/text-detection', methods=['POST'])
 def detect_text_content_api():
     """
@@ -21,6 +104,8 @@ def detect_text_content_api():
     参数(表单):
         user_id (str): 用户ID
         content (str): 文本内容，或上传的文本文件
+        async (str, 可选): 为1或true时提交为后台任务，返回job_id(202)
+        callback_url (str, 可选): 后台任务结束后回调的地址
         
     返回:
         JSON: 包含检测结果的响应
@@ -56,68 +141,48 @@ def detect_text_content_api():
         if not content:
             return api_response(False, "请提供需要检测的文本内容", status_code=400)
         
-        # 调用检测函数
-        result = detect_text_content(content)
-        
-        if not result["success"]:
-            return api_response(False, f"检测失败: {result['error']}", status_code=500)
-        
-        # 尝试保存到数据库，如果失败，仍然返回检测结果
-        try:
-            # 创建检测记录
-            detection = NewsDetectionHistory(
-                user_id=user_id,
-                source=source,
-                content=content,
-                detection_reason=result["reason"],
-                related_news_links=", ".join(result["related_links"]) if result["related_links"] else ""
-            )
-            
-            db.session.add(detection)
-            
-            # 更新统计信息
+        # async为1或true时提交为后台任务，立即返回job_id
+        if is_async_request(request.form):
             try:
-                update_statistics(int(user_id), result["is_fake"])
-            except Exception as stat_error:
-                print(f"更新统计信息失败: {str(stat_error)}")
-                # 继续执行，不中断流程
-            
-            # 提交事务
-            db.session.commit()
-            
-            # 成功保存到数据库的情况
-            return api_response(
-                True,
-                "检测完成",
-                {
-                    "detection": news_detection_schema.dump(detection),
-                    "is_fake": result["is_fake"],
-                    "reason": result["reason"],
-                    "related_links": result["related_links"]
-                }
-            )
-        except Exception as db_error:
-            print(f"数据库操作失败: {str(db_error)}")
-            try:
-                db.session.rollback()
-            except:
-                pass
-            
-            # 数据库操作失败，但仍然返回检测结果
-            return api_response(
-                True,
-                "检测完成 (注意: 结果未能保存到数据库)",
-                {
-                    "is_fake": result["is_fake"],
-                    "reason": result["reason"],
-                    "related_links": result["related_links"]
-                }
-            )
+                job_id = job_queue.submit(
+                    'text_detection',
+                    {'user_id': user_id, 'source': source, 'content': content},
+                    request.form.get('callback_url')
+                )
+            except ValueError as e:
+                return api_response(False, str(e), status_code=400)
+            return job_submitted_response(job_id)
+        
+        success, message, data = run_text_detection(user_id, source, content)
+        if not success:
+            return api_response(False, message, status_code=500)
+        return api_response(True, message, data)
             
     except Exception as e:
         print(f"检测过程发生错误: {str(e)}")
         return api_response(False, f"检测过程中发生错误: {str(e)}", status_code=500)
 
+def format_detection_item(item):
+    """对检测记录做后处理，添加额外信息"""
+    # 确定记录类型
+    if item.get('image_path'):
+        item['detection_type'] = 'image'
+        # 如果有检测后的图像路径，添加到结果中
+        if item.get('detect_image_path'):
+            item['has_detection_result'] = True
+        else:
+            item['has_detection_result'] = False
+    else:
+        item['detection_type'] = 'text'
+    
+    # 处理相关链接，从字符串转为数组
+    if 'related_news_links' in item:
+        if item['related_news_links']:
+            item['related_news_links'] = [link.strip() for link in item['related_news_links'].split(',') if link.strip()]
+        else:
+            item['related_news_links'] = []
+    return item
+
 @news_detection_bp.route('/history/<user_id>', methods=['GET'])
 def get_detection_history(user_id):
     """
@@ -126,16 +191,23 @@ def get_detection_history(user_id):
     参数:
         user_id (str): 用户ID (URL参数)
         type (str, 可选): 过滤历史记录类型，可选值: image, text (查询参数)
+        limit (int, 可选): 每页条数，提供limit或cursor时分页返回列表投影(不含内容全文和检测理由) (查询参数)
+        cursor (str, 可选): 上一页返回的next_cursor (查询参数)
     
     返回:
-        JSON: 包含用户检测历史的响应
+        JSON: 包含用户检测历史的响应，分页时data为 {items, next_cursor, has_more}
         
     异常:
+        400: 参数无效
         500: 获取历史记录失败
     """
     try:
         # 获取查询参数
         detection_type = request.args.get('type')  # 可选参数，用于过滤历史记录类型
+        try:
+            page = parse_page_args(request.args)
+        except ValueError as e:
+            return api_response(False, str(e), status_code=400)
         
         # 构建查询
         query = NewsDetectionHistory.query.filter_by(user_id=user_id)
@@ -150,35 +222,51 @@ def get_detection_history(user_id):
                 query = query.filter(NewsDetectionHistory.image_path.is_(None))
             else:
                 return api_response(False, "无效的检测类型", status_code=400)
+        
+        from app.models.news_detection import news_detections_schema, news_detection_list_schema
+        if page:
+            limit, cursor = page
+            history, next_cursor = paginate(
+                query, NewsDetectionHistory.upload_date, NewsDetectionHistory.detection_id,
+                limit, cursor, news_detection_list_schema.Meta.fields
+            )
+            items = [format_detection_item(item) for item in news_detection_list_schema.dump(history)]
+            return api_response(True, "获取历史记录成功", page_data(items, next_cursor))
+        
         # 按上传时间降序排序并获取结果
         history = query.order_by(NewsDetectionHistory.upload_date.desc()).all()
         
         # 格式化结果
-        from app.models.news_detection import news_detections_schema
-        history_data = news_detections_schema.dump(history)
-        
-        # 对结果进行后处理，添加额外信息
-        for item in history_data:
-            # 确定记录类型
-            if item.get('image_path'):
-                item['detection_type'] = 'image'
-                # 如果有检测后的图像路径，添加到结果中
-                if item.get('detect_image_path'):
-                    item['has_detection_result'] = True
-                else:
-                    item['has_detection_result'] = False
-            else:
-                item['detection_type'] = 'text'
-            
-            # 处理相关链接，从字符串转为数组
-            if item.get('related_news_links'):
-                item['related_news_links'] = [link.strip() for link in item['related_news_links'].split(',') if link.strip()]
-            else:
-                item['related_news_links'] = []
+        history_data = [format_detection_item(item) for item in news_detections_schema.dump(history)]
         
         return api_response(True, "获取历史记录成功", history_data)
     except Exception as e:
         return api_response(False, f"获取历史记录失败: {str(e)}", status_code=500) 
+
+@news_detection_bp.route('/history/<user_id>/<int:detection_id>', methods=['GET'])
+def get_detection_detail(user_id, detection_id):
+    """
+    获取用户的一条完整检测记录
+    
+    参数:
+        user_id (str): 用户ID (URL参数)
+        detection_id (int): 检测记录ID (URL参数)
+    
+    返回:
+        JSON: 包含完整检测记录的响应
+        
+    异常:
+        404: 未找到检测记录
+        500: 获取检测记录失败
+    """
+    try:
+        detection = NewsDetectionHistory.query.filter_by(user_id=user_id, detection_id=detection_id).first()
+        if not detection:
+            return api_response(False, f"未找到ID为{detection_id}的检测记录", status_code=404)
+        
+        return api_response(True, "获取检测记录成功", format_detection_item(news_detection_schema.dump(detection)))
+    except Exception as e:
+        return api_response(False, f"获取检测记录失败: {str(e)}", status_code=500)
     
     
 @news_detection_bp.route('/image-detection', methods=['POST'])
@@ -218,8 +306,26 @@ def detect_image():
             content = request.form.get('content')
         if not content:
             return api_response(False, "请提供需要检测的文本内容", status_code=400)
+        # 获取图片文件
+        image_path = None
+        if 'image' in request.files:
+            image_file = request.files['image']
+            # 只读取一次图片字节，既用于保存历史记录，也直接发送给检测服务
+            image_data = image_file.read()
+            image_path = save_image(user_id, image_file, image_data)
+            print(image_path)
+        else:
+            return api_response(False, "请提供需要检测的图片文件", status_code=400)
+        
+        # 各阶段耗时(毫秒)，随结果一起返回
+        timings = {}
+        started = time.perf_counter()
+        # 翻译和相关新闻搜索互不依赖，并发执行；搜索使用原始中文内容
+        translate_future = submit_timed(timings, 'translate', translate_text, content)
+        search_future = submit_timed(timings, 'search', search_related_news, content)
+        
         # 调用DeepSeek API进行翻译
-        translated_text = translate_text(content)
+        translated_text = translate_future.result()
         if not translated_text:
             # 如果翻译失败，使用原始内容
             print("翻译失败，使用原始内容")
@@ -227,92 +333,278 @@ def detect_image():
         else:
             print(f"翻译成功: {translated_text[:100]}...")
             text = translated_text
-        
-        # 获取图片文件
-        image_path = None
-        if 'image' in request.files:
-            image_file = request.files['image']
-            image_path = save_image(user_id, image_file)
-            print(image_path)
-        else:
-            return api_response(False, "请提供需要检测的图片文件", status_code=400)
                 
-        # 调用微服务API
+        # 调用微服务API，图片字节随请求发送，检测服务无需再从磁盘读取
+        try:
+            response = timed(
+                timings, 'detect', requests.post,
+                'http://localhost:5001/detect',
+                files={'image': (os.path.basename(image_path), image_data)},
+                data={'image_path': image_path, 'text': text},
+                timeout=300
+            )
+        except requests.RequestException as e:
+            return api_response(False, f"调用检测服务失败: {str(e)}", status_code=500)
+        if response.status_code != 200:
+            return api_response(False, f"检测失败: {response.text}", status_code=response.status_code)
+        result = response.json()
+        
+        # 生成检测理由(远程调用)
+        detection_reason = None
+        if result.get("is_fake"):
+            try:
+                detection_reason = timed(
+                    timings, 'reason', generate_detection_reason,
+                    manipulation_types=result.get("manipulation_types", []),
+                    fake_words=result.get("fake_words", []),
+                    text=content,  # 使用原始中文内容生成理由
+                    fake_probability=result.get("fake_probability", 0)
+                )
+            except Exception as ai_error:
+                print(f"生成检测理由失败: {str(ai_error)}")
+        
+        # 等待相关新闻链接，失败时也不中断流程
+        related_news_links = []
         try:
-            json_data = {
+            related_news_links = search_future.result()
+        except Exception as search_error:
+            print(f"搜索相关新闻链接失败: {str(search_error)}")
+        # 将新生成的字段添加到结果中
+        result["detection_reason"] = detection_reason
+        result["related_news_links"] = related_news_links
+        
+        # 所有远程调用结束后再写数据库，事务只持有统计行锁几毫秒，
+        # 不会让其他请求排队等待LLM调用
+        db_error = None
+        db_started = time.perf_counter()
+        try:
+            detection = NewsDetectionHistory(
+                user_id=user_id,
+                source=source,
+                content=content,
+                image_path=image_path,
+                detect_image_path=result.get("detect_image_path"),
+                detection_reason=detection_reason,
+                related_news_links=", ".join(related_news_links) if related_news_links else "",
+                is_fake=bool(result.get("is_fake")),
+                fake_probability=result.get("fake_probability"),
+                detection_type='image',
+                manipulation_types=result.get("manipulation_types")
+            )
+            db.session.add(detection)
+            # 更新统计信息
+            try:
+                update_statistics(int(user_id), result["is_fake"], 'image')
+            except Exception as stat_error:
+                print(f"更新统计信息失败: {str(stat_error)}")
+            # 提交事务
+            db.session.commit()
+        except Exception as e:
+            db_error = e
+        timings['db_write'] = round((time.perf_counter() - db_started) * 1000, 1)
+        timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+        result["stage_timings"] = timings
+        
+        if db_error is not None:
+            print(f"数据库操作失败: {str(db_error)}")
+            try:
+                db.session.rollback()
+            except:
+                pass
+            # 数据库操作失败，但仍然返回检测结果
+            return api_response(
+                True,
+                "检测完成 (注意: 结果未能保存到数据库)",
+                data=result
+            )
+        # 成功保存到数据库的情况
+        return api_response(
+            True,
+            "检测完成",
+            data=result
+        )
+    except Exception as e:
+        return api_response(False, f"检测过程中发生错误: {str(e)}", status_code=500)
+
+
+@news_detection_bp.route('/image-detection/batch', methods=['POST'])
+def detect_image_batch():
+    """
+    图像与文本联合批量检测API
+    
+    参数(表单):
+        user_id (str): 用户ID
+        images (file[]): 多个图像文件
+        contents (str[]): 与images一一对应的文本内容
+        
+    返回:
+        application/x-ndjson: 每行一条检测结果，形如
+            {"index": 0, "success": true, "data": {...}}
+        检测失败的条目为 {"index": 0, "success": false, "message": "..."}
+        最后一行为汇总信息 {"done": true, "total": n, "fake_count": m, "saved": k}
+        
+    异常:
+        400: 参数缺失或图片与文本数量不一致
+        401: 未提供用户ID
+        500: 保存图片失败
+    """
+    user_id = request.form.get('user_id')
+    if not user_id:
+        return api_response(False, "请先登录", status_code=401)
+    
+    image_files = request.files.getlist('images')
+    contents = request.form.getlist('contents')
+    if not image_files or not contents:
+        return api_response(False, "请提供需要检测的图片和文本", status_code=400)
+    if len(image_files) != len(contents):
+        return api_response(False, "图片数量与文本数量不一致", status_code=400)
+    if len(image_files) > MAX_BULK_ITEMS:
+        return api_response(False, f"单次最多检测{MAX_BULK_ITEMS}条", status_code=400)
+    
+    # 先保存图片，文本翻译和检测在输出流中分段进行
+    try:
+        items = []
+        for image_file, content in zip(image_files, contents):
+            image_data = image_file.read()
+            image_path = save_image(user_id, image_file, image_data)
+            items.append({
                 'image_path': image_path,
-                'text': text,
-            }
-            response = requests.post('http://localhost:5001/detect', json=json_data, timeout=300)
-            
-            if response.status_code == 200:
-                result = response.json()
-                
-                # 生成检测理由
-                detection_reason = None
-                related_news_links = []
-                
+                'image_data': image_data,
+                'content': content
+            })
+    except Exception as e:
+        return api_response(False, f"保存图片失败: {str(e)}", status_code=500)
+    
+    def detect_chunk(chunk, translated_texts):
+        # 把一段数据发送给检测服务，逐条返回检测服务输出的结果
+        response = requests.post(
+            'http://localhost:5001/detect_batch',
+            files=[('images', (os.path.basename(item['image_path']), item['image_data'])) for item in chunk],
+            data={
+                'texts': [translated_text or item['content'] for item, translated_text in zip(chunk, translated_texts)],
+                'image_paths': [item['image_path'] for item in chunk]
+            },
+            timeout=300,
+            stream=True
+        )
+        with response:
+            if response.status_code != 200:
+                raise RuntimeError(f"检测失败: {response.text}")
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+    
+    def generate():
+        pending = []  # (检测记录, 是否虚假)，等待批量写入
+        waiting = deque()  # (index, item, result, 检测理由Future)，按检测顺序输出
+        saved = 0
+        fake_count = 0
+        total = 0
+        
+        def flush():
+            # 批量写入检测记录，统计信息在同一个短事务中更新，不会跨越LLM调用持有行锁
+            nonlocal saved
+            if not pending:
+                return
+            try:
+                for detection, is_fake in pending:
+                    db.session.add(detection)
+                    try:
+                        update_statistics(int(user_id), is_fake, 'image')
+                    except Exception as stat_error:
+                        print(f"更新统计信息失败: {str(stat_error)}")
+                db.session.commit()
+                saved += len(pending)
+            except Exception as db_error:
+                print(f"数据库操作失败: {str(db_error)}")
+                db.session.rollback()
+            pending.clear()
+        
+        def finish(index, item, result, reason_future):
+            # 取得检测理由，加入待写入列表，返回该条结果的输出行
+            detection_reason = None
+            if reason_future is not None:
                 try:
-                    # 生成检测理由
-                    if result.get("is_fake"):
-                        manipulation_types = result.get("manipulation_types", [])
-                        fake_words = result.get("fake_words", [])
-                        detection_reason = generate_detection_reason(
-                            manipulation_types=manipulation_types,
-                            fake_words=fake_words,
-                            text=content,  # 使用原始中文内容生成理由
-                            fake_probability=result.get("fake_probability", 0)
-                        )
-                    
-                    # 搜索相关新闻链接
-                    related_news_links = search_related_news(content)  # 使用原始中文内容搜索新闻
-                    
-                    # 将新生成的字段添加到结果中
-                    result["detection_reason"] = detection_reason
-                    result["related_news_links"] = related_news_links
+                    detection_reason = reason_future.result()
                 except Exception as ai_error:
-                    print(f"生成检测理由或相关新闻链接失败: {str(ai_error)}")
-                    # 失败时也不中断流程
+                    print(f"生成检测理由失败: {str(ai_error)}")
+            result["detection_reason"] = detection_reason
+            result["related_news_links"] = []
+            
+            pending.append((NewsDetectionHistory(
+                user_id=user_id,
+                source="批量图片检测",
+                content=item['content'],
+                image_path=item['image_path'],
+                detect_image_path=result.get("detect_image_path"),
+                detection_reason=detection_reason,
+                related_news_links="",
+                is_fake=bool(result.get("is_fake")),
+                fake_probability=result.get("fake_probability"),
+                detection_type='image',
+                manipulation_types=result.get("manipulation_types")
+            ), result["is_fake"]))
+            if len(pending) >= BULK_COMMIT_SIZE:
+                flush()
+            return json.dumps({"index": index, "success": True, "data": result}, ensure_ascii=False) + "\n"
+        
+        chunks = [items[start:start + BULK_CHUNK_SIZE] for start in range(0, len(items), BULK_CHUNK_SIZE)]
+        translation = executor.submit(translate_texts, [item['content'] for item in chunks[0]])
+        try:
+            for chunk_index, chunk in enumerate(chunks):
+                start = chunk_index * BULK_CHUNK_SIZE
+                try:
+                    translated_texts = translation.result()
+                except Exception as translate_error:
+                    print(f"批量翻译失败: {str(translate_error)}")
+                    translated_texts = [None] * len(chunk)
+                # 下一段的翻译与本段的检测并行
+                if chunk_index + 1 < len(chunks):
+                    translation = executor.submit(translate_texts, [item['content'] for item in chunks[chunk_index + 1]])
                 
+                reported = set()
                 try:
-                    detection = NewsDetectionHistory(
-                        user_id=user_id,
-                        source=source,
-                        content=content,
-                        image_path=image_path,
-                        detect_image_path=result.get("detect_image_path"),
-                        detection_reason=detection_reason,
-                        related_news_links=", ".join(related_news_links) if related_news_links else ""
-                    )
-                    db.session.add(detection)
-                    # 更新统计信息
-                    try:
-                        update_statistics(int(user_id), result["is_fake"])
-                    except Exception as stat_error:
-                        print(f"更新统计信息失败: {str(stat_error)}")                    
-                    # 提交事务
-                    db.session.commit()
-                    # 成功保存到数据库的情况
-                    return api_response(
-                        True,
-                        "检测完成",
-                        data=result
-                    )
-                except Exception as db_error:
-                    print(f"数据库操作失败: {str(db_error)}")
-                    try:
-                        db.session.rollback()
-                    except:
-                        pass
-                    # 数据库操作失败，但仍然返回检测结果
-                    return api_response(
-                        True,
-                        "检测完成 (注意: 结果未能保存到数据库)",
-                        data=result
-                    )
-            else:
-                return api_response(False, f"检测失败: {response.text}", status_code=response.status_code)
-        except requests.RequestException as e:
-            return api_response(False, f"调用检测服务失败: {str(e)}", status_code=500)
-    except Exception as e:
-        return api_response(False, f"检测过程中发生错误: {str(e)}", status_code=500)
\ No newline at end of file
+                    for line in detect_chunk(chunk, translated_texts):
+                        index = start + line['index']
+                        item = items[index]
+                        reported.add(index)
+                        total += 1
+                        if 'error' in line:
+                            yield json.dumps({"index": index, "success": False, "message": f"检测失败: {line['error']}"}, ensure_ascii=False) + "\n"
+                            continue
+                        
+                        # 检测理由在共享线程池中生成，不阻塞后续结果的读取
+                        result = line['result']
+                        reason_future = None
+                        if result.get("is_fake"):
+                            fake_count += 1
+                            reason_future = executor.submit(
+                                generate_detection_reason,
+                                manipulation_types=result.get("manipulation_types", []),
+                                fake_words=result.get("fake_words", []),
+                                text=item['content'],
+                                fake_probability=result.get("fake_probability", 0)
+                            )
+                        waiting.append((index, item, result, reason_future))
+                        
+                        # 按顺序输出理由已经生成好的结果
+                        while waiting and (waiting[0][3] is None or waiting[0][3].done()):
+                            yield finish(*waiting.popleft())
+                except Exception as detect_error:
+                    # 本段调用检测服务失败，尚未返回结果的条目逐条输出错误，继续检测下一段
+                    print(f"调用检测服务失败: {str(detect_error)}")
+                    for index in range(start, start + len(chunk)):
+                        if index not in reported:
+                            total += 1
+                            yield json.dumps({"index": index, "success": False, "message": f"调用检测服务失败: {str(detect_error)}"}, ensure_ascii=False) + "\n"
+            
+            while waiting:
+                yield finish(*waiting.popleft())
+        finally:
+            # 客户端中途断开时，已检测的结果仍然保存
+            while waiting:
+                finish(*waiting.popleft())
+            flush()
+        yield json.dumps({"done": True, "total": total, "fake_count": fake_count, "saved": saved}, ensure_ascii=False) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify
 from app import db
 from app.models.news_statistics import (
-    NewsStatistics, NewsStatisticsByUser, 
+    NewsStatistics, NewsStatisticsByUser, DetectionTypeCounter, DailyDetectionRollup,
     news_stats_schema, news_stats_by_user_schema, news_stats_by_users_schema
 )
 from app.models.news_detection import NewsDetectionHistory
@@ -9,9 +9,17 @@ from app.utils.time_util import china_time_now
 from sqlalchemy import func, desc, case     
 from datetime import datetime, timedelta
 from app.utils.common import api_response
+from app.utils.migrations import derive_is_fake, aggregate_detection_types
 
 news_statistics_bp = Blueprint('news_statistics', __name__)
 
+# 趋势统计粒度 -> 日期所属统计周期的第一天
+TREND_BUCKETS = {
+    'day': lambda date: date,
+    'week': lambda date: date - timedelta(days=date.weekday()),
+    'month': lambda date: date.replace(day=1)
+}
+
 @news_statistics_bp.route('/global', methods=['GET'])
 def get_global_statistics():
     """
@@ -75,45 +83,48 @@ def get_detection_trend():
     
     参数:
         days (int, 可选): 要查询的天数，默认为7天 (查询参数)
+        granularity (str, 可选): 统计粒度，day / week / month，默认为day (查询参数)
+        type (str, 可选): 只统计某种检测类型，text / image，默认统计全部 (查询参数)
     
     返回:
-        JSON: 包含检测趋势数据的响应
+        JSON: 包含检测趋势数据的响应，date为每个统计周期的第一天
         
     异常:
+        400: 参数无效
         500: 获取检测趋势数据失败
     """
     try:
         # 获取查询参数
         days = request.args.get('days', 7, type=int)  # 默认过去7天
+        granularity = request.args.get('granularity', 'day')
+        detection_type = request.args.get('type')
+        if granularity not in TREND_BUCKETS:
+            return api_response(False, f"granularity 只支持 {', '.join(TREND_BUCKETS)}", status_code=400)
         
         # 计算起始日期（使用中国时区）
-        start_date = china_time_now() - timedelta(days=days)
-        
-        # 按日期分组统计检测数量
-        daily_counts = db.session.query(
-            func.date(NewsDetectionHistory.upload_date).label('date'),
-            func.count().label('count'),
-            func.sum(case((NewsDetectionHistory.detection_reason.ilike('%虚假%'), 1), else_=0)).label('fake_count'),
-            func.sum(case((~NewsDetectionHistory.detection_reason.ilike('%虚假%'), 1), else_=0)).label('real_count')
-        ).filter(
-            NewsDetectionHistory.upload_date >= start_date
-        ).group_by(
-            func.date(NewsDetectionHistory.upload_date)
-        ).order_by(
-            func.date(NewsDetectionHistory.upload_date)
-        ).all()
+        start_date = (china_time_now() - timedelta(days=days)).date()
+        
+        # 从按天汇总表读取，每天每种检测类型一行
+        query = DailyDetectionRollup.query.filter(DailyDetectionRollup.date >= start_date)
+        if detection_type:
+            query = query.filter(DailyDetectionRollup.detection_type == detection_type)
+        daily_rows = query.order_by(DailyDetectionRollup.date).all()
         
         # 如果没有数据，返回空数组而不是404
-        if not daily_counts:
+        if not daily_rows:
             return api_response(True, f"过去{days}天内无检测数据", [])
         
+        # 按统计周期合并
+        buckets = {}
+        bucket_of = TREND_BUCKETS[granularity]
+        for row in daily_rows:
+            bucket = buckets.setdefault(bucket_of(row.date), {'total_count': 0, 'fake_count': 0, 'real_count': 0})
+            bucket['total_count'] += row.total_count
+            bucket['fake_count'] += row.fake_count
+            bucket['real_count'] += row.real_count
+        
         # 格式化结果
-        trend_data = [{
-            'date': str(day.date),
-            'total_count': day.count,
-            'fake_count': day.fake_count,
-            'real_count': day.real_count
-        } for day in daily_counts]
+        trend_data = [dict(date=str(date), **counts) for date, counts in buckets.items()]
         
         return api_response(True, "获取检测趋势数据成功", trend_data)
     
@@ -132,44 +143,17 @@ def get_detection_types():
         500: 获取检测类型统计数据失败
     """
     try:
-        # 统计图像检测和文本检测的数量
-        image_count = db.session.query(func.count()).filter(
-            NewsDetectionHistory.image_path.isnot(None)
-        ).scalar() or 0
-        
-        text_count = db.session.query(func.count()).filter(
-            NewsDetectionHistory.image_path.is_(None)
-        ).scalar() or 0
-        
-        # 统计检测结果（真假）
-        fake_count = db.session.query(func.count()).filter(
-            NewsDetectionHistory.detection_reason.ilike('%虚假%')
-        ).scalar() or 0
-        
-        real_count = db.session.query(func.count()).filter(
-            ~NewsDetectionHistory.detection_reason.ilike('%虚假%')
-        ).scalar() or 0
-        
-        # 按照图像检测和文本检测分别统计真假结果
-        image_fake_count = db.session.query(func.count()).filter(
-            NewsDetectionHistory.image_path.isnot(None),
-            NewsDetectionHistory.detection_reason.ilike('%虚假%')
-        ).scalar() or 0
-        
-        image_real_count = db.session.query(func.count()).filter(
-            NewsDetectionHistory.image_path.isnot(None),
-            ~NewsDetectionHistory.detection_reason.ilike('%虚假%')
-        ).scalar() or 0
-        
-        text_fake_count = db.session.query(func.count()).filter(
-            NewsDetectionHistory.image_path.is_(None),
-            NewsDetectionHistory.detection_reason.ilike('%虚假%')
-        ).scalar() or 0
-        
-        text_real_count = db.session.query(func.count()).filter(
-            NewsDetectionHistory.image_path.is_(None),
-            ~NewsDetectionHistory.detection_reason.ilike('%虚假%')
-        ).scalar() or 0
+        # 计数表在写入检测记录时同步更新，每种检测类型一行
+        counts = {
+            counter.detection_type: (counter.total_count, counter.fake_count, counter.real_count)
+            for counter in DetectionTypeCounter.query.all()
+        }
+        if not counts:
+            counts = aggregate_detection_types()
+        image_count, image_fake_count, image_real_count = counts.get('image', (0, 0, 0))
+        text_count, text_fake_count, text_real_count = counts.get('text', (0, 0, 0))
+        fake_count = image_fake_count + text_fake_count
+        real_count = image_real_count + text_real_count
         
         # 组装结果
         result = {
@@ -226,21 +210,25 @@ def get_recent_detections():
         from app.models.news_detection import news_detections_schema
         result = news_detections_schema.dump(recent_detections)
         
-        # 添加额外信息
+        # 尚未回填结论的旧记录按原规则推断
         for item in result:
-            # 确定记录类型
-            if item.get('image_path'):
-                item['detection_type'] = 'image'
-            else:
-                item['detection_type'] = 'text'
-                
-            # 判断是否为虚假内容
-            if item.get('detection_reason') and '虚假' in item['detection_reason']:
-                item['is_fake'] = True
-            else:
-                item['is_fake'] = False
+            if item.get('detection_type') is None:
+                item['detection_type'] = 'image' if item.get('image_path') else 'text'
+            if item.get('is_fake') is None:
+                item['is_fake'] = derive_is_fake(item['detection_type'], item.get('detection_reason'))
         
         return api_response(True, "获取最近检测记录成功", result)
     
     except Exception as e:
-        return api_response(False, f"获取最近检测记录失败: {str(e)}", status_code=500) 
\ No newline at end of file
+        return api_response(False, f"获取最近检测记录失败: {str(e)}", status_code=500) 
+
+@news_statistics_bp.route('/llm-metrics', methods=['GET'])
+def get_llm_metrics():
+    """
+    获取当前进程的大模型调用统计(按用途分类的调用次数、失败数、重试数、耗时和token用量)
+    
+    返回:
+        JSON: 包含大模型调用统计的响应
+    """
+    from app.services.llm_gateway import get_metrics
+    return api_response(True, "获取大模型调用统计成功", get_metrics())
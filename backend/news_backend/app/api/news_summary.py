@@ -1,12 +1,13 @@
 from flask import Blueprint, request, jsonify
 from app import db
 from app.models.news_summary import (
-    NewsSummary, news_summary_schema, news_summaries_schema,
+    NewsSummary, news_summary_schema, news_summaries_schema, news_summary_list_schema,
     get_available_summary_types, SummaryType
 )
 from datetime import datetime
 from app.utils.common import api_response
-from openai import OpenAI
+from app.utils.pagination import parse_page_args, paginate, page_data
+from app.services.response_cache import response_cache, history_lookup, cached_llm_response
 import os
 from dotenv import load_dotenv
 
@@ -55,9 +56,12 @@ def summarize_content():
         user_id (str): 用户ID
         content (str): 需要概括的新闻内容
         summary_type (str, 可选): 概括类型，默认为简短摘要
+        stream (str, 可选): 为1或true时以Server-Sent Events流式返回
     
     返回:
         dict: 包含状态、消息和概括结果的API响应
+        流式返回时为text/event-stream，逐段发送 {"delta": ...}，
+        完成后发送done事件(数据同非流式结果)，出错时发送error事件
     
     异常:
         Exception: 当生成概括失败或处理请求出错时抛出
@@ -90,8 +94,6 @@ def summarize_content():
             if not DEEPSEEK_API_KEY:
                 return api_response(False, "缺少API密钥配置", status_code=500)
             
-            client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com")
-            
             # 根据不同的概括类型设置不同的参数
             max_tokens = 1000
             temperature = 0.5
@@ -104,38 +106,43 @@ def summarize_content():
                 max_tokens = 100
                 temperature = 0.3
             
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": "你是一个专业的内容摘要专家，擅长生成各种类型的内容概括。"},
-                    {"role": "user", "content": SUMMARY_PROMPT.format(
-                        summary_type_description=summary_type_description,
-                        content=content
-                    )}
-                ],
-                max_tokens=max_tokens,
-                temperature=temperature,
-                timeout=120
-            )
-            
-            summary_content = response.choices[0].message.content.strip()
+            messages = [
+                {"role": "system", "content": "你是一个专业的内容摘要专家，擅长生成各种类型的内容概括。"},
+                {"role": "user", "content": SUMMARY_PROMPT.format(
+                    summary_type_description=summary_type_description,
+                    content=content
+                )}
+            ]
             
-            # 保存到数据库
-            news_summary = NewsSummary(
-                user_id=user_id,
-                original_content=content,
-                summary_type=summary_type,
-                summary_content=summary_content
-            )
+            # 相同内容和类型的概括优先使用缓存，仍然写入历史记录
+            cache_key = response_cache.make_key(SUMMARY_PROMPT, summary_type, content)
+            lookup = history_lookup(NewsSummary, NewsSummary.summary_date, 'summary_content', cache_key)
             
-            db.session.add(news_summary)
-            db.session.commit()
+            def save(summary_content, cached):
+                # 保存到数据库
+                news_summary = NewsSummary(
+                    user_id=user_id,
+                    original_content=content,
+                    summary_type=summary_type,
+                    summary_content=summary_content,
+                    cache_key=cache_key
+                )
+                
+                db.session.add(news_summary)
+                db.session.commit()
+                
+                return {
+                    "summary": summary_content,
+                    "summary_type": summary_type,
+                    "summary_type_description": summary_type_description,
+                    "cached": cached
+                }
             
-            return api_response(True, "内容概括生成成功", {
-                "summary": summary_content,
-                "summary_type": summary_type,
-                "summary_type_description": summary_type_description
-            })
+            return cached_llm_response(
+                cache_key, lookup, save, messages, "summary", "内容概括生成成功",
+                stream=request.values.get('stream', '').lower() in ('1', 'true'),
+                max_tokens=max_tokens, temperature=temperature, timeout=120
+            )
             
         except Exception as api_error:
             return api_response(False, f"内容概括生成失败: {str(api_error)}", status_code=500)
@@ -151,14 +158,30 @@ def get_summary_history(user_id):
     
     参数:
         user_id (str): 用户ID，从URL路径获取
+        limit (int, 可选): 每页条数，提供limit或cursor时分页返回列表投影(不含原始内容全文和概括结果)
+        cursor (str, 可选): 上一页返回的next_cursor
     
     返回:
-        dict: 包含状态、消息和历史记录列表的API响应
+        dict: 包含状态、消息和历史记录列表的API响应，分页时data为 {items, next_cursor, has_more}
     
     异常:
         Exception: 当获取历史记录失败时抛出
     """
     try:
+        try:
+            page = parse_page_args(request.args)
+        except ValueError as e:
+            return api_response(False, str(e), status_code=400)
+        
+        if page:
+            limit, cursor = page
+            history, next_cursor = paginate(
+                NewsSummary.query.filter_by(user_id=user_id),
+                NewsSummary.summary_date, NewsSummary.summary_id,
+                limit, cursor, news_summary_list_schema.Meta.fields
+            )
+            return api_response(True, "获取内容概括历史成功", page_data(news_summary_list_schema.dump(history), next_cursor))
+        
         # 查询历史记录
         history = NewsSummary.query.filter_by(user_id=user_id).order_by(
             NewsSummary.summary_date.desc()
@@ -171,4 +194,28 @@ def get_summary_history(user_id):
         return api_response(True, "获取内容概括历史成功", news_summaries_schema.dump(history))
     
     except Exception as e:
-        return api_response(False, f"获取内容概括历史失败: {str(e)}", status_code=500) 
\ No newline at end of file
+        return api_response(False, f"获取内容概括历史失败: {str(e)}", status_code=500)
+
+@news_summary_bp.route('/history/<user_id>/<int:summary_id>', methods=['GET'])
+def get_summary_detail(user_id, summary_id):
+    """获取用户的一条完整概括记录
+    
+    参数:
+        user_id (str): 用户ID，从URL路径获取
+        summary_id (int): 记录ID，从URL路径获取
+    
+    返回:
+        dict: 包含状态、消息和完整记录的API响应
+    
+    异常:
+        Exception: 当获取记录失败时抛出
+    """
+    try:
+        record = NewsSummary.query.filter_by(user_id=user_id, summary_id=summary_id).first()
+        if not record:
+            return api_response(False, f"未找到ID为{summary_id}的概括记录", status_code=404)
+        
+        return api_response(True, "获取概括记录成功", news_summary_schema.dump(record))
+    
+    except Exception as e:
+        return api_response(False, f"获取概括记录失败: {str(e)}", status_code=500)
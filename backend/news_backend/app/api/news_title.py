@@ -1,12 +1,13 @@
 from flask import Blueprint, request, jsonify
 from app import db
 from app.models.news_title_generation import (
-    NewsTitleGeneration, news_title_generation_schema, news_title_generations_schema,
+    NewsTitleGeneration, news_title_generation_schema, news_title_generations_schema, news_title_generation_list_schema,
     get_available_title_styles, TitleStyle
 )
 from datetime import datetime
 from app.utils.common import api_response
-from openai import OpenAI
+from app.utils.pagination import parse_page_args, paginate, page_data
+from app.services.response_cache import response_cache, history_lookup, cached_llm_response
 import os
 from dotenv import load_dotenv
 
@@ -55,9 +56,12 @@ def generate_title():
         user_id (str): 用户ID
         content (str): 需要生成标题的新闻内容
         style (str, 可选): 标题风格，默认为信息型风格
+        stream (str, 可选): 为1或true时以Server-Sent Events流式返回
     
     返回:
         dict: 包含状态、消息和生成标题的API响应
+        流式返回时为text/event-stream，逐段发送 {"delta": ...}，
+        完成后发送done事件(数据同非流式结果)，出错时发送error事件
     
     异常:
         Exception: 当生成标题失败或处理请求出错时抛出
@@ -90,41 +94,44 @@ def generate_title():
             if not DEEPSEEK_API_KEY:
                 return api_response(False, "缺少API密钥配置", status_code=500)
             
-            client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com")
+            messages = [
+                {"role": "system", "content": "你是一个专业的新闻编辑，擅长为文章创建符合指定风格的标题。"},
+                {"role": "user", "content": TITLE_GENERATION_PROMPT.format(
+                    style_description=style_description,
+                    content=content
+                )}
+            ]
             
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": "你是一个专业的新闻编辑，擅长为文章创建符合指定风格的标题。"},
-                    {"role": "user", "content": TITLE_GENERATION_PROMPT.format(
-                        style_description=style_description,
-                        content=content
-                    )}
-                ],
-                max_tokens=100,
-                temperature=0.7,
-                timeout=60
-            )
+            # 相同内容和风格的标题优先使用缓存，仍然写入历史记录
+            cache_key = response_cache.make_key(TITLE_GENERATION_PROMPT, style, content)
+            lookup = history_lookup(NewsTitleGeneration, NewsTitleGeneration.generation_date, 'generated_title', cache_key)
             
-            generated_title = response.choices[0].message.content.strip()
+            def save(generated_title, cached):
+                # 保存到数据库
+                title_generation = NewsTitleGeneration(
+                    user_id=user_id,
+                    original_content=content,
+                    title_style=style,
+                    generated_title=generated_title,
+                    cache_key=cache_key
+                )
+                
+                db.session.add(title_generation)
+                db.session.commit()
+                
+                return {
+                    "title": generated_title,
+                    "style": style,
+                    "style_description": style_description,
+                    "cached": cached
+                }
             
-            # 保存到数据库
-            title_generation = NewsTitleGeneration(
-                user_id=user_id,
-                original_content=content,
-                title_style=style,
-                generated_title=generated_title
+            return cached_llm_response(
+                cache_key, lookup, save, messages, "title", "标题生成成功",
+                stream=request.values.get('stream', '').lower() in ('1', 'true'),
+                max_tokens=100, temperature=0.7, timeout=60
             )
             
-            db.session.add(title_generation)
-            db.session.commit()
-            
-            return api_response(True, "标题生成成功", {
-                "title": generated_title,
-                "style": style,
-                "style_description": style_description
-            })
-            
         except Exception as api_error:
             return api_response(False, f"标题生成失败: {str(api_error)}", status_code=500)
             
@@ -139,14 +146,30 @@ def get_title_history(user_id):
     
     参数:
         user_id (str): 用户ID，从URL路径获取
+        limit (int, 可选): 每页条数，提供limit或cursor时分页返回列表投影(不含原始内容全文)
+        cursor (str, 可选): 上一页返回的next_cursor
     
     返回:
-        dict: 包含状态、消息和历史记录列表的API响应
+        dict: 包含状态、消息和历史记录列表的API响应，分页时data为 {items, next_cursor, has_more}
     
     异常:
         Exception: 当获取历史记录失败时抛出
     """
     try:
+        try:
+            page = parse_page_args(request.args)
+        except ValueError as e:
+            return api_response(False, str(e), status_code=400)
+        
+        if page:
+            limit, cursor = page
+            history, next_cursor = paginate(
+                NewsTitleGeneration.query.filter_by(user_id=user_id),
+                NewsTitleGeneration.generation_date, NewsTitleGeneration.generation_id,
+                limit, cursor, news_title_generation_list_schema.Meta.fields
+            )
+            return api_response(True, "获取标题生成历史成功", page_data(news_title_generation_list_schema.dump(history), next_cursor))
+        
         # 查询历史记录
         history = NewsTitleGeneration.query.filter_by(user_id=user_id).order_by(
             NewsTitleGeneration.generation_date.desc()
@@ -159,4 +182,28 @@ def get_title_history(user_id):
         return api_response(True, "获取标题生成历史成功", news_title_generations_schema.dump(history))
     
     except Exception as e:
-        return api_response(False, f"获取标题生成历史失败: {str(e)}", status_code=500) 
\ No newline at end of file
+        return api_response(False, f"获取标题生成历史失败: {str(e)}", status_code=500)
+
+@news_title_bp.route('/history/<user_id>/<int:generation_id>', methods=['GET'])
+def get_title_detail(user_id, generation_id):
+    """获取用户的一条完整标题生成记录
+    
+    参数:
+        user_id (str): 用户ID，从URL路径获取
+        generation_id (int): 记录ID，从URL路径获取
+    
+    返回:
+        dict: 包含状态、消息和完整记录的API响应
+    
+    异常:
+        Exception: 当获取记录失败时抛出
+    """
+    try:
+        record = NewsTitleGeneration.query.filter_by(user_id=user_id, generation_id=generation_id).first()
+        if not record:
+            return api_response(False, f"未找到ID为{generation_id}的标题生成记录", status_code=404)
+        
+        return api_response(True, "获取标题生成记录成功", news_title_generation_schema.dump(record))
+    
+    except Exception as e:
+        return api_response(False, f"获取标题生成记录失败: {str(e)}", status_code=500)
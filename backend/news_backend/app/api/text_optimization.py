@@ -1,12 +1,13 @@
 from flask import Blueprint, request, jsonify
 from app import db
 from app.models.news_text_optimization import (
-    NewsTextOptimization, news_text_optimization_schema, news_text_optimizations_schema,
+    NewsTextOptimization, news_text_optimization_schema, news_text_optimizations_schema, news_text_optimization_list_schema,
     get_available_text_styles, TextStyle
 )
 from datetime import datetime
 from app.utils.common import api_response
-from openai import OpenAI
+from app.utils.pagination import parse_page_args, paginate, page_data
+from app.services.response_cache import response_cache, history_lookup, cached_llm_response
 import os
 from dotenv import load_dotenv
 
@@ -55,9 +56,12 @@ def optimize_text():
         user_id (str): 用户ID
         text (str): 需要优化的原始文本
         style (str, 可选): 目标文本风格，默认为新闻报道风格
+        stream (str, 可选): 为1或true时以Server-Sent Events流式返回
     
     返回:
         dict: 包含状态、消息和优化结果的API响应
+        流式返回时为text/event-stream，逐段发送 {"delta": ...}，
+        完成后发送done事件(数据同非流式结果)，出错时发送error事件
     
     异常:
         Exception: 当文本优化失败或处理请求出错时抛出
@@ -90,8 +94,6 @@ def optimize_text():
             if not DEEPSEEK_API_KEY:
                 return api_response(False, "缺少API密钥配置", status_code=500)
             
-            client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com")
-            
             # 根据不同的文本风格设置不同的参数
             temperature = 0.7
             
@@ -102,39 +104,44 @@ def optimize_text():
             elif target_style == TextStyle.CASUAL.value:
                 temperature = 0.8  # 休闲风格可以更有创意
             
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": "你是一个专业的文本优化专家，擅长将文本改写成不同的风格，同时保持原意不变。"},
-                    {"role": "user", "content": TEXT_OPTIMIZATION_PROMPT.format(
-                        style_description=style_description,
-                        text=original_text
-                    )}
-                ],
-                max_tokens=2000,
-                temperature=temperature,
-                timeout=120
-            )
-            
-            optimized_text = response.choices[0].message.content.strip()
+            messages = [
+                {"role": "system", "content": "你是一个专业的文本优化专家，擅长将文本改写成不同的风格，同时保持原意不变。"},
+                {"role": "user", "content": TEXT_OPTIMIZATION_PROMPT.format(
+                    style_description=style_description,
+                    text=original_text
+                )}
+            ]
             
-            # 保存到数据库
-            text_optimization = NewsTextOptimization(
-                user_id=user_id,
-                original_text=original_text,
-                target_style=target_style,
-                optimized_text=optimized_text
-            )
+            # 相同文本和风格的优化结果优先使用缓存，仍然写入历史记录
+            cache_key = response_cache.make_key(TEXT_OPTIMIZATION_PROMPT, target_style, original_text)
+            lookup = history_lookup(NewsTextOptimization, NewsTextOptimization.optimization_date, 'optimized_text', cache_key)
             
-            db.session.add(text_optimization)
-            db.session.commit()
+            def save(optimized_text, cached):
+                # 保存到数据库
+                text_optimization = NewsTextOptimization(
+                    user_id=user_id,
+                    original_text=original_text,
+                    target_style=target_style,
+                    optimized_text=optimized_text,
+                    cache_key=cache_key
+                )
+                
+                db.session.add(text_optimization)
+                db.session.commit()
+                
+                return {
+                    "original_text": original_text,
+                    "optimized_text": optimized_text,
+                    "style": target_style,
+                    "style_description": style_description,
+                    "cached": cached
+                }
             
-            return api_response(True, "文本优化成功", {
-                "original_text": original_text,
-                "optimized_text": optimized_text,
-                "style": target_style,
-                "style_description": style_description
-            })
+            return cached_llm_response(
+                cache_key, lookup, save, messages, "optimize", "文本优化成功",
+                stream=request.values.get('stream', '').lower() in ('1', 'true'),
+                max_tokens=2000, temperature=temperature, timeout=120
+            )
             
         except Exception as api_error:
             return api_response(False, f"文本优化失败: {str(api_error)}", status_code=500)
@@ -150,14 +157,30 @@ def get_optimization_history(user_id):
     
     参数:
         user_id (str): 用户ID，从URL路径获取
+        limit (int, 可选): 每页条数，提供limit或cursor时分页返回列表投影(不含原始文本和优化结果)
+        cursor (str, 可选): 上一页返回的next_cursor
     
     返回:
-        dict: 包含状态、消息和历史记录列表的API响应
+        dict: 包含状态、消息和历史记录列表的API响应，分页时data为 {items, next_cursor, has_more}
     
     异常:
         Exception: 当获取历史记录失败时抛出
     """
     try:
+        try:
+            page = parse_page_args(request.args)
+        except ValueError as e:
+            return api_response(False, str(e), status_code=400)
+        
+        if page:
+            limit, cursor = page
+            history, next_cursor = paginate(
+                NewsTextOptimization.query.filter_by(user_id=user_id),
+                NewsTextOptimization.optimization_date, NewsTextOptimization.optimization_id,
+                limit, cursor, news_text_optimization_list_schema.Meta.fields
+            )
+            return api_response(True, "获取文本优化历史成功", page_data(news_text_optimization_list_schema.dump(history), next_cursor))
+        
         # 查询历史记录
         history = NewsTextOptimization.query.filter_by(user_id=user_id).order_by(
             NewsTextOptimization.optimization_date.desc()
@@ -170,4 +193,28 @@ def get_optimization_history(user_id):
         return api_response(True, "获取文本优化历史成功", news_text_optimizations_schema.dump(history))
     
     except Exception as e:
-        return api_response(False, f"获取文本优化历史失败: {str(e)}", status_code=500) 
\ No newline at end of file
+        return api_response(False, f"获取文本优化历史失败: {str(e)}", status_code=500)
+
+@text_optimization_bp.route('/history/<user_id>/<int:optimization_id>', methods=['GET'])
+def get_optimization_detail(user_id, optimization_id):
+    """获取用户的一条完整文本优化记录
+    
+    参数:
+        user_id (str): 用户ID，从URL路径获取
+        optimization_id (int): 记录ID，从URL路径获取
+    
+    返回:
+        dict: 包含状态、消息和完整记录的API响应
+    
+    异常:
+        Exception: 当获取记录失败时抛出
+    """
+    try:
+        record = NewsTextOptimization.query.filter_by(user_id=user_id, optimization_id=optimization_id).first()
+        if not record:
+            return api_response(False, f"未找到ID为{optimization_id}的文本优化记录", status_code=404)
+        
+        return api_response(True, "获取文本优化记录成功", news_text_optimization_schema.dump(record))
+    
+    except Exception as e:
+        return api_response(False, f"获取文本优化记录失败: {str(e)}", status_code=500)
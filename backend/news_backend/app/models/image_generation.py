@@ -1,6 +1,7 @@
 from app import db, ma
 from enum import Enum
 from app.utils.time_util import china_time_now
+from app.utils.pagination import preview_of
 # 定义图像风格枚举
 class ImageStyle(Enum):
     REALISTIC = "realistic"            # 写实风格
@@ -38,9 +39,18 @@ class ImageGeneration(db.Model):
     image_num = db.Column(db.Integer)  # 生成图片数量
     image_paths = db.Column(db.Text)  # 生成的图片路径集合，以JSON字符串形式存储
     generation_date = db.Column(db.DateTime, default=china_time_now)
-    task_id = db.Column(db.String(255))  # API任务ID
+    task_id = db.Column(db.String(255), index=True)  # API任务ID
+    task_status = db.Column(db.String(20))  # 任务状态: PENDING/RUNNING/DOWNLOADING/SUCCEEDED/PARTIAL_SUCCEEDED/FAILED/TIMEOUT
+    task_output = db.Column(db.Text)  # 任务成功后的图片结果列表，以JSON字符串形式存储
+    task_claimed_at = db.Column(db.DateTime)  # 进入DOWNLOADING状态(开始下载结果)的时间
+    preview = preview_of(prompt_text)  # 提示文本预览，用于历史记录列表
     
-    def __init__(self, user_id, prompt_text, image_style, image_size, image_num=1, image_paths=None, task_id=None):
+    __table_args__ = (
+        # 历史记录按用户、时间分页
+        db.Index('idx_image_generation_user_date', 'user_id', 'generation_date', 'generation_id'),
+    )
+    
+    def __init__(self, user_id, prompt_text, image_style, image_size, image_num=1, image_paths=None, task_id=None, task_status=None):
         self.user_id = user_id
         self.prompt_text = prompt_text
         self.image_style = image_style
@@ -48,16 +58,24 @@ class ImageGeneration(db.Model):
         self.image_num = image_num
         self.image_paths = image_paths
         self.task_id = task_id
+        self.task_status = task_status
 
 # 创建Schema
 class ImageGenerationSchema(ma.Schema):
     class Meta:
         fields = ('generation_id', 'user_id', 'prompt_text', 'image_style', 
-                  'image_size', 'image_num', 'image_paths', 'generation_date', 'task_id')
+                  'image_size', 'image_num', 'image_paths', 'generation_date', 'task_id', 'task_status')
+
+# 历史记录列表使用的投影，不包含大文本字段
+class ImageGenerationListSchema(ma.Schema):
+    class Meta:
+        fields = ('generation_id', 'user_id', 'image_style', 'image_size', 'image_num',
+                  'image_paths', 'generation_date', 'task_id', 'task_status', 'preview')
 
 # 初始化schema
 image_generation_schema = ImageGenerationSchema()
 image_generations_schema = ImageGenerationSchema(many=True)
+image_generation_list_schema = ImageGenerationListSchema(many=True)
 
 # 获取所有可用的图像风格
 def get_available_image_styles():
@@ -1,5 +1,6 @@
 from app import db, ma
 from app.utils.time_util import china_time_now
+from app.utils.pagination import preview_of
 
 class NewsDetectionHistory(db.Model):
     __tablename__ = 'news_detection_history'
@@ -13,8 +14,23 @@ class NewsDetectionHistory(db.Model):
     upload_date = db.Column(db.DateTime, default=china_time_now)
     image_path = db.Column(db.String(255))
     detect_image_path= db.Column(db.String(255))
+    # 结构化的检测结论，统计查询直接使用这些列，不再从detection_reason文本中匹配"虚假"
+    is_fake = db.Column(db.Boolean, index=True)
+    fake_probability = db.Column(db.Float)  # 图像检测的伪造概率，文本检测为空
+    detection_type = db.Column(db.String(10), index=True)  # text / image
+    manipulation_types = db.Column(db.String(255))  # 图像检测的操纵类型，以逗号分隔
+    preview = preview_of(content)  # 内容预览，用于历史记录列表
     
-    def __init__(self, user_id, source, content, detection_reason=None, related_news_links=None, image_path=None, detect_image_path=None):
+    __table_args__ = (
+        # 覆盖索引，按日期、类型统计真假数量时只需扫描索引
+        db.Index('idx_detection_date_type_fake', 'upload_date', 'detection_type', 'is_fake'),
+        db.Index('idx_detection_type_fake', 'detection_type', 'is_fake'),
+        # 历史记录按用户、时间分页
+        db.Index('idx_detection_user_date', 'user_id', 'upload_date', 'detection_id'),
+    )
+    
+    def __init__(self, user_id, source, content, detection_reason=None, related_news_links=None, image_path=None, detect_image_path=None,
+                 is_fake=None, fake_probability=None, detection_type=None, manipulation_types=None):
         self.user_id = user_id
         self.source = source
         self.content = content
@@ -22,13 +38,25 @@ class NewsDetectionHistory(db.Model):
         self.related_news_links = related_news_links
         self.image_path = image_path
         self.detect_image_path = detect_image_path
+        self.is_fake = is_fake
+        self.fake_probability = fake_probability
+        self.detection_type = detection_type or ('image' if image_path else 'text')
+        self.manipulation_types = ",".join(manipulation_types) if isinstance(manipulation_types, (list, tuple)) else manipulation_types
         
 # 创建Schema
 class NewsDetectionHistorySchema(ma.Schema):
     class Meta:
         fields = ('detection_id', 'user_id', 'source', 'content', 
-                  'detection_reason', 'related_news_links', 'upload_date', 'image_path', 'detect_image_path')
+                  'detection_reason', 'related_news_links', 'upload_date', 'image_path', 'detect_image_path',
+                  'is_fake', 'fake_probability', 'detection_type', 'manipulation_types')
+
+# 历史记录列表使用的投影，不包含大文本字段
+class NewsDetectionHistoryListSchema(ma.Schema):
+    class Meta:
+        fields = ('detection_id', 'user_id', 'source', 'upload_date', 'image_path', 'detect_image_path',
+                  'is_fake', 'fake_probability', 'detection_type', 'manipulation_types', 'preview')
 
 # 初始化schema
 news_detection_schema = NewsDetectionHistorySchema()
-news_detections_schema = NewsDetectionHistorySchema(many=True) 
\ No newline at end of file
+news_detections_schema = NewsDetectionHistorySchema(many=True)
+news_detection_list_schema = NewsDetectionHistoryListSchema(many=True) 
\ No newline at end of file
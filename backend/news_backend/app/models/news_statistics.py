@@ -32,6 +32,41 @@ class NewsStatisticsByUser(db.Model):
         self.total_fake_count = total_fake_count
         self.total_real_count = total_real_count
 
+class DetectionTypeCounter(db.Model):
+    """按检测类型(text / image)累计的检测数量，写入检测记录时同步更新，
+    /statistics/detection-types 直接读取这张表，不再扫描检测历史"""
+    __tablename__ = 'detection_type_counters'
+    
+    detection_type = db.Column(db.String(10), primary_key=True)
+    total_count = db.Column(db.Integer, default=0, nullable=False)
+    fake_count = db.Column(db.Integer, default=0, nullable=False)
+    real_count = db.Column(db.Integer, default=0, nullable=False)
+    last_updated = db.Column(db.DateTime, default=china_time_now)
+    
+    def __init__(self, detection_type, total_count=0, fake_count=0, real_count=0):
+        self.detection_type = detection_type
+        self.total_count = total_count
+        self.fake_count = fake_count
+        self.real_count = real_count
+
+class DailyDetectionRollup(db.Model):
+    """按天、按检测类型汇总的检测数量，写入检测记录时增量更新，
+    /statistics/trend 按天数读取这张表，不再对检测历史做GROUP BY"""
+    __tablename__ = 'daily_detection_rollup'
+    
+    date = db.Column(db.Date, primary_key=True)
+    detection_type = db.Column(db.String(10), primary_key=True)
+    total_count = db.Column(db.Integer, default=0, nullable=False)
+    fake_count = db.Column(db.Integer, default=0, nullable=False)
+    real_count = db.Column(db.Integer, default=0, nullable=False)
+    
+    def __init__(self, date, detection_type, total_count=0, fake_count=0, real_count=0):
+        self.date = date
+        self.detection_type = detection_type
+        self.total_count = total_count
+        self.fake_count = fake_count
+        self.real_count = real_count
+
 # 创建Schema
 class NewsStatisticsSchema(ma.Schema):
     class Meta:
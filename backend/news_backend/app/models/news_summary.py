@@ -1,5 +1,6 @@
 from app import db, ma
 from app.utils.time_util import china_time_now
+from app.utils.pagination import preview_of
 from enum import Enum
 
 # 定义概括类型枚举
@@ -29,12 +30,22 @@ class NewsSummary(db.Model):
     summary_type = db.Column(db.String(50))  # 概括类型
     summary_content = db.Column(db.Text)  # 概括结果
     summary_date = db.Column(db.DateTime, default=china_time_now)
+    cache_key = db.Column(db.String(64))  # 生成结果缓存键，即response_cache.make_key的结果
+    preview = preview_of(original_content)  # 原始内容预览，用于历史记录列表
     
-    def __init__(self, user_id, original_content, summary_type, summary_content=None):
+    __table_args__ = (
+        # 历史记录按用户、时间分页
+        db.Index('idx_summary_user_date', 'user_id', 'summary_date', 'summary_id'),
+        # 按缓存键查询最近的生成结果
+        db.Index('idx_summary_cache_key', 'cache_key', 'summary_date'),
+    )
+    
+    def __init__(self, user_id, original_content, summary_type, summary_content=None, cache_key=None):
         self.user_id = user_id
         self.original_content = original_content
         self.summary_type = summary_type
         self.summary_content = summary_content
+        self.cache_key = cache_key
 
 # 创建Schema
 class NewsSummarySchema(ma.Schema):
@@ -42,9 +53,15 @@ class NewsSummarySchema(ma.Schema):
         fields = ('summary_id', 'user_id', 'original_content',
                   'summary_type', 'summary_content', 'summary_date')
 
+# 历史记录列表使用的投影，不包含大文本字段
+class NewsSummaryListSchema(ma.Schema):
+    class Meta:
+        fields = ('summary_id', 'user_id', 'summary_type', 'summary_date', 'preview')
+
 # 初始化schema
 news_summary_schema = NewsSummarySchema()
 news_summaries_schema = NewsSummarySchema(many=True)
+news_summary_list_schema = NewsSummaryListSchema(many=True)
 
 # 获取所有可用的概括类型
 def get_available_summary_types():
@@ -1,5 +1,6 @@
 from app import db, ma
 from app.utils.time_util import china_time_now
+from app.utils.pagination import preview_of
 from enum import Enum
 
 # 定义文本优化风格枚举
@@ -37,12 +38,22 @@ class NewsTextOptimization(db.Model):
     target_style = db.Column(db.String(50))  # 目标风格
     optimized_text = db.Column(db.Text)  # 优化后的文本
     optimization_date = db.Column(db.DateTime, default=china_time_now)
+    cache_key = db.Column(db.String(64))  # 生成结果缓存键，即response_cache.make_key的结果
+    preview = preview_of(original_text)  # 原始文本预览，用于历史记录列表
     
-    def __init__(self, user_id, original_text, target_style, optimized_text=None):
+    __table_args__ = (
+        # 历史记录按用户、时间分页
+        db.Index('idx_optimization_user_date', 'user_id', 'optimization_date', 'optimization_id'),
+        # 按缓存键查询最近的生成结果
+        db.Index('idx_optimization_cache_key', 'cache_key', 'optimization_date'),
+    )
+    
+    def __init__(self, user_id, original_text, target_style, optimized_text=None, cache_key=None):
         self.user_id = user_id
         self.original_text = original_text
         self.target_style = target_style
         self.optimized_text = optimized_text
+        self.cache_key = cache_key
 
 # 创建Schema
 class NewsTextOptimizationSchema(ma.Schema):
@@ -50,9 +61,15 @@ class NewsTextOptimizationSchema(ma.Schema):
         fields = ('optimization_id', 'user_id', 'original_text', 
                   'target_style', 'optimized_text', 'optimization_date')
 
+# 历史记录列表使用的投影，不包含大文本字段
+class NewsTextOptimizationListSchema(ma.Schema):
+    class Meta:
+        fields = ('optimization_id', 'user_id', 'target_style', 'optimization_date', 'preview')
+
 # 初始化schema
 news_text_optimization_schema = NewsTextOptimizationSchema()
 news_text_optimizations_schema = NewsTextOptimizationSchema(many=True)
+news_text_optimization_list_schema = NewsTextOptimizationListSchema(many=True)
 
 # 获取所有可用的文本风格
 def get_available_text_styles():
@@ -1,5 +1,6 @@
 from app import db, ma
 from app.utils.time_util import china_time_now
+from app.utils.pagination import preview_of
 from enum import Enum
 
 # 定义标题风格枚举
@@ -33,12 +34,22 @@ class NewsTitleGeneration(db.Model):
     title_style = db.Column(db.String(50))  # 标题风格
     generated_title = db.Column(db.String(255))  # 生成的标题
     generation_date = db.Column(db.DateTime, default=china_time_now)
+    cache_key = db.Column(db.String(64))  # 生成结果缓存键，即response_cache.make_key的结果
+    preview = preview_of(original_content)  # 原始内容预览，用于历史记录列表
     
-    def __init__(self, user_id, original_content, title_style, generated_title=None):
+    __table_args__ = (
+        # 历史记录按用户、时间分页
+        db.Index('idx_title_user_date', 'user_id', 'generation_date', 'generation_id'),
+        # 按缓存键查询最近的生成结果
+        db.Index('idx_title_cache_key', 'cache_key', 'generation_date'),
+    )
+    
+    def __init__(self, user_id, original_content, title_style, generated_title=None, cache_key=None):
         self.user_id = user_id
         self.original_content = original_content
         self.title_style = title_style
         self.generated_title = generated_title
+        self.cache_key = cache_key
 
 # 创建Schema
 class NewsTitleGenerationSchema(ma.Schema):
@@ -46,9 +57,15 @@ class NewsTitleGenerationSchema(ma.Schema):
         fields = ('generation_id', 'user_id', 'original_content', 
                   'title_style', 'generated_title', 'generation_date')
 
+# 历史记录列表使用的投影，不包含大文本字段
+class NewsTitleGenerationListSchema(ma.Schema):
+    class Meta:
+        fields = ('generation_id', 'user_id', 'title_style', 'generated_title', 'generation_date', 'preview')
+
 # 初始化schema
 news_title_generation_schema = NewsTitleGenerationSchema()
 news_title_generations_schema = NewsTitleGenerationSchema(many=True)
+news_title_generation_list_schema = NewsTitleGenerationListSchema(many=True)
 
 # 获取所有可用的标题风格
 def get_available_title_styles():
@@ -1,20 +1,11 @@
 from flask import current_app
-from openai import OpenAI
 import os
 from app.utils.common import DEEPSEEK_API_KEY
+from app.services.translation_service import translate_text, translate_texts
+from app.services.llm_gateway import chat
 from werkzeug.utils import secure_filename
 
 
-# 翻译提示模板
-TEXT_TRANSLATE_PROMPT = """
-你是一个专业的文本翻译专家。请将以下中文内容翻译为英文：
-
-【待翻译内容】
-{content}
-
-只需要输出翻译结果，不要输出任何解释。
-"""
-
 # 检测理由生成模板
 DETECTION_REASON_PROMPT = """
 你是一个专业的图像鉴定专家，请根据以下信息生成一段专业的图像伪造检测理由：
@@ -33,39 +24,6 @@ DETECTION_REASON_PROMPT = """
 仅输出专业的鉴定理由，不要包含额外解释或引言。理由应当专业、客观、具体且有说服力，但不要夸大。
 """
 
-def translate_text(content):
-    try:
-        # 检查API密钥
-        if not DEEPSEEK_API_KEY:
-            raise ValueError("缺少DEEPSEEK_API_KEY配置")
-            
-        print(f"开始调用DeepSeek API，API密钥长度: {len(DEEPSEEK_API_KEY)}")
-        try:
-            print("开始翻译")
-            client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com")
-            print("DeepSeek客户端创建成功")
-
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant specialized in translation."},
-                    {"role": "user", "content": TEXT_TRANSLATE_PROMPT.format(content=content)}
-                ],
-                timeout=100,
-                stream=False
-            )
-            print("DeepSeek API调用成功")
-        except Exception as api_error:
-            print(f"DeepSeek API调用失败: {str(api_error)}")
-            raise api_error
-
-        translated_text = response.choices[0].message.content
-        print(f"Translated Text: {translated_text}")
-        return translated_text
-    except Exception as e:
-        print(f"翻译过程中发生错误: {str(e)}")
-        return None
-
 def generate_detection_reason(manipulation_types, fake_words, text, fake_probability):
     """
     生成图像检测理由
@@ -93,21 +51,18 @@ def generate_detection_reason(manipulation_types, fake_words, text, fake_probabi
         )
         
         # 调用DeepSeek API
-        client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com")
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
+        reason = chat(
+            [
                 {"role": "system", "content": "You are a professional expert in image authentication and forgery detection."},
                 {"role": "user", "content": prompt}
             ],
+            purpose="detection_reason",
             max_tokens=1000,
             temperature=0.3,  # 降低温度以保持输出的专业性和一致性
-            timeout=100,
-            stream=False
+            timeout=100
         )
         
         # 提取并返回理由
-        reason = response.choices[0].message.content
         return reason.strip()
     except Exception as e:
         print(f"生成检测理由时发生错误: {str(e)}")
@@ -115,7 +70,8 @@ def generate_detection_reason(manipulation_types, fake_words, text, fake_probabi
         types_text = "、".join(manipulation_types) if manipulation_types else "未知类型"
         return f"检测到图像可能存在伪造（{types_text}），伪造可能性为{fake_probability * 100:.2f}%。"
 
-def save_image(user_id, image_file):
+def save_image(user_id, image_file, image_data=None):
+    """保存上传的图片，已读取过图片字节时传入image_data直接写盘"""
     filename = secure_filename(image_file.filename)
     _, file_extension = os.path.splitext(filename)
     static_dir = os.path.join(current_app.root_path, '..', 'static','news_image')
@@ -139,5 +95,9 @@ def save_image(user_id, image_file):
         next_number = max(file_numbers) + 1
     filename = f"{user_id}_{next_number}{file_extension}"
     image_path = os.path.join(user_dir, filename)
-    image_file.save(image_path)
+    if image_data is not None:
+        with open(image_path, 'wb') as f:
+            f.write(image_data)
+    else:
+        image_file.save(image_path)
     return image_path
@@ -1,36 +1,76 @@
 from flask import current_app
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import requests
+from requests.adapters import HTTPAdapter
 import os
-import time
-import urllib.request
+import tempfile
+from PIL import Image
 from app import app
 DASHSCOPE_API_KEY = os.environ.get('DASHSCOPE_API_KEY')
 
+# 单次任务并发下载图片的线程数
+MAX_DOWNLOAD_WORKERS = 8
+DOWNLOAD_TIMEOUT = (10, 60)  # (连接超时, 读取超时)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+API_TIMEOUT = (10, 30)  # 创建和查询任务的(连接超时, 读取超时)
+THUMBNAIL_DIR = 'thumbs'
+THUMBNAIL_SIZE = (256, 256)
+
+# 下载图片共用的连接池
+download_session = requests.Session()
+download_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=MAX_DOWNLOAD_WORKERS))
+download_session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=MAX_DOWNLOAD_WORKERS))
+
+def _generated_image_dir(user_id):
+    """用户生成图片的保存目录"""
+    static_dir = os.path.abspath(os.path.join(current_app.root_path, '..', 'static'))
+    user_dir = os.path.join(static_dir, 'image_generation', str(user_id))
+    os.makedirs(os.path.join(user_dir, THUMBNAIL_DIR), exist_ok=True)
+    return user_dir
+
+def thumbnail_path_for(image_path):
+    """图片对应的缩略图路径: 同目录下thumbs子目录中的同名jpg文件"""
+    image_dir, filename = os.path.split(image_path)
+    return os.path.join(image_dir, THUMBNAIL_DIR, os.path.splitext(filename)[0] + '.jpg')
+
+def local_path_to_url(image_path):
+    """把static目录下的本地路径转换为访问地址，不在static目录下时原样返回"""
+    static_root = "/root/news_backend/static/"
+    if image_path.startswith(static_root):
+        return f"http://localhost:6006/static/{image_path[len(static_root):]}"
+    return image_path
+
+def url_to_local_path(image_url):
+    """local_path_to_url的逆转换"""
+    url_root = "http://localhost:6006/static/"
+    if image_url.startswith(url_root):
+        return "/root/news_backend/static/" + image_url[len(url_root):]
+    return image_url
+
+def thumbnail_url_for(image_url):
+    """历史记录中图片地址对应的缩略图地址，缩略图不存在(如旧记录)时返回原图地址"""
+    thumbnail_path = thumbnail_path_for(url_to_local_path(image_url))
+    if os.path.exists(thumbnail_path):
+        return local_path_to_url(thumbnail_path)
+    return image_url
+
 def save_generated_image(user_id, image_url, index=0):
     """
-    下载并保存生成的图片
+    下载并保存生成的图片，同时生成缩略图
+    
+    图片以分块流式写入临时文件，边写边计算SHA-256，完成后以内容哈希命名，
+    同一用户并发生成时文件名不会冲突，重复内容只保存一份。
     
     参数:
         user_id (str): 用户ID
         image_url (str): 图片URL
-        index (int, 可选): 图片索引（用于同一批次多张图片），默认为0
+        index (int, 可选): 图片在同一批次中的索引，用于临时文件命名，默认为0
     
     返回:
-        str: 保存的图片路径
+        tuple: (图片保存路径, 缩略图保存路径)
     """
-    # 创建保存路径
-    static_dir = os.path.join(current_app.root_path, '..', 'static')
-    static_dir = os.path.abspath(static_dir)
-    if not os.path.exists(static_dir):
-        os.makedirs(static_dir)
-    
-    generate_dir = os.path.join(static_dir, 'image_generation')
-    if not os.path.exists(generate_dir):
-        os.makedirs(generate_dir)
-    
-    user_dir = os.path.join(generate_dir, user_id)
-    if not os.path.exists(user_dir):
-        os.makedirs(user_dir)
+    user_dir = _generated_image_dir(user_id)
         
     # 从URL中提取文件扩展名
     url_path = image_url.split('?')[0]
@@ -39,23 +79,75 @@ def save_generated_image(user_id, image_url, index=0):
         # 如果URL中没有扩展名，默认使用.png
         file_extension = '.png'
     
-    # 使用时间戳命名
-    timestamp = time.strftime("%Y%m%d_%H%M%S", time.localtime())
-    
-    # 如果是批次中的第一张图片，不添加索引
-    if index == 0:
-        filename = f"{timestamp}{file_extension}"
-    else:
-        # 对于批次中的其他图片，添加索引
-        filename = f"{timestamp}_{index}{file_extension}"
+    digest = hashlib.sha256()
+    temp_file = tempfile.NamedTemporaryFile(dir=user_dir, prefix=f".download_{index}_", delete=False)
+    try:
+        with temp_file, download_session.get(image_url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                temp_file.write(chunk)
+        
+        image_path = os.path.join(user_dir, digest.hexdigest()[:32] + file_extension)
+        thumbnail_path = thumbnail_path_for(image_path)
+        if not os.path.exists(thumbnail_path):
+            # 在文件移动到最终位置之前生成缩略图，缩略图存在即表示图片已完整保存
+            with Image.open(temp_file.name) as image:
+                image.thumbnail(THUMBNAIL_SIZE)
+                image.convert('RGB').save(thumbnail_path, 'JPEG', quality=85)
+        os.replace(temp_file.name, image_path)
+    finally:
+        if os.path.exists(temp_file.name):
+            os.remove(temp_file.name)
+    
+    return image_path, thumbnail_path
+
+def download_task_images(user_id, results):
+    """
+    并发下载任务结果中的全部图片
     
-    # 保存路径
-    image_path = os.path.join(user_dir, filename)
+    参数:
+        user_id (str): 用户ID
+        results (list): DashScope返回的output.results
     
-    # 下载图片
-    urllib.request.urlretrieve(image_url, image_path)
+    返回:
+        tuple: (添加了local_path和thumbnail_path的结果列表, 图片访问地址列表)
     
-    return image_path
+    异常:
+        RuntimeError: 有可下载的图片但一张都没有保存成功
+    """
+    results = [image_result for image_result in results if image_result.get('url')]
+    if not results:
+        return [], []
+    
+    app_obj = current_app._get_current_object()
+    
+    def download(index, image_result):
+        # 下载线程中需要应用上下文来确定static目录
+        with app_obj.app_context():
+            return save_generated_image(user_id, image_result['url'], index)
+    
+    saved_images = []
+    image_paths_array = []
+    with ThreadPoolExecutor(max_workers=min(len(results), MAX_DOWNLOAD_WORKERS)) as executor:
+        futures = [executor.submit(download, idx, image_result) for idx, image_result in enumerate(results)]
+        for image_result, future in zip(results, futures):
+            try:
+                image_path, thumbnail_path = future.result()
+                # 添加本地路径到结果中
+                image_url = local_path_to_url(image_path)
+                image_result['local_path'] = image_url
+                image_result['thumbnail_path'] = local_path_to_url(thumbnail_path)
+                saved_images.append(image_result)
+                
+                # 收集所有图片路径
+                image_paths_array.append(image_url)
+            except Exception as e:
+                app.logger.error(f"保存图片失败: {str(e)}")
+    
+    if not saved_images:
+        raise RuntimeError(f"{len(results)}张图片全部保存失败")
+    return saved_images, image_paths_array
 
 def create_image_task(prompt, size='1024*1024', n=1):
     """
@@ -89,7 +181,7 @@ def create_image_task(prompt, size='1024*1024', n=1):
     }
     
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = requests.post(url, headers=headers, json=data, timeout=API_TIMEOUT)
         response.raise_for_status()
         
         result = response.json()
@@ -117,7 +209,7 @@ def get_task_result(task_id):
     }
     
     try:
-        response = requests.get(url, headers=headers)
+        response = requests.get(url, headers=headers, timeout=API_TIMEOUT)
         response.raise_for_status()
         
         return response.json()
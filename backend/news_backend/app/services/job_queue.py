@@ -0,0 +1,307 @@
+"""后台任务队列
+
+耗时较长的请求(文本检测、图像生成等)可以提交为后台任务: 接口立即返回job_id，
+由后台线程池执行，客户端通过 /jobs/<job_id> 查询状态，或提供callback_url在完成后接收回调。
+
+任务保存在本地SQLite数据库中，多个gunicorn worker进程共享同一个队列文件，
+领取任务时加写锁保证一个任务只被一个线程执行。
+执行中的任务由所在进程定期更新心跳，心跳超过JOB_HEARTBEAT_TIMEOUT秒未更新的任务
+视为所在进程已退出，重新排队；每次领取生成新的claim_token，旧的执行者不能再写入结果。
+
+用法:
+    @register_job('text_detection')
+    def run_text_detection(user_id, content):
+        ...
+        return success, message, data
+
+    job_id = job_queue.submit('text_detection', {'user_id': 1, 'content': '...'}, callback_url)
+"""
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+import requests
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(os.path.dirname(__file__), '..', '..', 'jobs', 'jobs.db'))
+# 每个进程执行任务的线程数
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+# 没有新任务通知时检查队列的间隔(秒)，用于领取其他进程提交的任务
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1))
+# 执行中任务的心跳间隔(秒)，心跳超过JOB_HEARTBEAT_TIMEOUT秒未更新的任务重新排队
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", 10))
+JOB_HEARTBEAT_TIMEOUT = float(os.getenv("JOB_HEARTBEAT_TIMEOUT", 60))
+# 已结束的任务保留时间(秒)
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", 7 * 24 * 3600))
+CALLBACK_RETRIES = 3
+# 允许回调的主机名，逗号分隔；未配置时允许任意解析到公网地址的主机
+JOB_CALLBACK_ALLOWED_HOSTS = {
+    host.strip().lower() for host in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip()
+}
+
+# 任务类型 -> 处理函数
+JOB_HANDLERS = {}
+
+
+def register_job(kind):
+    """注册任务处理函数
+
+    处理函数以payload中的字段为关键字参数，在应用上下文中执行，
+    返回 (success, message, data)，与api_response的参数一致。
+    """
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def validate_callback_url(callback_url):
+    """检查回调地址，防止服务端向本机或内网地址发起请求(SSRF)，地址不允许时抛出ValueError"""
+    parsed = urlparse(callback_url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ValueError("回调地址必须是http或https URL")
+    host = parsed.hostname.lower()
+    if JOB_CALLBACK_ALLOWED_HOSTS:
+        if host not in JOB_CALLBACK_ALLOWED_HOSTS:
+            raise ValueError(f"回调地址的主机不在允许列表中: {host}")
+        return
+    try:
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        addresses = socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, ValueError):
+        raise ValueError(f"无法解析回调地址的主机: {host}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address[4][0].split('%')[0])
+        if not ip.is_global:
+            raise ValueError("回调地址不能指向本机或内网地址")
+
+
+class JobQueue:
+    """基于SQLite的任务队列和执行线程池"""
+
+    def __init__(self, db_path, workers=4, poll_interval=1.0):
+        self.db_path = os.path.abspath(db_path)
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.app = None
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._threads = []
+        # 本进程正在执行的任务: job_id -> claim_token
+        self._running = {}
+
+        db_dir = os.path.dirname(self.db_path)
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, "
+            "payload TEXT NOT NULL, result TEXT, error TEXT, callback_url TEXT, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)")
+        # 旧版本创建的队列文件补充心跳和领取标记列
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column in ('heartbeat_at REAL', 'claim_token TEXT'):
+            if column.split()[0] not in columns:
+                try:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+                except sqlite3.OperationalError:
+                    # 其他进程已经添加
+                    pass
+        conn.commit()
+
+    def _connection(self):
+        # SQLite连接不跨线程、不跨fork使用，每个线程各自打开连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def init_app(self, app):
+        """绑定Flask应用并启动执行线程"""
+        self.app = app
+        self.start()
+
+    def start(self):
+        """启动执行线程，fork出的worker进程在首次提交任务时启动自己的线程"""
+        with self._lock:
+            if self._pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+                return
+            if self._pid != os.getpid():
+                # 父进程中执行的任务由父进程更新心跳
+                self._running.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            self._threads.append(threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True))
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, kind, payload, callback_url=None):
+        """提交任务，返回job_id；任务类型未知或回调地址不允许时抛出ValueError"""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"未知的任务类型: {kind}")
+        if callback_url:
+            validate_callback_url(callback_url)
+        if self._pid != os.getpid():
+            self.start()
+        job_id = uuid.uuid4().hex
+        self._connection().execute(
+            "INSERT INTO jobs (job_id, kind, status, payload, callback_url, created_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+            (job_id, kind, json.dumps(payload, ensure_ascii=False), callback_url, time.time())
+        )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """查询任务状态，不存在时返回None"""
+        row = self._connection().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def _claim(self):
+        """领取最早排队的任务，返回 (任务, claim_token)，没有任务时返回None"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 心跳停止(所在进程已退出)的任务重新排队
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, claim_token = NULL "
+                "WHERE status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (now - JOB_HEARTBEAT_TIMEOUT,)
+            )
+            row = conn.execute(
+                "SELECT job_id, kind, payload, callback_url FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            token = None
+            if row is not None:
+                token = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, heartbeat_at = ?, claim_token = ? WHERE job_id = ?",
+                    (now, now, token, row['job_id'])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        with self._lock:
+            self._running[row['job_id']] = token
+        return row, token
+
+    def _finish(self, job_id, token, status, result=None, error=None):
+        """写入任务结果，任务已被重新领取时不写入并返回False"""
+        conn = self._connection()
+        now = time.time()
+        updated = conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, claim_token = NULL "
+            "WHERE job_id = ? AND claim_token = ?",
+            (status, json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+             error, now, job_id, token)
+        ).rowcount
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?",
+            (now - JOB_RETENTION_SECONDS,)
+        )
+        return updated == 1
+
+    def _heartbeat(self):
+        """定期更新本进程执行中任务的心跳"""
+        while True:
+            time.sleep(JOB_HEARTBEAT_INTERVAL)
+            with self._lock:
+                running = list(self._running.items())
+            if not running:
+                continue
+            try:
+                conn = self._connection()
+                now = time.time()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany(
+                        "UPDATE jobs SET heartbeat_at = ? WHERE job_id = ? AND claim_token = ?",
+                        [(now, job_id, token) for job_id, token in running]
+                    )
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            except Exception as e:
+                print(f"更新后台任务心跳失败: {str(e)}")
+
+    def _run(self):
+        while True:
+            try:
+                claimed = self._claim()
+            except Exception as e:
+                print(f"领取后台任务失败: {str(e)}")
+                claimed = None
+            if claimed is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            row, token = claimed
+            try:
+                self._execute(row, token)
+            except Exception as e:
+                # 写入结果失败(如数据库被锁)时任务保持running，心跳停止后重新排队
+                print(f"后台任务结束处理失败 {row['job_id']}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._running.pop(row['job_id'], None)
+
+    def _execute(self, row, token):
+        job_id = row['job_id']
+        try:
+            handler = JOB_HANDLERS[row['kind']]
+            with self.app.app_context():
+                success, message, data = handler(**json.loads(row['payload']))
+            result = {"success": success, "message": message, "data": data}
+            finished = self._finish(job_id, token, 'succeeded' if success else 'failed', result=result)
+        except Exception as e:
+            print(f"后台任务执行失败 {job_id}: {str(e)}")
+            finished = self._finish(job_id, token, 'failed', error=str(e))
+        if not finished:
+            print(f"后台任务已被重新领取，不再写入结果 {job_id}")
+            return
+        if row['callback_url']:
+            self._callback(row['callback_url'], self.get(job_id))
+
+    def _callback(self, callback_url, job):
+        """任务结束后向callback_url POST任务状态，失败时重试"""
+        for attempt in range(CALLBACK_RETRIES):
+            try:
+                # 发送前重新检查，主机名可能已被解析到内网地址
+                validate_callback_url(callback_url)
+                response = requests.post(callback_url, json=job, timeout=10, allow_redirects=False)
+                if response.status_code < 500:
+                    return
+            except ValueError as e:
+                print(f"任务回调地址不允许 {job['job_id']}: {str(e)}")
+                return
+            except requests.RequestException as e:
+                print(f"任务回调失败 {job['job_id']}: {str(e)}")
+            time.sleep(2 ** attempt)
+
+
+job_queue = JobQueue(JOB_DB_PATH, JOB_WORKERS, JOB_POLL_INTERVAL)
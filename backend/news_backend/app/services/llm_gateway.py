@@ -0,0 +1,224 @@
+"""DeepSeek大模型调用网关
+
+所有调用大模型的地方(翻译、检测理由、文本检测、概括、标题、文本优化)统一通过本模块:
+    - 进程内共享一个OpenAI客户端和keep-alive连接池，避免每次请求重新建立连接和TLS握手
+    - 用信号量限制同时进行的调用数
+    - 连接错误、超时、限流和5xx错误按带随机抖动的指数退避重试
+    - 按调用用途统计次数、失败数、重试数、耗时和token用量
+
+用法:
+    from app.services.llm_gateway import chat, stream_chat
+    answer = chat(messages, purpose='summary', max_tokens=200, timeout=120)
+    for delta in stream_chat(messages, purpose='summary'):
+        ...
+"""
+import os
+import random
+import threading
+import time
+import httpx
+import openai
+from openai import OpenAI
+from app.utils.common import DEEPSEEK_API_KEY
+
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.deepseek.com")
+LLM_MODEL = os.getenv("LLM_MODEL", "deepseek-chat")
+# 每个进程同时进行的大模型调用数上限
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+# 连接池中保持的keep-alive连接数
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 16))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+# 退避时间的基数和上限(秒)
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8))
+
+# 可以重试的错误类型
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,  # 包含APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class LLMMetrics:
+    """按调用用途统计大模型调用情况"""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, purpose, elapsed, retries, usage=None, error=False):
+        with self._lock:
+            stats = self._stats.setdefault(purpose, {
+                "calls": 0, "errors": 0, "retries": 0, "total_seconds": 0.0,
+                "max_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0
+            })
+            stats["calls"] += 1
+            stats["retries"] += retries
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+            if error:
+                stats["errors"] += 1
+            if usage is not None:
+                stats["prompt_tokens"] += usage.prompt_tokens or 0
+                stats["completion_tokens"] += usage.completion_tokens or 0
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for purpose, stats in self._stats.items():
+                stats = dict(stats)
+                stats["avg_seconds"] = round(stats["total_seconds"] / stats["calls"], 3) if stats["calls"] else 0
+                stats["total_seconds"] = round(stats["total_seconds"], 3)
+                stats["max_seconds"] = round(stats["max_seconds"], 3)
+                result[purpose] = stats
+            return result
+
+
+class LLMGateway:
+    """共享连接池、限流、重试和统计的大模型客户端"""
+
+    def __init__(self, api_key, base_url, model, max_concurrency=8, pool_size=16,
+                 max_retries=3, backoff_base=0.5, backoff_max=8):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics = LLMMetrics()
+        self._semaphore = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_pid = None
+
+    @property
+    def client(self):
+        # 连接池不能跨fork使用，多worker部署时每个进程各自创建客户端
+        if self._client is None or self._client_pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._client_pid != os.getpid():
+                    if not self.api_key:
+                        raise ValueError("缺少DEEPSEEK_API_KEY配置")
+                    http_client = httpx.Client(
+                        limits=httpx.Limits(
+                            max_connections=self.pool_size,
+                            max_keepalive_connections=self.pool_size
+                        ),
+                        timeout=httpx.Timeout(120, connect=10)
+                    )
+                    # 重试由网关统一处理，关闭客户端自带的重试
+                    self._client = OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        http_client=http_client,
+                        max_retries=0
+                    )
+                    self._client_pid = os.getpid()
+        return self._client
+
+    def _backoff(self, attempt):
+        # 全抖动指数退避，避免多个请求同时重试
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _request(self, purpose, begin, hold=False, **kwargs):
+        """发起请求，可重试的错误按退避重试，返回(响应, 重试次数)
+
+        hold为True时请求成功后继续占用并发名额，由调用方在读完流式响应后释放。
+        """
+        attempt = 0
+        while True:
+            self._semaphore.acquire()
+            try:
+                response = self.client.chat.completions.create(**kwargs)
+            except RETRYABLE_ERRORS as e:
+                self._semaphore.release()
+                if attempt >= self.max_retries:
+                    self.metrics.record(purpose, time.perf_counter() - begin, attempt, error=True)
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+                print(f"大模型调用失败({purpose})，{delay:.2f}秒后第{attempt}次重试: {str(e)}")
+                time.sleep(delay)
+                continue
+            except Exception:
+                self._semaphore.release()
+                self.metrics.record(purpose, time.perf_counter() - begin, attempt, error=True)
+                raise
+            if not hold:
+                self._semaphore.release()
+            return response, attempt
+
+    def create(self, messages, purpose="default", **kwargs):
+        """调用chat completions接口，返回原始响应
+
+        :param messages: 对话消息列表
+        :param purpose: 调用用途，用于分类统计
+        :param kwargs: 透传给chat.completions.create的参数，如max_tokens、temperature、timeout
+        """
+        kwargs.setdefault("model", self.model)
+        begin = time.perf_counter()
+        response, attempt = self._request(purpose, begin, messages=messages, **kwargs)
+        self.metrics.record(purpose, time.perf_counter() - begin, attempt, usage=getattr(response, "usage", None))
+        return response
+
+    def chat(self, messages, purpose="default", **kwargs):
+        """调用大模型并返回回答文本"""
+        response = self.create(messages, purpose=purpose, **kwargs)
+        return response.choices[0].message.content
+
+    def stream(self, messages, purpose="default", **kwargs):
+        """流式调用大模型，逐段产出回答文本
+
+        只在建立连接阶段重试，开始输出后出错直接抛出。读取过程中一直占用一个并发名额。
+        """
+        kwargs.setdefault("model", self.model)
+        begin = time.perf_counter()
+        response, attempt = self._request(
+            purpose, begin, hold=True, messages=messages, stream=True,
+            stream_options={"include_usage": True}, **kwargs
+        )
+        usage = None
+        try:
+            for chunk in response:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception:
+            self.metrics.record(purpose, time.perf_counter() - begin, attempt, error=True)
+            raise
+        else:
+            self.metrics.record(purpose, time.perf_counter() - begin, attempt, usage=usage)
+        finally:
+            # 客户端提前断开时生成器被关闭，同样释放连接和并发名额
+            response.close()
+            self._semaphore.release()
+
+
+gateway = LLMGateway(
+    api_key=DEEPSEEK_API_KEY,
+    base_url=LLM_BASE_URL,
+    model=LLM_MODEL,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    pool_size=LLM_POOL_SIZE,
+    max_retries=LLM_MAX_RETRIES,
+    backoff_base=LLM_BACKOFF_BASE,
+    backoff_max=LLM_BACKOFF_MAX
+)
+
+
+def chat(messages, purpose="default", **kwargs):
+    """通过全局网关调用大模型并返回回答文本"""
+    return gateway.chat(messages, purpose=purpose, **kwargs)
+
+
+def stream_chat(messages, purpose="default", **kwargs):
+    """通过全局网关流式调用大模型，逐段产出回答文本"""
+    return gateway.stream(messages, purpose=purpose, **kwargs)
+
+
+def get_metrics():
+    """各用途的大模型调用统计"""
+    return gateway.metrics.snapshot()
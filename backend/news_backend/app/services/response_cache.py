@@ -0,0 +1,168 @@
+"""大模型生成结果缓存
+
+内容概括、标题生成和文本优化对同一篇内容、同一种风格重复提交时直接返回之前的生成结果，
+不再重复调用大模型。缓存键为(提示模板, 风格/类型, 规范化后内容)的SHA-256，
+修改提示模板后旧的缓存自然失效。
+
+分两级，使用同一个缓存键，命中与否与用户无关:
+    - 进程内LRU缓存，按TTL过期、按条数淘汰
+    - 历史记录表作为持久层，每条记录保存生成时的缓存键(带索引的cache_key列)，进程重启后仍可命中
+
+三个接口共用 cached_llm_response 完成 查缓存 -> 调用大模型(普通或流式) -> 保存历史记录 的流程。
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from app.services.llm_gateway import chat, stream_chat
+from app.utils.common import api_response
+from app.utils.sse import sse_response, stream_text_events
+from app.utils.time_util import china_time_now
+
+RESPONSE_CACHE_SIZE = int(os.getenv("LLM_RESPONSE_CACHE_SIZE", 1024))
+RESPONSE_CACHE_TTL = int(os.getenv("LLM_RESPONSE_CACHE_TTL", 7 * 24 * 3600))
+
+
+def normalize_content(content):
+    """去掉首尾空白并合并连续空白，使仅排版不同的内容命中同一缓存"""
+    return re.sub(r'\s+', ' ', content or '').strip()
+
+
+class ResponseCache:
+    """带TTL的LRU缓存"""
+
+    def __init__(self, max_size=1024, ttl_seconds=7 * 24 * 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(template, variant, content):
+        digest = hashlib.sha256()
+        for part in (template, variant, normalize_content(content)):
+            digest.update((part or '').encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created_at, value = entry
+            if now - created_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def persistent_since(self):
+        """持久层只复用TTL范围内的历史记录"""
+        return china_time_now() - timedelta(seconds=self.ttl_seconds)
+
+    def find(self, key, lookup=None):
+        """依次查询内存缓存和持久层，都未命中时返回None
+
+        :param key: make_key生成的缓存键
+        :param lookup: 可选的无参函数，从历史记录表查询之前的生成结果，未找到时返回None
+        """
+        value = self.get(key)
+        if value is not None or lookup is None:
+            return value
+        try:
+            value = lookup()
+        except Exception as e:
+            print(f"查询历史生成结果失败: {str(e)}")
+            return None
+        if value:
+            self.set(key, value)
+            return value
+        return None
+
+    def get_or_generate(self, key, generate, lookup=None):
+        """缓存未命中时调用generate生成
+
+        :param generate: 无参函数，调用大模型生成结果
+        :return: (结果文本, 是否命中缓存)
+        """
+        value = self.find(key, lookup)
+        if value is not None:
+            return value, True
+        value = generate()
+        if value:
+            self.set(key, value)
+        return value, False
+
+    def get_or_stream(self, key, stream, lookup=None):
+        """流式版本，缓存未命中时调用stream得到逐段输出，完整输出后写入缓存
+
+        :param stream: 无参函数，返回大模型逐段输出的迭代器
+        :return: (逐段文本的迭代器, 是否命中缓存)
+        """
+        value = self.find(key, lookup)
+        if value is not None:
+            return iter([value]), True
+
+        def chunks():
+            parts = []
+            for part in stream():
+                parts.append(part)
+                yield part
+            value = "".join(parts).strip()
+            if value:
+                self.set(key, value)
+        return chunks(), False
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+
+def history_lookup(model, date_column, result_column, key):
+    """返回持久层查询函数: TTL范围内缓存键为key的最近一条历史记录的生成结果
+
+    :param model: 保存cache_key列的历史记录模型
+    :param date_column: 记录时间列
+    :param result_column: 生成结果所在的属性名
+    """
+    def lookup():
+        previous = model.query.filter(
+            model.cache_key == key,
+            date_column >= response_cache.persistent_since()
+        ).order_by(date_column.desc()).first()
+        return getattr(previous, result_column) if previous else None
+    return lookup
+
+
+def cached_llm_response(key, lookup, save, messages, purpose, message, stream=False, **chat_kwargs):
+    """优先使用缓存的生成结果，未命中时调用大模型，完成后保存历史记录
+
+    :param key: make_key生成的缓存键
+    :param lookup: 持久层查询函数，见history_lookup
+    :param save: save(生成结果, 是否命中缓存)，保存历史记录并返回响应数据
+    :param messages: 大模型对话消息
+    :param purpose: 大模型网关记录的调用用途
+    :param message: 成功时的响应消息
+    :param stream: 为True时以SSE逐段推送生成内容，生成完成后保存历史记录
+    :param chat_kwargs: max_tokens、temperature、timeout等大模型参数
+    """
+    if stream:
+        chunks, cached = response_cache.get_or_stream(
+            key, lambda: stream_chat(messages, purpose=purpose, **chat_kwargs), lookup
+        )
+        return sse_response(stream_text_events(chunks, lambda text: save(text, cached)))
+    value, cached = response_cache.get_or_generate(
+        key, lambda: chat(messages, purpose=purpose, **chat_kwargs).strip(), lookup
+    )
+    return api_response(True, message, save(value, cached))
@@ -0,0 +1,106 @@
+"""百度搜索结果页解析
+
+按可用性依次选择解析后端: selectolax(基于C的Lexbor) > lxml > BeautifulSoup。
+可通过环境变量 SEARCH_PARSER_BACKEND 指定。
+每个后端只遍历一次结果节点，在同一遍中取出标题、链接和摘要，选择器在导入时预先编译。
+
+返回格式统一为 [{"title", "link", "abstract"}]，没有摘要时abstract为None。
+"""
+import os
+
+RESULT_SELECTOR = '.result.c-container'
+TITLE_SELECTOR = '.t a'
+ABSTRACT_SELECTOR = '.c-abstract'
+
+
+def _class_xpath(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _parse_selectolax(html):
+    results = []
+    for node in HTMLParser(html).css(RESULT_SELECTOR):
+        title_elem = node.css_first(TITLE_SELECTOR)
+        if title_elem is None:
+            continue
+        abstract_elem = node.css_first(ABSTRACT_SELECTOR)
+        results.append({
+            "title": title_elem.text().strip(),
+            "link": title_elem.attributes.get('href') or '',
+            "abstract": abstract_elem.text().strip() if abstract_elem is not None else None
+        })
+    return results
+
+
+def _parse_lxml(html):
+    results = []
+    for node in _RESULT_XPATH(lxml_html.fromstring(html)):
+        titles = _TITLE_XPATH(node)
+        if not titles:
+            continue
+        abstracts = _ABSTRACT_XPATH(node)
+        results.append({
+            "title": titles[0].text_content().strip(),
+            "link": titles[0].get('href', ''),
+            "abstract": abstracts[0].text_content().strip() if abstracts else None
+        })
+    return results
+
+
+def _parse_bs4(html):
+    results = []
+    for node in BeautifulSoup(html, 'html.parser').select(RESULT_SELECTOR):
+        title_elem = node.select_one(TITLE_SELECTOR)
+        if not title_elem:
+            continue
+        abstract_elem = node.select_one(ABSTRACT_SELECTOR)
+        results.append({
+            "title": title_elem.get_text().strip(),
+            "link": title_elem.get('href', ''),
+            "abstract": abstract_elem.get_text().strip() if abstract_elem else None
+        })
+    return results
+
+
+PARSERS = {}
+
+try:
+    from selectolax.parser import HTMLParser
+    PARSERS['selectolax'] = _parse_selectolax
+except ImportError:
+    pass
+
+try:
+    from lxml import etree, html as lxml_html
+    _RESULT_XPATH = etree.XPath(f"//*[{_class_xpath('result')} and {_class_xpath('c-container')}]")
+    _TITLE_XPATH = etree.XPath(f".//*[{_class_xpath('t')}]//a")
+    _ABSTRACT_XPATH = etree.XPath(f".//*[{_class_xpath('c-abstract')}]")
+    PARSERS['lxml'] = _parse_lxml
+except ImportError:
+    pass
+
+try:
+    from bs4 import BeautifulSoup
+    PARSERS['bs4'] = _parse_bs4
+except ImportError:
+    pass
+
+if not PARSERS:
+    raise ImportError("需要安装selectolax、lxml或beautifulsoup4之一来解析搜索结果")
+
+PARSER_BACKEND = os.getenv("SEARCH_PARSER_BACKEND") or next(iter(PARSERS))
+if PARSER_BACKEND not in PARSERS:
+    raise ValueError(f"搜索结果解析后端不可用: {PARSER_BACKEND}，可用选项: {', '.join(PARSERS)}")
+
+
+def parse_search_results(html, backend=None):
+    """解析百度搜索结果页
+
+    参数:
+        html (str): 搜索结果页HTML
+        backend (str, 可选): 指定解析后端，默认使用PARSER_BACKEND
+
+    返回:
+        list: [{"title", "link", "abstract"}]
+    """
+    return PARSERS[backend or PARSER_BACKEND](html)
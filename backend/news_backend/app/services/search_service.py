@@ -0,0 +1,144 @@
+"""新闻事实检索的搜索层
+
+search_related_news 和 search_and_fetch_news 在同一次检测中会搜索同一句话，
+热点谣言也会被不同用户反复提交。本模块统一负责百度搜索:
+    - 共享的HTTP连接池
+    - 按查询词缓存解析后的搜索结果，带TTL；空结果可能是临时被拦截，只缓存很短的时间
+    - 请求合并: 并发的相同查询只发起一次请求，其余等待同一结果
+    - 令牌桶限流，避免突发流量触发搜索引擎的反爬限制
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import requests
+from requests.adapters import HTTPAdapter
+from app.services.search_parser import parse_search_results
+
+SEARCH_URL = "https://www.baidu.com/s"
+SEARCH_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+SEARCH_TIMEOUT = 5
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 1024))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", 3600))
+SEARCH_EMPTY_CACHE_TTL = int(os.getenv("SEARCH_EMPTY_CACHE_TTL", 60))
+# 每秒补充的令牌数和令牌桶容量(允许的突发请求数)
+SEARCH_RATE = float(os.getenv("SEARCH_RATE", 2))
+SEARCH_BURST = int(os.getenv("SEARCH_BURST", 5))
+# 等待令牌的最长时间(秒)，超过则放弃本次搜索
+SEARCH_MAX_WAIT = float(os.getenv("SEARCH_MAX_WAIT", 3))
+
+
+def extract_search_query(text, max_length=50):
+    """提取文本的第一句话作为搜索关键词"""
+    first_sentence = ""
+    # 尝试按常见的标点符号分割，提取第一句话
+    for delimiter in ["。", "！", "？", ".", "!", "?"]:
+        if delimiter in text:
+            first_sentence = text.split(delimiter)[0].strip()
+            break
+
+    # 如果无法通过标点符号分割，就取前100个字符
+    if not first_sentence:
+        first_sentence = text[:100].strip()
+
+    # 确保搜索词不会太长
+    return first_sentence[:max_length]
+
+
+class TokenBucket:
+    """令牌桶限流器"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        """获取一个令牌，timeout秒内获取不到时返回False"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class SearchService:
+    """带缓存、请求合并和限流的搜索客户端"""
+
+    def __init__(self, cache_size=1024, cache_ttl=3600, rate=2, burst=5, max_wait=3, empty_cache_ttl=60):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.empty_cache_ttl = empty_cache_ttl
+        self.max_wait = max_wait
+        self.limiter = TokenBucket(rate, burst)
+        self.session = requests.Session()
+        self.session.headers.update(SEARCH_HEADERS)
+        self.session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=16))
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def search(self, query):
+        """搜索query，返回解析后的结果列表；搜索失败时抛出异常"""
+        with self._lock:
+            entry = self._cache.get(query)
+            if entry is not None and time.time() <= entry[0]:
+                self._cache.move_to_end(query)
+                return entry[1]
+            future = self._inflight.get(query)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[query] = future
+        if not owner:
+            # 相同查询正在进行中，等待其结果
+            return future.result(timeout=SEARCH_TIMEOUT + self.max_wait + 1)
+
+        try:
+            results = self._fetch(query)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(results)
+            self._remember(query, results)
+            return results
+        finally:
+            with self._lock:
+                self._inflight.pop(query, None)
+
+    def _fetch(self, query):
+        if not self.limiter.acquire(self.max_wait):
+            raise RuntimeError("搜索请求过于频繁，已被限流")
+        response = self.session.get(SEARCH_URL, params={"wd": query}, timeout=SEARCH_TIMEOUT)
+        response.raise_for_status()
+        return parse_search_results(response.text)
+
+    def _remember(self, query, results):
+        ttl = self.cache_ttl if results else self.empty_cache_ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            # 缓存项保存过期时间
+            self._cache[query] = (time.time() + ttl, results)
+            self._cache.move_to_end(query)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+search_service = SearchService(
+    SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, SEARCH_RATE, SEARCH_BURST, SEARCH_MAX_WAIT, SEARCH_EMPTY_CACHE_TTL
+)
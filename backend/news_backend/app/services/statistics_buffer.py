@@ -0,0 +1,85 @@
+"""统计计数的内存写缓冲
+
+开启 STATISTICS_WRITE_BEHIND 后，每次检测只在内存中累加计数，
+后台线程每隔 STATISTICS_FLUSH_INTERVAL 秒把累计的增量合并写入数据库:
+全局统计一条UPDATE，每个(用户, 检测类型, 日期)一组upsert，在同一个事务中提交。
+热门时段每秒上百次检测对全局统计行的写入由此合并为每个进程每个周期一次。
+"""
+import atexit
+import os
+import threading
+import time
+from collections import defaultdict
+
+STATISTICS_FLUSH_INTERVAL = float(os.getenv("STATISTICS_FLUSH_INTERVAL", 2))
+
+
+class StatisticsBuffer:
+    """按(用户, 检测类型, 日期)累加计数，定期批量写入数据库"""
+
+    def __init__(self, flush_interval=2.0):
+        self.flush_interval = flush_interval
+        self.app = None
+        self._pending = defaultdict(lambda: [0, 0, 0])
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        atexit.register(self.flush)
+
+    def start(self):
+        """启动写入线程，fork出的worker进程在首次记录计数时启动自己的线程"""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # 父进程中尚未写入的计数由父进程负责
+                self._pending.clear()
+            self._thread = threading.Thread(target=self._run, name="statistics-writer", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def add(self, user_id, detection_type, date, fake):
+        """记录一次检测，fake为1表示虚假，0表示真实"""
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            self.start()
+        with self._lock:
+            counts = self._pending[(user_id, detection_type, date)]
+            counts[0] += 1
+            counts[1] += fake
+            counts[2] += 1 - fake
+
+    def flush(self):
+        """把累计的增量写入数据库，失败时放回缓冲等待下次写入"""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, defaultdict(lambda: [0, 0, 0])
+
+        from app import db
+        from app.utils.common import increment_global_statistics, apply_statistics
+        with self.app.app_context():
+            try:
+                total, fake, real = (sum(counts[i] for counts in pending.values()) for i in range(3))
+                increment_global_statistics(total, fake, real)
+                for (user_id, detection_type, date), (total, fake, real) in pending.items():
+                    apply_statistics(user_id, detection_type, date, total, fake, real)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"写入统计计数失败: {str(e)}")
+                with self._lock:
+                    for key, counts in pending.items():
+                        merged = self._pending[key]
+                        for i in range(3):
+                            merged[i] += counts[i]
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+statistics_buffer = StatisticsBuffer(STATISTICS_FLUSH_INTERVAL)
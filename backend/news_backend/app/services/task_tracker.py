@@ -0,0 +1,239 @@
+"""DashScope图像生成任务跟踪
+
+每个进程只有一个后台线程，集中轮询本进程跟踪的全部DashScope任务:
+    - 每个任务按自适应退避的间隔查询(从TASK_POLL_MIN_INTERVAL开始逐步拉长到TASK_POLL_MAX_INTERVAL)
+    - 状态变化写入 ImageGeneration.task_status
+    - 任务成功后在下载线程池中下载图片，不阻塞其他任务的轮询；
+      用条件更新抢占下载权，多个进程同时跟踪同一任务时只下载一次，
+      抢占下载权的进程退出后，超过TASK_DOWNLOAD_STALE_SECONDS的下载权会被收回重新下载
+    - 等待结果的请求通过 wait() 阻塞在条件变量上，不再各自sleep轮询
+
+其他进程创建的任务在查询状态时被懒加载跟踪(adopt)。
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from app import db
+from app.models.image_generation import ImageGeneration
+from app.services.image_gen_service import get_task_result, download_task_images
+from app.utils.time_util import china_time_now
+
+TASK_POLL_MIN_INTERVAL = float(os.getenv("TASK_POLL_MIN_INTERVAL", 1))
+TASK_POLL_MAX_INTERVAL = float(os.getenv("TASK_POLL_MAX_INTERVAL", 10))
+TASK_POLL_BACKOFF = float(os.getenv("TASK_POLL_BACKOFF", 1.5))
+# 创建后超过该时间(秒)仍未完成的任务记为超时
+TASK_TIMEOUT_SECONDS = int(os.getenv("TASK_TIMEOUT_SECONDS", 600))
+# 处于DOWNLOADING状态超过该时间(秒)的下载权视为所在进程已退出，收回后重新下载
+TASK_DOWNLOAD_STALE_SECONDS = int(os.getenv("TASK_DOWNLOAD_STALE_SECONDS", 300))
+# 每个进程同时下载结果的任务数
+TASK_DOWNLOAD_WORKERS = int(os.getenv("TASK_DOWNLOAD_WORKERS", 4))
+
+ACTIVE_STATUSES = ('PENDING', 'RUNNING')
+# PARTIAL_SUCCEEDED: 部分图片生成或保存失败，只返回保存成功的图片
+FINAL_STATUSES = ('SUCCEEDED', 'PARTIAL_SUCCEEDED', 'FAILED', 'TIMEOUT', 'UNKNOWN')
+
+
+def effective_status(generation):
+    """记录的任务状态，新增task_status列之前已完成的旧记录按是否有图片推断"""
+    if generation.task_status is None and generation.image_paths:
+        return 'SUCCEEDED'
+    return generation.task_status
+
+
+class TaskTracker:
+    """集中轮询DashScope任务状态的后台线程"""
+
+    def __init__(self, min_interval=1.0, max_interval=10.0, backoff=1.5, download_workers=4):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.download_workers = download_workers
+        self.app = None
+        self._tasks = {}
+        self._downloading = set()
+        self._cond = threading.Condition()
+        self._pid = None
+        self._thread = None
+        self._download_executor = None
+
+    def init_app(self, app):
+        self.app = app
+
+    def start(self):
+        """启动轮询线程，fork出的worker进程在首次跟踪任务时启动自己的线程"""
+        with self._cond:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._tasks = {}
+                self._downloading = set()
+                # 线程池中的线程不会随fork复制，子进程创建自己的线程池
+                self._download_executor = ThreadPoolExecutor(
+                    max_workers=self.download_workers, thread_name_prefix='dashscope-download'
+                )
+            self._thread = threading.Thread(target=self._run, name="dashscope-tracker", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def track(self, task_id):
+        """开始跟踪一个任务，已在跟踪中则忽略"""
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            self.start()
+        with self._cond:
+            if task_id not in self._tasks:
+                self._tasks[task_id] = {
+                    'interval': self.min_interval,
+                    'next_poll': time.monotonic() + self.min_interval
+                }
+                self._cond.notify_all()
+
+    def is_tracked(self, task_id):
+        with self._cond:
+            return self._pid == os.getpid() and task_id in self._tasks
+
+    def wait(self, task_id, timeout):
+        """等待任务结束(或超过timeout秒)，任务已结束时返回True"""
+        with self._cond:
+            return self._cond.wait_for(lambda: task_id not in self._tasks, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._tasks:
+                    self._cond.wait()
+                now = time.monotonic()
+                due = [task_id for task_id, task in self._tasks.items() if task['next_poll'] <= now]
+                if not due:
+                    self._cond.wait(min(task['next_poll'] for task in self._tasks.values()) - now)
+                    continue
+
+            for task_id in due:
+                try:
+                    finished = self._poll(task_id)
+                except Exception as e:
+                    print(f"查询图像生成任务失败 {task_id}: {str(e)}")
+                    finished = False
+                with self._cond:
+                    if finished:
+                        self._tasks.pop(task_id, None)
+                        self._cond.notify_all()
+                    elif task_id in self._tasks:
+                        task = self._tasks[task_id]
+                        task['interval'] = min(self.max_interval, task['interval'] * self.backoff)
+                        task['next_poll'] = time.monotonic() + task['interval']
+
+    @staticmethod
+    def _transition(generation_id, from_statuses, values, *criteria):
+        """条件更新: 只有当前状态在from_statuses中(且满足criteria)时才更新，返回是否更新成功"""
+        status_filter = ImageGeneration.task_status.in_([status for status in from_statuses if status])
+        if None in from_statuses:
+            status_filter = db.or_(status_filter, ImageGeneration.task_status.is_(None))
+        updated = ImageGeneration.query.filter(
+            ImageGeneration.generation_id == generation_id, status_filter, *criteria
+        ).update(values, synchronize_session=False)
+        db.session.commit()
+        return updated == 1
+
+    def _poll(self, task_id):
+        """查询一次任务状态，任务已结束(不再需要跟踪)时返回True"""
+        with self.app.app_context():
+            generation = ImageGeneration.query.filter_by(task_id=task_id).first()
+            if generation is None or effective_status(generation) in FINAL_STATUSES:
+                return True
+            active = ACTIVE_STATUSES + (None,)
+            now = china_time_now()
+
+            # 超时判断放在最前面，卡在DOWNLOADING的任务同样会超时
+            if now - generation.generation_date > timedelta(seconds=TASK_TIMEOUT_SECONDS):
+                if task_id in self._downloading:
+                    # 本进程正在下载，等下载结束
+                    return False
+                self._transition(generation.generation_id, active + ('DOWNLOADING',), {'task_status': 'TIMEOUT'})
+                return True
+
+            if generation.task_status == 'DOWNLOADING':
+                claimed_at = generation.task_claimed_at
+                if (task_id not in self._downloading and
+                        (claimed_at is None or now - claimed_at > timedelta(seconds=TASK_DOWNLOAD_STALE_SECONDS))):
+                    # 抢占下载权的进程已退出，收回下载权，下次轮询重新下载
+                    self._transition(
+                        generation.generation_id, ('DOWNLOADING',), {'task_status': 'RUNNING', 'task_claimed_at': None},
+                        ImageGeneration.task_claimed_at == claimed_at if claimed_at else ImageGeneration.task_claimed_at.is_(None)
+                    )
+                # 其他线程或进程正在下载结果，等待其写入最终状态
+                return False
+
+            result = get_task_result(task_id)
+            if not result:
+                return False
+            output = result.get('output', {})
+            task_status = output.get('task_status')
+
+            if task_status in ACTIVE_STATUSES:
+                if generation.task_status != task_status:
+                    self._transition(generation.generation_id, active, {'task_status': task_status})
+                return False
+
+            if task_status == 'SUCCEEDED':
+                # 抢占下载权，只有一个进程会下载同一任务的图片
+                # DATETIME列不保存微秒，去掉微秒后才能在条件更新中匹配
+                claimed_at = china_time_now().replace(microsecond=0)
+                if not self._transition(generation.generation_id, active,
+                                        {'task_status': 'DOWNLOADING', 'task_claimed_at': claimed_at}):
+                    return False
+                with self._cond:
+                    self._downloading.add(task_id)
+                self._download_executor.submit(
+                    self._download, task_id, generation.generation_id, str(generation.user_id),
+                    output.get('results', []), claimed_at
+                )
+                return False
+
+            # FAILED、CANCELED等
+            final_status = 'FAILED' if task_status in ('FAILED', 'CANCELED') else 'UNKNOWN'
+            self._transition(generation.generation_id, active, {
+                'task_status': final_status,
+                'task_output': json.dumps(output, ensure_ascii=False)
+            })
+            return True
+
+    def _download(self, task_id, generation_id, user_id, results, claimed_at):
+        """在下载线程池中下载任务结果并写入最终状态"""
+        finished = False
+        try:
+            with self.app.app_context():
+                try:
+                    saved_images, image_paths = download_task_images(user_id, results)
+                except Exception as e:
+                    print(f"下载图像生成结果失败 {task_id}: {str(e)}")
+                    # 释放下载权，下次轮询重新下载
+                    self._transition(generation_id, ('DOWNLOADING',), {'task_status': 'RUNNING', 'task_claimed_at': None},
+                                     ImageGeneration.task_claimed_at == claimed_at)
+                    return
+                if not saved_images:
+                    # 任务成功但结果中没有图片地址
+                    values = {'task_status': 'FAILED', 'task_output': json.dumps({'results': results}, ensure_ascii=False)}
+                else:
+                    values = {
+                        'task_status': 'SUCCEEDED' if len(saved_images) == len(results) else 'PARTIAL_SUCCEEDED',
+                        'task_output': json.dumps(saved_images, ensure_ascii=False),
+                        'image_paths': json.dumps(image_paths)
+                    }
+                self._transition(generation_id, ('DOWNLOADING',), values, ImageGeneration.task_claimed_at == claimed_at)
+                finished = True
+        except Exception as e:
+            print(f"写入图像生成结果失败 {task_id}: {str(e)}")
+        finally:
+            with self._cond:
+                self._downloading.discard(task_id)
+                if finished:
+                    self._tasks.pop(task_id, None)
+                elif task_id in self._tasks:
+                    self._tasks[task_id]['next_poll'] = time.monotonic()
+                self._cond.notify_all()
+
+
+task_tracker = TaskTracker(TASK_POLL_MIN_INTERVAL, TASK_POLL_MAX_INTERVAL, TASK_POLL_BACKOFF, TASK_DOWNLOAD_WORKERS)
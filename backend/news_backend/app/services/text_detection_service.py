@@ -1,11 +1,10 @@
-from openai import OpenAI
 import os
 import jieba
 import jieba.analyse
 from dotenv import load_dotenv
-import requests
-from bs4 import BeautifulSoup
 import random
+from app.services.search_service import search_service, extract_search_query
+from app.services.llm_gateway import chat
 # 加载环境变量
 load_dotenv()
 # 获取API密钥
@@ -74,19 +73,7 @@ def search_related_news(text, max_links=3):
     """
     try:
         # 提取第一句话作为搜索关键词
-        first_sentence = ""
-        # 尝试按常见的标点符号分割，提取第一句话
-        for delimiter in ["。", "！", "？", ".", "!", "?"]:
-            if delimiter in text:
-                first_sentence = text.split(delimiter)[0].strip()
-                break
-        
-        # 如果无法通过标点符号分割，就取前100个字符
-        if not first_sentence:
-            first_sentence = text[:100].strip()
-            
-        # 确保搜索词不会太长
-        search_query = first_sentence[:50]
+        search_query = extract_search_query(text)
         print(f"搜索关键词(第一句话): {search_query}")
         
         related_links = []
@@ -104,28 +91,16 @@ def search_related_news(text, max_links=3):
         
         # 2. 尝试使用百度搜索(简单模拟，实际使用时可能需要更复杂的处理)
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            search_url = f"https://www.baidu.com/s?wd={search_query}"
-            
-            response = requests.get(search_url, headers=headers, timeout=5)
+            # 与search_and_fetch_news共用搜索缓存，同一次检测只发起一次搜索
+            search_results = search_service.search(search_query)
             
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                # 提取搜索结果
-                search_results = soup.select('.result.c-container')
-                
-                for result in search_results[:2]:  # 只取前2个结果
-                    title_elem = result.select_one('.t a')
-                    if title_elem:
-                        title = title_elem.get_text()
-                        link = title_elem.get('href', '')
-                        if link and link.startswith('http'):
-                            related_links.append({
-                                "title": title,
-                                "link": link
-                            })
+            for result in search_results[:2]:  # 只取前2个结果
+                link = result["link"]
+                if link and link.startswith('http'):
+                    related_links.append({
+                        "title": result["title"],
+                        "link": link
+                    })
         except Exception as e:
             print(f"百度搜索失败: {str(e)}")
             # 如果百度搜索失败，添加一些预定义的辟谣网站
@@ -168,19 +143,7 @@ def search_and_fetch_news(text, max_results=3):
     """
     try:
         # 提取第一句话作为搜索关键词
-        first_sentence = ""
-        # 尝试按常见的标点符号分割，提取第一句话
-        for delimiter in ["。", "！", "？", ".", "!", "?"]:
-            if delimiter in text:
-                first_sentence = text.split(delimiter)[0].strip()
-                break
-        
-        # 如果无法通过标点符号分割，就取前100个字符
-        if not first_sentence:
-            first_sentence = text[:100].strip()
-            
-        # 确保搜索词不会太长
-        search_query = first_sentence[:50]
+        search_query = extract_search_query(text)
         print(f"搜索关键词(第一句话): {search_query}")
         
         search_results = []
@@ -188,32 +151,13 @@ def search_and_fetch_news(text, max_results=3):
         
         # 1. 尝试使用百度搜索
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            search_url = f"https://www.baidu.com/s?wd={search_query}"
-            
-            response = requests.get(search_url, headers=headers, timeout=5)
+            search_results = search_service.search(search_query)
             
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                # 提取搜索结果
-                search_results = soup.select('.result.c-container')
-                
-                for i, result in enumerate(search_results[:max_results]):
-                    # 提取标题和摘要
-                    title_elem = result.select_one('.t a')
-                    abstract_elem = result.select_one('.c-abstract')
-                    
-                    if title_elem:
-                        title = title_elem.get_text().strip()
-                        link = title_elem.get('href', '')
-                        abstract = abstract_elem.get_text().strip() if abstract_elem else "无摘要"
-                        
-                        # 添加到搜索结果摘要中
-                        fetched_content += f"信息来源{i+1}：{title}\n"
-                        fetched_content += f"摘要：{abstract}\n"
-                        fetched_content += f"链接：{link}\n\n"
+            for i, result in enumerate(search_results[:max_results]):
+                # 添加到搜索结果摘要中
+                fetched_content += f"信息来源{i+1}：{result['title']}\n"
+                fetched_content += f"摘要：{result['abstract'] or '无摘要'}\n"
+                fetched_content += f"链接：{result['link']}\n\n"
         except Exception as e:
             print(f"百度搜索失败: {str(e)}")
         
@@ -237,9 +181,8 @@ def search_and_fetch_news(text, max_results=3):
         # 返回搜索到的内容摘要和相关链接
         related_links = []
         for result in search_results[:max_results]:
-            title_elem = result.select_one('.t a')
-            if title_elem and title_elem.get('href', '').startswith('http'):
-                related_links.append(title_elem.get('href'))
+            if result["link"].startswith('http'):
+                related_links.append(result["link"])
         
         # 如果没有足够的链接，添加一些预定义的链接
         while len(related_links) < max_results:
@@ -285,21 +228,15 @@ def detect_text_content(content):
         
         # 调用DeepSeek API
         try:
-            client = OpenAI(
-                api_key=DEEPSEEK_API_KEY,
-                base_url="https://api.deepseek.com"
-            )
-            print("DeepSeek客户端创建成功")
-            
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
+            answer = chat(
+                [
                     {"role": "system", "content": "你是一个专业的假新闻检测专家"},
                     {"role": "user", "content": TEXT_DETECTION_PROMPT.format(
                         content=content,
                         search_results=search_content
                     )}
                 ],
+                purpose="text_detection",
                 timeout=100
             )
             print("DeepSeek API调用成功")
@@ -309,7 +246,6 @@ def detect_text_content(content):
             raise api_error
         
         # 获取回答内容
-        answer = response.choices[0].message.content
         print(f"DeepSeek返回内容: {answer[:100]}...")
         
         # 使用jieba提取关键词
@@ -0,0 +1,209 @@
+"""中译英翻译服务
+
+HAMMER模型只接受英文文本，多模态检测前需要把新闻内容翻译为英文。
+支持两种后端，通过环境变量 TRANSLATION_BACKEND 选择:
+    llm:   调用DeepSeek大模型翻译
+    local: 本地CPU机器翻译模型(默认 Helsinki-NLP/opus-mt-zh-en)，失败时回退到大模型
+默认为 local，不再为每次翻译发起网络请求。本地模型依赖 transformers、sentencepiece 和 torch，
+模型加载失败后本进程不再重试，之后都使用大模型；大模型翻译多段文本时并发调用。
+翻译结果按文本的SHA-256缓存在进程内。
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.services.llm_gateway import chat
+
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "local")
+TRANSLATION_MODEL = os.getenv("TRANSLATION_MODEL", "Helsinki-NLP/opus-mt-zh-en")
+# 本地模型单次生成的句子数
+TRANSLATION_BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", 16))
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", 2048))
+# 大模型翻译多段文本时的并发请求数
+TRANSLATION_LLM_WORKERS = int(os.getenv("TRANSLATION_LLM_WORKERS", 4))
+# 超过该长度的句子继续按逗号切分，避免超出模型的最大输入长度
+MAX_SEGMENT_CHARS = 200
+
+# 翻译提示模板
+TEXT_TRANSLATE_PROMPT = """
+你是一个专业的文本翻译专家。请将以下中文内容翻译为英文：
+
+【待翻译内容】
+{content}
+
+只需要输出翻译结果，不要输出任何解释。
+"""
+
+
+class TranslationCache:
+    """按文本哈希缓存翻译结果的LRU缓存"""
+
+    def __init__(self, max_size=2048):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text):
+        return hashlib.sha256(text.strip().encode('utf-8')).hexdigest()
+
+    def get(self, text):
+        key = self.make_key(text)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, text, translated):
+        key = self.make_key(text)
+        with self._lock:
+            self._entries[key] = translated
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class LocalTranslator:
+    """本地MarianMT机器翻译模型，首次使用时加载"""
+
+    def __init__(self, model_name, batch_size=16):
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self._model = None
+        self._tokenizer = None
+        self._load_error = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        """模型未加载失败过时为True"""
+        return self._load_error is None
+
+    def _load(self):
+        if self._load_error is not None:
+            raise RuntimeError(self._load_error)
+        if self._model is None:
+            try:
+                from transformers import MarianMTModel, MarianTokenizer
+                print(f"加载本地翻译模型: {self.model_name}")
+                self._tokenizer = MarianTokenizer.from_pretrained(self.model_name)
+                self._model = MarianMTModel.from_pretrained(self.model_name).eval()
+            except Exception as e:
+                # 记住失败原因，避免每个请求都持锁重新下载模型
+                self._load_error = f"本地翻译模型加载失败: {str(e)}"
+                print(f"{self._load_error}，之后使用大模型翻译")
+                raise RuntimeError(self._load_error)
+
+    @staticmethod
+    def split_segments(text):
+        """按句末标点切分长文本，过长的句子再按逗号切分"""
+        segments = []
+        for sentence in re.split(r'(?<=[。！？!?；;\n])', text):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if len(sentence) <= MAX_SEGMENT_CHARS:
+                segments.append(sentence)
+                continue
+            for piece in re.split(r'(?<=[，,])', sentence):
+                piece = piece.strip()
+                while len(piece) > MAX_SEGMENT_CHARS:
+                    segments.append(piece[:MAX_SEGMENT_CHARS])
+                    piece = piece[MAX_SEGMENT_CHARS:]
+                if piece:
+                    segments.append(piece)
+        return segments
+
+    def translate_batch(self, texts):
+        """批量翻译，多段文本的句子合并后按batch_size分批送入模型"""
+        import torch
+        segments_per_text = [self.split_segments(text) for text in texts]
+        all_segments = [segment for segments in segments_per_text for segment in segments]
+        translated_segments = []
+        with self._lock:
+            self._load()
+            with torch.no_grad():
+                for start in range(0, len(all_segments), self.batch_size):
+                    batch = all_segments[start:start + self.batch_size]
+                    inputs = self._tokenizer(batch, return_tensors="pt", padding=True, truncation=True, max_length=512)
+                    outputs = self._model.generate(**inputs, num_beams=1, max_new_tokens=512)
+                    translated_segments.extend(self._tokenizer.batch_decode(outputs, skip_special_tokens=True))
+
+        results = []
+        offset = 0
+        for segments in segments_per_text:
+            results.append(" ".join(translated_segments[offset:offset + len(segments)]))
+            offset += len(segments)
+        return results
+
+
+def translate_with_llm(content):
+    """调用DeepSeek大模型翻译单段文本"""
+    return chat(
+        [
+            {"role": "system", "content": "You are a helpful assistant specialized in translation."},
+            {"role": "user", "content": TEXT_TRANSLATE_PROMPT.format(content=content)}
+        ],
+        purpose="translate",
+        timeout=100
+    )
+
+
+def _translate_with_llm_safely(content):
+    try:
+        return translate_with_llm(content)
+    except Exception as e:
+        print(f"大模型翻译失败: {str(e)}")
+        return None
+
+
+translation_cache = TranslationCache(TRANSLATION_CACHE_SIZE)
+local_translator = LocalTranslator(TRANSLATION_MODEL, TRANSLATION_BATCH_SIZE)
+# 大模型翻译专用线程池，不占用检测流程共用的线程池，避免在其中嵌套提交任务
+llm_executor = ThreadPoolExecutor(max_workers=TRANSLATION_LLM_WORKERS, thread_name_prefix='translate-llm')
+
+
+def translate_texts(contents):
+    """批量中译英
+
+    :param contents: 待翻译的文本列表
+    :return: 与输入等长的译文列表，翻译失败的位置为None
+    """
+    results = [translation_cache.get(content) if content else None for content in contents]
+    # 同一批中重复的文本只翻译一次
+    pending = list(dict.fromkeys(
+        content for content, result in zip(contents, results) if content and result is None
+    ))
+    translated = {}
+
+    if pending and TRANSLATION_BACKEND == "local" and local_translator.available:
+        try:
+            translated.update(zip(pending, local_translator.translate_batch(pending)))
+        except Exception as e:
+            print(f"本地翻译模型不可用，回退到大模型翻译: {str(e)}")
+
+    remaining = [content for content in pending if content not in translated]
+    if len(remaining) == 1:
+        translated[remaining[0]] = _translate_with_llm_safely(remaining[0])
+    elif remaining:
+        translated.update(zip(remaining, llm_executor.map(_translate_with_llm_safely, remaining)))
+
+    for content, text in translated.items():
+        if text:
+            translation_cache.set(content, text)
+    return [
+        result if result is not None else translated.get(content)
+        for content, result in zip(contents, results)
+    ]
+
+
+def translate_text(content):
+    """中译英，失败时返回None"""
+    try:
+        return translate_texts([content])[0]
+    except Exception as e:
+        print(f"翻译过程中发生错误: {str(e)}")
+        return None
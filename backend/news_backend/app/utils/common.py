@@ -1,6 +1,10 @@
 from flask import jsonify
 from app import db
-from app.models.news_statistics import NewsStatistics, NewsStatisticsByUser
+from app.models.news_statistics import NewsStatistics, NewsStatisticsByUser, DetectionTypeCounter, DailyDetectionRollup
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 import os
 from werkzeug.utils import secure_filename
 import tempfile
@@ -9,6 +13,7 @@ import PyPDF2
 import datetime
 from dotenv import load_dotenv
 from app.utils.time_util import china_time_now
+from app.services.statistics_buffer import statistics_buffer
 
 # 加载环境变量
 load_dotenv()
@@ -17,38 +22,103 @@ load_dotenv()
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 NEWS_API_KEY = os.getenv("NEWS_API_KEY")
 
+# 统计计数写入内存缓冲，由后台线程批量写入数据库(计数会有几秒延迟，进程异常退出时可能丢失未写入的部分)
+STATISTICS_WRITE_BEHIND = os.getenv("STATISTICS_WRITE_BEHIND", "false").lower() in ("1", "true")
 
-def update_statistics(user_id, is_fake):
-    """更新统计信息"""
-    # 更新全局统计
-    global_stats = NewsStatistics.query.first()
-    if not global_stats:
-        global_stats = NewsStatistics()
-        db.session.add(global_stats)
-    
-    global_stats.total_news_count += 1
-    if is_fake:
-        global_stats.total_fake_count += 1
-    else:
-        global_stats.total_real_count += 1
-    global_stats.last_updated = china_time_now()
-    
-    # 更新用户统计
-    user_stats = NewsStatisticsByUser.query.filter_by(user_id=user_id).first()
-    if not user_stats:
-        user_stats = NewsStatisticsByUser(user_id=user_id)
-        db.session.add(user_stats)
-    
-    user_stats.total_news_count += 1
-    if is_fake:
-        user_stats.total_fake_count += 1
-    else:
-        user_stats.total_real_count += 1
-    user_stats.last_updated = china_time_now()
+
+def increment_counter(model, keys, increments, values=None):
+    """在数据库中累加一行计数(x = x + n)，行不存在时插入
+
+    MySQL下使用 INSERT ... ON DUPLICATE KEY UPDATE 一条语句完成；
+    其他数据库先UPDATE，没有更新到行时在保存点中插入。
+
+    参数:
+        model: 计数表模型
+        keys (dict): 主键列及其值
+        increments (dict): 需要累加的列及增量
+        values (dict, 可选): 需要直接赋值的列
+    """
+    values = values or {}
+    if db.engine.dialect.name == 'mysql':
+        table = model.__table__
+        stmt = mysql_insert(table).values(**keys, **increments, **values)
+        updates = {name: table.c[name] + amount for name, amount in increments.items()}
+        updates.update(values)
+        db.session.execute(stmt.on_duplicate_key_update(updates))
+        return
+
+    updates = {getattr(model, name): getattr(model, name) + amount for name, amount in increments.items()}
+    updates.update({getattr(model, name): value for name, value in values.items()})
+    if model.query.filter_by(**keys).update(updates, synchronize_session=False):
+        return
+    try:
+        # 在保存点中插入，主键冲突时不影响调用者的事务
+        with db.session.begin_nested():
+            db.session.add(model(**keys, **increments))
+    except IntegrityError:
+        # 其他进程刚插入了同一行，改为累加
+        model.query.filter_by(**keys).update(updates, synchronize_session=False)
+
+
+def increment_global_statistics(total, fake, real):
+    """累加全局统计
+
+    news_statistics 表只有一行(主键是last_updated，无法按主键upsert)，
+    启动时由 ensure_statistics_tables 保证这一行存在，这里直接对整张表执行 x = x + n。
+    """
+    updated = NewsStatistics.query.update({
+        NewsStatistics.total_news_count: NewsStatistics.total_news_count + total,
+        NewsStatistics.total_fake_count: NewsStatistics.total_fake_count + fake,
+        NewsStatistics.total_real_count: NewsStatistics.total_real_count + real,
+        NewsStatistics.last_updated: china_time_now()
+    }, synchronize_session=False)
+    if not updated:
+        db.session.add(NewsStatistics(total_news_count=total, total_fake_count=fake, total_real_count=real))
+
+
+def apply_statistics(user_id, detection_type, date, total, fake, real):
+    """累加用户统计、按检测类型的计数和按天汇总"""
+    now = china_time_now()
+    increment_counter(NewsStatisticsByUser, {'user_id': user_id},
+                      {'total_news_count': total, 'total_fake_count': fake, 'total_real_count': real},
+                      {'last_updated': now})
+    increments = {'total_count': total, 'fake_count': fake, 'real_count': real}
+    increment_counter(DetectionTypeCounter, {'detection_type': detection_type}, increments, {'last_updated': now})
+    increment_counter(DailyDetectionRollup, {'date': date, 'detection_type': detection_type}, increments)
+
+
+def update_statistics(user_id, is_fake, detection_type='text'):
+    """更新统计信息
+
+    所有计数都在数据库中原子自增，多个worker并发写入时不会丢失更新。
+    开启 STATISTICS_WRITE_BEHIND 时在事务提交后记入内存缓冲，由后台线程定期批量写入。
+    """
+    fake = 1 if is_fake else 0
+    if STATISTICS_WRITE_BEHIND:
+        # 调用者提交事务后才计入缓冲，事务回滚时一起丢弃，计数与检测记录保持一致
+        db.session.info.setdefault('pending_statistics', []).append(
+            (user_id, detection_type, china_time_now().date(), fake)
+        )
+        return
+    increment_global_statistics(1, fake, 1 - fake)
+    apply_statistics(user_id, detection_type, china_time_now().date(), 1, fake, 1 - fake)
     
     # 不在这里提交事务，让调用者负责提交
     # db.session.commit()
 
+
+@event.listens_for(Session, 'after_commit')
+def _buffer_committed_statistics(session):
+    for args in session.info.pop('pending_statistics', []):
+        statistics_buffer.add(*args)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_rolled_back_statistics(session, previous_transaction):
+    # 只在最外层事务回滚时丢弃，保存点回滚不影响
+    if previous_transaction.parent is None:
+        session.info.pop('pending_statistics', None)
+
 def extract_text_from_file(file):
     """从不同类型的文件中提取文本内容"""
     filename = secure_filename(file.filename)
@@ -0,0 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+# 检测流程中翻译、搜索、生成理由等远程调用共用的线程池
+executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='detection-stage')
+
+
+def timed(timings, name, fn, *args, **kwargs):
+    """执行fn，并把耗时(毫秒)记录到timings[name]"""
+    begin = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        timings[name] = round((time.perf_counter() - begin) * 1000, 1)
+
+
+def submit_timed(timings, name, fn, *args, **kwargs):
+    """把fn提交到线程池执行并记录耗时，返回Future"""
+    return executor.submit(timed, timings, name, fn, *args, **kwargs)
@@ -0,0 +1,230 @@
+from contextlib import contextmanager
+from sqlalchemy import inspect, text
+from app import db
+
+
+def ensure_columns(model, column_names):
+    """为已存在的表补充模型中新增的列
+
+    db.create_all() 只创建缺失的表，不会修改已有表的结构。
+    在create_all之后调用，对表中缺少的列执行 ALTER TABLE ... ADD COLUMN。
+
+    参数:
+        model: SQLAlchemy模型类
+        column_names (list): 需要检查的列名
+    """
+    table = model.__table__
+    inspector = inspect(db.engine)
+    existing = {column['name'] for column in inspector.get_columns(table.name)}
+    indexed = {tuple(index['column_names']) for index in inspector.get_indexes(table.name)}
+    for name in column_names:
+        if name in existing:
+            continue
+        column = table.columns[name]
+        column_type = column.type.compile(dialect=db.engine.dialect)
+        try:
+            db.session.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}"))
+            db.session.commit()
+            print(f"数据表 {table.name} 新增列 {name}")
+        except Exception as e:
+            # 多个worker同时启动时，其他进程可能已经添加了该列
+            db.session.rollback()
+            print(f"数据表 {table.name} 新增列 {name} 失败: {str(e)}")
+    # 列上声明了index=True时同时补建索引
+    for index in table.indexes:
+        columns = tuple(column.name for column in index.columns)
+        if columns not in indexed and set(columns) & set(column_names):
+            _create_index(index)
+
+
+def _create_index(index):
+    try:
+        index.create(db.engine, checkfirst=True)
+    except Exception as e:
+        # 其他进程可能在检查之后刚创建了同名索引
+        print(f"创建索引 {index.name} 失败: {str(e)}")
+
+
+def ensure_indexes(model):
+    """为已存在的表补建模型中声明的索引(按索引名检查)"""
+    for index in model.__table__.indexes:
+        _create_index(index)
+
+
+def derive_is_fake(detection_type, detection_reason):
+    """根据旧记录的检测理由推断检测结论
+
+    文本检测的理由第一句给出"真实"或"虚假"的判断；
+    图像检测只有判定为伪造时才会生成检测理由。
+    """
+    if detection_type == 'image':
+        return bool(detection_reason)
+    return bool(detection_reason) and '虚假' in detection_reason
+
+
+def backfill_detection_verdicts(batch_size=5000):
+    """为新增结构化列之前的检测记录回填 detection_type 和 is_fake
+
+    按主键区间分批执行UPDATE，避免长时间锁表。可以重复执行，只处理尚未回填的记录。
+
+    返回:
+        int: 回填的记录数
+    """
+    from app.models.news_detection import NewsDetectionHistory
+    table = NewsDetectionHistory.__table__
+    max_id = db.session.query(db.func.max(NewsDetectionHistory.detection_id)).scalar() or 0
+    updated = 0
+    for start in range(0, max_id + 1, batch_size):
+        in_batch = table.c.detection_id.between(start, start + batch_size - 1)
+        db.session.execute(
+            table.update()
+            .where(in_batch, table.c.detection_type.is_(None))
+            .values(detection_type=db.case((table.c.image_path.is_(None), 'text'), else_='image'))
+        )
+        result = db.session.execute(
+            table.update()
+            .where(in_batch, table.c.is_fake.is_(None), table.c.detection_type == 'text')
+            .values(is_fake=db.func.coalesce(table.c.detection_reason.like('%虚假%'), False))
+        )
+        updated += result.rowcount
+        result = db.session.execute(
+            table.update()
+            .where(in_batch, table.c.is_fake.is_(None), table.c.detection_type == 'image')
+            .values(is_fake=db.func.coalesce(table.c.detection_reason != '', False))
+        )
+        updated += result.rowcount
+        db.session.commit()
+    return updated
+
+
+def aggregate_detection_types():
+    """一次分组聚合统计每种检测类型的总数、虚假数和真实数
+
+    返回:
+        dict: {detection_type: (total_count, fake_count, real_count)}
+    """
+    from app.models.news_detection import NewsDetectionHistory
+    rows = db.session.query(
+        NewsDetectionHistory.detection_type,
+        db.func.count(),
+        db.func.sum(db.case((NewsDetectionHistory.is_fake == True, 1), else_=0)),
+        db.func.sum(db.case((NewsDetectionHistory.is_fake == False, 1), else_=0))
+    ).group_by(NewsDetectionHistory.detection_type).all()
+    return {
+        detection_type: (int(total or 0), int(fake or 0), int(real or 0))
+        for detection_type, total, fake, real in rows if detection_type
+    }
+
+
+def rebuild_detection_counters():
+    """根据检测历史重建 detection_type_counters 计数表"""
+    from app.models.news_statistics import DetectionTypeCounter
+    # 两种类型的行总是存在，写入时只需UPDATE自增
+    counts = {'text': (0, 0, 0), 'image': (0, 0, 0)}
+    counts.update(aggregate_detection_types())
+    DetectionTypeCounter.query.delete()
+    for detection_type, (total, fake, real) in counts.items():
+        db.session.add(DetectionTypeCounter(detection_type, total, fake, real))
+    db.session.commit()
+    return counts
+
+
+def rebuild_daily_rollup():
+    """根据检测历史重建 daily_detection_rollup 按天汇总表"""
+    from app.models.news_detection import NewsDetectionHistory
+    from app.models.news_statistics import DailyDetectionRollup
+    day = db.func.date(NewsDetectionHistory.upload_date)
+    rows = db.session.query(
+        day,
+        NewsDetectionHistory.detection_type,
+        db.func.count(),
+        db.func.sum(db.case((NewsDetectionHistory.is_fake == True, 1), else_=0)),
+        db.func.sum(db.case((NewsDetectionHistory.is_fake == False, 1), else_=0))
+    ).filter(
+        NewsDetectionHistory.upload_date.isnot(None),
+        NewsDetectionHistory.detection_type.isnot(None)
+    ).group_by(day, NewsDetectionHistory.detection_type).all()
+    DailyDetectionRollup.query.delete()
+    for date, detection_type, total, fake, real in rows:
+        db.session.add(DailyDetectionRollup(date, detection_type, int(total or 0), int(fake or 0), int(real or 0)))
+    db.session.commit()
+    return len(rows)
+
+
+@contextmanager
+def startup_lock(name, timeout=30):
+    """MySQL下用GET_LOCK串行化多个worker同时执行的启动初始化
+
+    锁绑定在单独的连接上，避免会话提交后连接归还连接池导致锁无法释放。
+    """
+    if db.engine.dialect.name != 'mysql':
+        yield
+        return
+    with db.engine.connect() as conn:
+        acquired = conn.execute(text("SELECT GET_LOCK(:name, :timeout)"), {'name': name, 'timeout': timeout}).scalar()
+        if acquired != 1:
+            raise RuntimeError(f"获取初始化锁 {name} 超时")
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK(:name)"), {'name': name})
+
+
+def ensure_global_statistics_row():
+    """保证 news_statistics 表恰好有一行
+
+    全局统计按整张表原子自增，旧版本并发创建出的多行在这里合并为一行
+    (旧版本只累加第一行，各行的计数互不重叠)。调用方需持有 startup_lock，
+    否则多个worker可能同时在空表中各插入一行。
+    """
+    from app.models.news_statistics import NewsStatistics
+    rows = NewsStatistics.query.order_by(NewsStatistics.last_updated.desc()).all()
+    if len(rows) == 1:
+        return
+    if not rows:
+        db.session.add(NewsStatistics())
+    else:
+        kept = rows[0]
+        for row in rows[1:]:
+            kept.total_news_count += row.total_news_count or 0
+            kept.total_fake_count += row.total_fake_count or 0
+            kept.total_real_count += row.total_real_count or 0
+            kept.total_users = max(kept.total_users or 0, row.total_users or 0)
+            db.session.delete(row)
+    db.session.commit()
+
+
+def ensure_statistics_tables():
+    """全局统计行、计数表和按天汇总表缺失(首次部署)时初始化"""
+    try:
+        with startup_lock('news_statistics_init'):
+            # 拿到锁后开始新事务，读到先拿到锁的worker已提交的结果
+            db.session.rollback()
+            _ensure_statistics_tables()
+    except Exception as e:
+        db.session.rollback()
+        print(f"初始化统计表失败: {str(e)}")
+
+
+def _ensure_statistics_tables():
+    from app.models.news_statistics import DetectionTypeCounter, DailyDetectionRollup
+    try:
+        ensure_global_statistics_row()
+    except Exception as e:
+        db.session.rollback()
+        print(f"初始化全局统计失败: {str(e)}")
+    from app.models.news_detection import NewsDetectionHistory
+    for model, rebuild in ((DetectionTypeCounter, rebuild_detection_counters),
+                           (DailyDetectionRollup, rebuild_daily_rollup)):
+        if model.query.first() is not None:
+            continue
+        try:
+            # 先回填旧记录的结构化结论，否则聚合时会跳过这些记录，统计偏少
+            if NewsDetectionHistory.query.filter(db.or_(
+                NewsDetectionHistory.detection_type.is_(None), NewsDetectionHistory.is_fake.is_(None)
+            )).first() is not None:
+                print(f"已回填 {backfill_detection_verdicts()} 条检测记录")
+            rebuild()
+        except Exception as e:
+            db.session.rollback()
+            print(f"初始化统计表 {model.__tablename__} 失败: {str(e)}")
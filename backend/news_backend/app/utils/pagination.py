@@ -0,0 +1,107 @@
+"""历史记录的游标分页
+
+按 (日期, 主键) 降序做keyset分页: 下一页的条件是 日期 < d 或 (日期 = d 且 主键 < id)，
+配合 (user_id, 日期, 主键) 联合索引，每页的查询代价与翻到第几页无关。
+旧记录的日期可能为NULL，MySQL降序排序时NULL排在最后: 游标日期非NULL时下一页还包括全部NULL日期的记录，
+游标日期为NULL时下一页是 日期为NULL 且 主键 < id 的记录。
+
+接口约定:
+    - 请求参数 limit 和 cursor，都不传时保持原来一次返回全部记录的行为
+    - 分页时返回 {"items": [...], "next_cursor": "...", "has_more": true}，
+      把next_cursor作为下一次请求的cursor参数，has_more为false时没有下一页
+"""
+import base64
+from datetime import datetime
+from sqlalchemy import or_, and_, func
+from sqlalchemy.orm import load_only, column_property
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# 列表投影中大文本字段的预览长度
+PREVIEW_LENGTH = 100
+
+
+def preview_of(column):
+    """大文本字段的前PREVIEW_LENGTH个字符，延迟加载，只在列表投影中查询"""
+    return column_property(func.substr(column, 1, PREVIEW_LENGTH), deferred=True)
+
+
+def encode_cursor(date, record_id):
+    """日期为None时编码为空字符串"""
+    raw = f"{date.isoformat() if date is not None else ''}|{record_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """解析游标，返回 (日期或None, 主键)，格式无效时抛出ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        date, record_id = raw.rsplit('|', 1)
+        return (datetime.fromisoformat(date) if date else None), int(record_id)
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+def parse_page_args(args):
+    """读取分页参数
+
+    返回:
+        tuple: (limit, cursor)，limit和cursor都未提供时返回None，表示不分页
+    异常:
+        ValueError: 参数无效
+    """
+    limit = args.get('limit')
+    cursor = args.get('cursor')
+    if limit is None and not cursor:
+        return None
+    try:
+        limit = int(limit) if limit is not None else DEFAULT_PAGE_SIZE
+    except ValueError:
+        raise ValueError("limit必须是整数")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit必须在1到{MAX_PAGE_SIZE}之间")
+    return limit, decode_cursor(cursor) if cursor else None
+
+
+def paginate(query, date_column, id_column, limit, cursor, list_fields=None):
+    """对查询做keyset分页
+
+    参数:
+        query: 已按用户过滤的查询
+        date_column / id_column: 排序使用的日期列和主键列
+        limit (int): 每页条数
+        cursor (tuple): decode_cursor的结果，第一页为None
+        list_fields (tuple, 可选): 只加载这些属性(列表投影)，不加载大文本字段
+
+    返回:
+        tuple: (当前页的记录, 下一页的游标，没有下一页时为None)
+    """
+    if cursor is not None:
+        date, record_id = cursor
+        if date is None:
+            query = query.filter(date_column.is_(None), id_column < record_id)
+        else:
+            query = query.filter(or_(
+                date_column < date,
+                and_(date_column == date, id_column < record_id),
+                date_column.is_(None)
+            ))
+    if list_fields:
+        model = date_column.class_
+        query = query.options(load_only(*[getattr(model, field) for field in list_fields]))
+    # MySQL降序时NULL日期排在最后，与上面的游标条件一致
+    rows = query.order_by(date_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, date_column.key), getattr(last, id_column.key))
+
+
+def page_data(items, next_cursor):
+    """分页响应的data部分"""
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None
+    }
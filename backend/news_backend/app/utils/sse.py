@@ -0,0 +1,39 @@
+import json
+from flask import Response, stream_with_context
+
+
+def sse_event(data, event=None):
+    """编码一条Server-Sent Events消息"""
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def sse_response(events):
+    """以text/event-stream返回事件流，并关闭Nginx等代理的缓冲"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def stream_text_events(chunks, on_complete):
+    """把大模型的逐段输出转换为SSE事件
+
+    每段输出对应一条 {"delta": "..."} 消息；全部输出完成后调用on_complete(完整文本)，
+    其返回值作为done事件发送；出错时发送error事件。
+
+    :param chunks: 逐段文本的迭代器
+    :param on_complete: 接收完整文本、返回最终结果数据的函数，如保存历史记录
+    """
+    parts = []
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            yield sse_event({"delta": chunk})
+        yield sse_event(on_complete("".join(parts).strip()), event="done")
+    except Exception as e:
+        yield sse_event({"message": str(e)}, event="error")
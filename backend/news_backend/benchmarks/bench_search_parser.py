@@ -0,0 +1,60 @@
+"""搜索结果页解析的微基准测试
+
+对比当前环境中可用的各个解析后端(selectolax / lxml / BeautifulSoup)解析同一个页面的耗时，
+并检查各后端的解析结果是否一致。
+
+fixtures/baidu_search_results.html 是人工构造的百度搜索结果页样本(10条结果、广告、
+相关搜索以及大量样式和脚本等噪声)，不是真实抓取的页面，结构参照百度结果页的class命名。
+也可以传入自己保存的页面。
+
+用法:
+    python benchmarks/bench_search_parser.py [页面路径...] [-n 次数]
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import timeit
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIXTURE = os.path.join(BENCHMARK_DIR, 'fixtures', 'baidu_search_results.html')
+PARSER_PATH = os.path.join(BENCHMARK_DIR, '..', 'app', 'services', 'search_parser.py')
+
+
+def load_parser_module():
+    # 直接按文件加载解析模块，避免导入app包时初始化Flask应用和数据库连接
+    spec = importlib.util.spec_from_file_location('search_parser', PARSER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser(description="搜索结果页解析基准测试")
+    parser.add_argument('pages', nargs='*', default=[DEFAULT_FIXTURE], help="HTML页面路径")
+    parser.add_argument('-n', '--number', type=int, default=200, help="每个后端的解析次数")
+    args = parser.parse_args()
+
+    search_parser = load_parser_module()
+    print(f"可用后端: {', '.join(search_parser.PARSERS)}")
+
+    for page in args.pages:
+        with open(page, encoding='utf-8') as f:
+            html = f.read()
+        print(f"\n{os.path.basename(page)} ({len(html.encode('utf-8')) // 1024} KB)")
+
+        baseline = None
+        for name, parse in search_parser.PARSERS.items():
+            results = parse(html)
+            if baseline is None:
+                baseline = results
+            elif results != baseline:
+                print(f"  警告: {name} 的解析结果与其他后端不一致")
+            seconds = min(timeit.repeat(lambda: parse(html), number=args.number, repeat=3)) / args.number
+            print(f"  {name:<12} {seconds * 1000:8.3f} ms/页  {len(results)} 条结果")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
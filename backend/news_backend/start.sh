@@ -16,12 +16,13 @@ echo "启动deepfake微服务..."
 source ~/miniconda3/etc/profile.d/conda.sh
 
 # 使用 Bash 启动子进程来激活 conda 环境
-bash -i -c "conda activate DGM4; cd ~/deepfake && python deepfake_service.py > deepfake_service.log 2>&1 &"
+# 使用gunicorn多worker启动，模型在master中加载后fork，各worker共享只读权重
+bash -i -c "conda activate DGM4; cd ~/deepfake && gunicorn -c gunicorn_hammer.py deepfake_service:app > deepfake_service.log 2>&1 &"
 # 等待2秒让服务启动
 sleep 2
 
 # 使用pgrep查找实际的deepfake服务PID
-DEEPFAKE_PID=$(pgrep -f "python.*deepfake_service.py")
+DEEPFAKE_PID=$(pgrep -of "gunicorn.*deepfake_service")
 if [ -n "$DEEPFAKE_PID" ]; then
     echo "deepfake微服务已启动，PID: $DEEPFAKE_PID"
     echo $DEEPFAKE_PID > ~/deepfake.pid
@@ -20,14 +20,15 @@ fi
 # 停止deepfake微服务
 if [ -f ~/deepfake.pid ]; then
     DEEPFAKE_PID=$(cat ~/deepfake.pid)
-    kill -9 $DEEPFAKE_PID 2>/dev/null || true
+    # 向gunicorn master发送TERM，由master负责关闭所有worker
+    kill $DEEPFAKE_PID 2>/dev/null || true
     rm ~/deepfake.pid
     echo "已停止deepfake微服务，PID: $DEEPFAKE_PID"
 else
     # 如果PID文件不存在，尝试通过进程名查找
-    DEEPFAKE_PID=$(pgrep -f "python.*deepfake_service.py")
+    DEEPFAKE_PID=$(pgrep -of "gunicorn.*deepfake_service")
     if [ -n "$DEEPFAKE_PID" ]; then
-        kill -9 $DEEPFAKE_PID 2>/dev/null || true
+        kill $DEEPFAKE_PID 2>/dev/null || true
         echo "已停止deepfake微服务，PID: $DEEPFAKE_PID"
     fi
 fi
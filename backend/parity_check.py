@@ -0,0 +1,154 @@
+"""推理后端精度一致性检查
+
+用同一组样本分别在eager后端和待检查后端(quantized/torchscript/onnx)上推理，
+比较真假判定、伪造概率、操纵类型和检测框，超出阈值时以非零状态码退出。
+
+样本文件为JSONL格式，每行一个样本：
+    {"image_path": "fixtures/0001.jpg", "text": "..."}
+
+不指定--fixtures时，按固定随机种子在--fixtures_dir下生成一组合成样本(带色块和人脸轮廓的图片
+和中英文新闻标题)，CI中无需准备数据即可运行。
+
+用法:
+    python parity_check.py --backend quantized
+    python parity_check.py --fixtures fixtures.jsonl --backend quantized
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from PIL import Image, ImageDraw
+from dataset.utils import pre_caption
+from detect import DeepFakeDetector
+
+
+def box_iou(a, b):
+    """计算两个检测框的IoU"""
+    x1, y1 = max(a['x1'], b['x1']), max(a['y1'], b['y1'])
+    x2, y2 = min(a['x2'], b['x2']), min(a['y2'], b['y2'])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    area_a = max(0.0, a['x2'] - a['x1']) * max(0.0, a['y2'] - a['y1'])
+    area_b = max(0.0, b['x2'] - b['x1']) * max(0.0, b['y2'] - b['y1'])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 1.0
+
+
+FIXTURE_CAPTIONS = [
+    "President meets foreign leaders at the summit to discuss trade",
+    "Local team wins the championship after a dramatic final",
+    "Scientists announce a breakthrough in battery technology",
+    "Flooding forces thousands to leave their homes",
+    "Celebrity spotted at a charity event in the city center",
+    "Minister denies reports of resignation amid protests",
+    "New vaccine shows promising results in clinical trials",
+    "Stock markets fall sharply after the central bank decision",
+]
+
+
+def generate_fixtures(directory, count=16, seed=0):
+    """在directory下生成count个合成样本，返回样本列表；同一种子每次生成相同的图片和文本"""
+    rng = random.Random(seed)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    fixtures = []
+    for index in range(count):
+        width, height = rng.choice([(256, 256), (320, 240), (240, 320)])
+        image = Image.new('RGB', (width, height), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(rng.randint(2, 6)):
+            x1, y1 = rng.randrange(width - 20), rng.randrange(height - 20)
+            box = (x1, y1, rng.randint(x1 + 10, width), rng.randint(y1 + 10, height))
+            draw.rectangle(box, fill=tuple(rng.randrange(256) for _ in range(3)))
+        # 椭圆模拟人脸区域
+        cx, cy = rng.randint(width // 4, width * 3 // 4), rng.randint(height // 4, height * 3 // 4)
+        draw.ellipse((cx - 30, cy - 40, cx + 30, cy + 40), fill=(224, 172, 105))
+        image_path = os.path.join(directory, f'{index:04d}.jpg')
+        image.save(image_path, 'JPEG', quality=90)
+        fixtures.append({"image_path": image_path, "text": rng.choice(FIXTURE_CAPTIONS)})
+    with open(os.path.join(directory, 'fixtures.jsonl'), 'w', encoding='utf-8') as f:
+        for item in fixtures:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    return fixtures
+
+
+def run(detector, fixtures, batch_size):
+    """对全部样本推理，返回结果列表和平均每条耗时(毫秒)"""
+    results = []
+    elapsed = 0.0
+    for start in range(0, len(fixtures), batch_size):
+        chunk = fixtures[start:start + batch_size]
+        images = [detector.decode_image(item['image_path']) for item in chunk]
+        captions = [pre_caption(item['text'], detector.config['max_words']) for item in chunk]
+        begin = time.perf_counter()
+        results.extend(detector.infer(images, captions))
+        elapsed += time.perf_counter() - begin
+    return results, elapsed * 1000 / max(1, len(fixtures))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', default='./configs/test.yaml')
+    parser.add_argument('--model_path', default='HAMMER_checkpoint_best.pth')
+    parser.add_argument('--fixtures', help='JSONL样本文件，不指定时生成合成样本')
+    parser.add_argument('--fixtures_dir', default='./export/parity_fixtures', help='合成样本的保存目录')
+    parser.add_argument('--num_fixtures', type=int, default=16, help='合成样本数量')
+    parser.add_argument('--backend', required=True, choices=['quantized', 'torchscript', 'onnx'])
+    parser.add_argument('--batch_size', type=int, default=8)
+    parser.add_argument('--min_agreement', type=float, default=0.98, help='真假判定一致率下限')
+    parser.add_argument('--max_prob_diff', type=float, default=0.05, help='伪造概率平均绝对误差上限')
+    parser.add_argument('--min_box_iou', type=float, default=0.8, help='伪造样本检测框平均IoU下限')
+    args = parser.parse_args()
+
+    if args.fixtures:
+        with open(args.fixtures, 'r', encoding='utf-8') as f:
+            fixtures = [json.loads(line) for line in f if line.strip()]
+    else:
+        fixtures = generate_fixtures(args.fixtures_dir, args.num_fixtures)
+    if not fixtures:
+        print("样本文件为空")
+        return 1
+
+    reference = DeepFakeDetector(args.config, args.model_path, device='cpu', inference_backend='eager')
+    expected, eager_ms = run(reference, fixtures, args.batch_size)
+    del reference
+    candidate = DeepFakeDetector(args.config, args.model_path, device='cpu', inference_backend=args.backend)
+    actual, candidate_ms = run(candidate, fixtures, args.batch_size)
+
+    agree = 0
+    type_agree = 0
+    prob_diffs = []
+    ious = []
+    for item, exp, act in zip(fixtures, expected, actual):
+        prob_diffs.append(abs(exp['fake_probability'] - act['fake_probability']))
+        if exp['is_fake'] == act['is_fake']:
+            agree += 1
+        else:
+            print(f"判定不一致: {item['image_path']} eager={exp['fake_probability']:.4f} "
+                  f"{args.backend}={act['fake_probability']:.4f}")
+        if set(exp['manipulation_types']) == set(act['manipulation_types']):
+            type_agree += 1
+        if exp['is_fake']:
+            ious.append(box_iou(exp['fake_image_box'], act['fake_image_box']))
+
+    total = len(fixtures)
+    agreement = agree / total
+    mean_prob_diff = sum(prob_diffs) / total
+    mean_iou = sum(ious) / len(ious) if ious else 1.0
+    print(f"样本数: {total}")
+    print(f"真假判定一致率: {agreement:.4f}")
+    print(f"操纵类型一致率: {type_agree / total:.4f}")
+    print(f"伪造概率平均绝对误差: {mean_prob_diff:.4f} (最大 {max(prob_diffs):.4f})")
+    print(f"伪造样本检测框平均IoU: {mean_iou:.4f}")
+    print(f"平均每条耗时: eager {eager_ms:.1f}ms, {args.backend} {candidate_ms:.1f}ms")
+
+    passed = (agreement >= args.min_agreement
+              and mean_prob_diff <= args.max_prob_diff
+              and mean_iou >= args.min_box_iou)
+    print("一致性检查通过" if passed else "一致性检查未通过")
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
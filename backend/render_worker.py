@@ -0,0 +1,62 @@
+import os
+import queue
+import threading
+from PIL import ImageDraw
+from tracing import logger, stage
+
+
+def render_annotated_image(image, box, output_path):
+    """在图片上绘制伪造区域检测框并保存
+
+    参数:
+        image (PIL.Image): 已解码的RGB图片
+        box (dict): 检测框坐标 {"x1", "y1", "x2", "y2"}
+        output_path (str): 标注图片的保存路径
+    """
+    with stage('render'):
+        draw = ImageDraw.Draw(image)
+        draw.rectangle([box['x1'], box['y1'], box['x2'], box['y2']], outline="red", width=3)
+        image.save(output_path)
+
+
+class RenderWorker:
+    """标注图片的后台渲染线程
+
+    检测结果在logits解码完成后立即返回，画框和JPEG重新编码放到后台线程完成。
+    队列有上限，队列满时退化为在调用线程中同步渲染，以此形成背压。
+    """
+
+    def __init__(self, max_queue_size=64):
+        self.max_queue_size = max(1, max_queue_size)
+        self._lock = threading.Lock()
+        self._pid = None
+        self.start()
+
+    def start(self):
+        """启动渲染线程，fork出的worker进程在首次使用时重新启动自己的队列和线程"""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._thread = threading.Thread(target=self._run, name="hammer-render", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, image, box, output_path):
+        """提交一个渲染任务，队列已满时同步渲染"""
+        if self._pid != os.getpid():
+            self.start()
+        try:
+            self._queue.put_nowait((image, box, output_path))
+        except queue.Full:
+            render_annotated_image(image, box, output_path)
+
+    def _run(self):
+        while True:
+            image, box, output_path = self._queue.get()
+            try:
+                render_annotated_image(image, box, output_path)
+            except Exception as e:
+                logger.warning("渲染标注图片失败: %s, %s", output_path, e)
+            finally:
+                self._queue.task_done()
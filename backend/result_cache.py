@@ -0,0 +1,121 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """HAMMER推理结果缓存
+
+    键为图片原始字节的SHA-256加上pre_caption处理后的文本(同一文件重复上传即可命中，无需解码)，
+    值为检测结果(是否伪造、概率、操纵类型、检测框、伪造词等)。
+    分两级：进程内的LRU内存缓存，和持久化到磁盘的SQLite缓存(按TTL和条数淘汰)。
+    """
+
+    # 每写入多少次磁盘缓存做一次过期和超量清理
+    EVICT_EVERY = 100
+
+    def __init__(self, db_path, memory_size=1024, ttl_seconds=7 * 24 * 3600, max_disk_entries=100000):
+        self.memory_size = memory_size
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.db_path = db_path
+        self._conn = None
+        self._conn_pid = None
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS hammer_results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_hammer_results_accessed ON hammer_results (accessed_at)")
+        conn.commit()
+
+    def _connection(self):
+        # SQLite连接不能跨fork使用，多worker部署时每个进程各自打开连接
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def image_digest(image_data):
+        """图片原始字节的sha256，在请求线程中计算，不占用批处理线程"""
+        return hashlib.sha256(image_data).hexdigest()
+
+    @staticmethod
+    def make_key(image_digest, caption):
+        """根据图片原始字节的摘要和预处理后的文本生成缓存键"""
+        digest = hashlib.sha256()
+        digest.update(f"{image_digest}:".encode())
+        digest.update(caption.strip().encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """查询缓存，未命中或已过期时返回None"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, result = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    return copy.deepcopy(result)
+                del self._memory[key]
+
+            row = conn.execute(
+                "SELECT value, created_at FROM hammer_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM hammer_results WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE hammer_results SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            result = json.loads(value)
+            self._remember(key, created_at, result)
+            return copy.deepcopy(result)
+
+    def set(self, key, result):
+        """写入缓存(内存和磁盘两级)"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            self._remember(key, now, copy.deepcopy(result))
+            conn.execute(
+                "INSERT OR REPLACE INTO hammer_results (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result, ensure_ascii=False), now, now)
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict(conn, now)
+            conn.commit()
+
+    def _remember(self, key, created_at, result):
+        self._memory[key] = (created_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict(self, conn, now):
+        # 先删除过期条目，再按最近访问时间删除超出上限的条目
+        conn.execute("DELETE FROM hammer_results WHERE created_at < ?", (now - self.ttl_seconds,))
+        conn.execute(
+            "DELETE FROM hammer_results WHERE key IN ("
+            "SELECT key FROM hammer_results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
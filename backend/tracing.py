@@ -0,0 +1,102 @@
+"""检测服务的分级日志与分阶段耗时统计
+
+各推理阶段(decode/transform/tokenize/forward/postprocess/render)的耗时记录为直方图，
+通过 /metrics 以Prometheus文本格式导出。热路径上的调试日志只在DEBUG级别下按比例采样输出。
+多worker部署时每个worker进程各自统计。
+"""
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("hammer")
+
+# 调试日志的采样比例，例如0.01表示约1%的请求输出调试日志
+LOG_SAMPLE_RATE = float(os.environ.get('HAMMER_LOG_SAMPLE_RATE', 0.01))
+
+STAGES = ('decode', 'transform', 'tokenize', 'forward', 'postprocess', 'render')
+
+# 耗时直方图的桶上界(秒)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 批大小直方图的桶上界
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class Histogram:
+    """线程安全的累计直方图"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def render(self, name, labels=""):
+        """按Prometheus文本格式输出"""
+        with self._lock:
+            sep = "," if labels else ""
+            lines = [
+                f'{name}_bucket{{{labels}{sep}le="{bound}"}} {count}'
+                for bound, count in zip(self.buckets, self.counts)
+            ]
+            lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{suffix} {self.sum}")
+            lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+stage_histograms = {stage: Histogram(LATENCY_BUCKETS) for stage in STAGES}
+batch_size_histogram = Histogram(BATCH_SIZE_BUCKETS)
+
+
+@contextmanager
+def stage(name):
+    """统计一个推理阶段的耗时
+
+    用法:
+        with stage('forward'):
+            outputs = model(...)
+    """
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - begin
+        stage_histograms[name].observe(elapsed)
+        debug_sampled("stage %s took %.1fms", name, elapsed * 1000)
+
+
+def observe_batch_size(size):
+    batch_size_histogram.observe(size)
+
+
+def debug_sampled(msg, *args):
+    """只在DEBUG级别下按LOG_SAMPLE_RATE比例输出调试日志"""
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < LOG_SAMPLE_RATE:
+        logger.debug(msg, *args)
+
+
+def render_metrics():
+    """导出全部指标的Prometheus文本"""
+    lines = [
+        "# HELP hammer_stage_seconds Time spent in each HAMMER inference stage.",
+        "# TYPE hammer_stage_seconds histogram",
+    ]
+    for name, histogram in stage_histograms.items():
+        lines.extend(histogram.render("hammer_stage_seconds", f'stage="{name}"'))
+    lines.append("# HELP hammer_batch_size Number of samples per forward pass.")
+    lines.append("# TYPE hammer_batch_size histogram")
+    lines.extend(batch_size_histogram.render("hammer_batch_size"))
+    return "\n".join(lines) + "\n"